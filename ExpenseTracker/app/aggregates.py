@@ -0,0 +1,295 @@
+"""Persisted totals of expenses per year, month and day
+
+Sidecars are json files next to the csv file holding state computed from it together
+with the key of the csv file it was computed from, so they answer queries without
+reading the csv. ExpenseTracker keeps them up to date on every change, when the csv
+was changed by something else the key no longer matches and they are rebuilt.
+The totals sidecar also holds the next expense id, so ids of deleted expenses are
+not given out again, the id is kept in an ids file as well that is never rebuilt, so a
+lost or truncated sidecar can not lower it. Sidecars are written to a temporary file
+that replaces them once complete. Totals are kept per currency and converted to the base
+currency only when they are shown, the totals of a month are also kept per category,
+the first word of the description, for budgets.
+"""
+import datetime
+import json
+import os
+
+from functools import lru_cache
+from itertools import compress
+from typing import Optional
+
+try:
+    from app.money import DEFAULT_CURRENCY, Rates
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from money import DEFAULT_CURRENCY, Rates
+
+
+def file_key(file: str) -> Optional[list]:
+    """
+    Key of a file that changes whenever the file is replaced or written
+    :param file: path of the file
+    :return: list of inode, modification time and size, None if file does not exist
+    """
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def write_json(file: str, data: dict) -> None:
+    """
+    Write json to a temporary file that replaces file once it is complete
+    :param file: path of the json file
+    :param data: dict to write
+    :return: None
+    """
+    temp = f'{file}.tmp'
+    with open(temp, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp, file)
+
+
+@lru_cache(maxsize=65536)
+def category(description: str) -> str:
+    """
+    Category of an expense, the first word of its description ignoring case
+    :param description: string expense description
+    :return: string category, empty if description is blank
+    """
+    words = description.split(maxsplit=1)
+    return words[0].casefold() if words else ''
+
+
+class Sidecar:
+    """
+    State computed from the csv file, stored in a json file
+    Attributes:
+        version: int, format of the stored state, a sidecar of another version is rebuilt
+        file: json sidecar file
+        key: key of the csv file the state was computed from
+        loaded: bool, whether the sidecar was loaded or rebuilt in this session
+        dirty: bool, whether the state changed since it was loaded or saved
+    """
+    version = 1
+
+    def __init__(self, file: str):
+        self.file = file
+        self.key = None
+        self.loaded = False
+        self.dirty = False
+
+    def read(self) -> Optional[dict]:
+        """
+        Read the sidecar file
+        :return: dict stored in the file, None if it is missing or unreadable
+        """
+        try:
+            with open(self.file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key: Optional[list]) -> bool:
+        """
+        Load the sidecar file
+        :param key: key of the csv file as it is now
+        :return: bool, whether the stored state was computed from that csv file
+        """
+        return self.accept(self.read(), key)
+
+    def accept(self, stored: Optional[dict], key: Optional[list]) -> bool:
+        """
+        Take over the state read from the sidecar file if it was computed from the csv file with key
+        :param stored: dict stored in the file or None
+        :param key: key of the csv file as it is now
+        :return: bool, whether the state was taken over
+        """
+        if stored is None or stored.get('key') != key or stored.get('version', 1) != self.version:
+            return False
+        self.key = key
+        self.restore(stored)
+        return True
+
+    def save(self, key: Optional[list]) -> None:
+        """
+        Save the state as computed from the csv file with key
+        :param key: key of the csv file
+        :return: None
+        """
+        self.key = key
+        write_json(self.file, {'key': key, 'version': self.version, **self.state()})
+        self.dirty = False
+
+    def restore(self, stored: dict) -> None:
+        """
+        Take over the state read from the sidecar file
+        :param stored: dict stored in the file
+        :return: None
+        """
+        raise NotImplementedError
+
+    def state(self) -> dict:
+        """
+        State to store in the sidecar file
+        :return: dict
+        """
+        raise NotImplementedError
+
+    def rebuild(self, ledger) -> None:
+        """
+        Compute the state again from all expenses
+        :param ledger: Ledger of expenses
+        :return: None
+        """
+        raise NotImplementedError
+
+
+class Aggregates(Sidecar):
+    """
+    Totals and counts of expenses per currency
+    Attributes:
+        years: dict of 'YYYY' to dict of currency to [cents, count]
+        months: dict of 'YYYY-MM' to dict of currency to [cents, count]
+        days: dict of 'YYYY-MM-DD' to dict of currency to [cents, count]
+        categories: dict of 'YYYY-MM' to dict of category to dict of currency to [cents, count]
+        next_id: int, id of the next expense
+        ids_file: json file keeping next_id apart from the totals, it is never rebuilt
+    """
+    version = 3
+
+    def __init__(self, file: str, ids_file: str):
+        super().__init__(file)
+        self.ids_file = ids_file
+        self.years = dict()
+        self.months = dict()
+        self.days = dict()
+        self.categories = dict()
+        self.next_id = 1
+
+    def load(self, key: Optional[list]) -> bool:
+        stored = self.read()
+        # the next id is kept even from a stale or lost sidecar, a rebuild only raises it
+        try:
+            with open(self.ids_file, 'r') as f:
+                self.next_id = json.load(f)['next_id']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        if stored is not None:
+            self.next_id = max(self.next_id, stored.get('next_id', 1))
+        return self.accept(stored, key)
+
+    def save(self, key: Optional[list]) -> None:
+        super().save(key)
+        write_json(self.ids_file, {'next_id': self.next_id})
+
+    def restore(self, stored: dict) -> None:
+        self.years, self.months, self.days = stored['years'], stored['months'], stored['days']
+        self.categories = stored['categories']
+
+    def state(self) -> dict:
+        return {'next_id': self.next_id, 'years': self.years, 'months': self.months, 'days': self.days,
+                'categories': self.categories}
+
+    def rebuild(self, ledger) -> None:
+        """
+        Compute the totals again from all expenses
+        :param ledger: Ledger of expenses
+        :return: None
+        """
+        days = dict()
+        self.next_id = max(self.next_id, max(ledger.ids, default=0) + 1)
+        expenses = zip(ledger.dates, map(category, ledger.descriptions), ledger.amounts, ledger.currencies)
+        for date, name, cents, currency in compress(expenses, ledger.ids):
+            entry = days.setdefault((date, name, currency), [0, 0])
+            entry[0] += cents
+            entry[1] += 1
+        self.years, self.months, self.days, self.categories = dict(), dict(), dict(), dict()
+        for (date, name, currency), (cents, count) in days.items():
+            self.add(datetime.date.fromordinal(date).isoformat(), name, cents, count, currency)
+        self.dirty = True
+
+    def new_id(self) -> int:
+        """
+        Give out the id of a new expense
+        :return: int expense id
+        """
+        self.next_id += 1
+        self.dirty = True
+        return self.next_id - 1
+
+    def add(self, day: str, name: str, cents: int, count: int = 1, currency: str = DEFAULT_CURRENCY) -> None:
+        """
+        Add expenses to the totals of their day, month, year and the category of their month
+        :param day: string date, YYYY-MM-DD
+        :param name: string category of the expenses
+        :param cents: int amount in cents
+        :param count: int number of expenses
+        :param currency: string currency code
+        :return: None
+        """
+        categories = self.categories.setdefault(day[:7], dict())
+        for totals, key in ((self.years, day[:4]), (self.months, day[:7]), (self.days, day), (categories, name)):
+            currencies = totals.setdefault(key, dict())
+            entry = currencies.setdefault(currency, [0, 0])
+            entry[0] += cents
+            entry[1] += count
+            if not entry[1]:
+                del currencies[currency]
+                if not currencies:
+                    del totals[key]
+        if not categories:
+            del self.categories[day[:7]]
+        self.dirty = True
+
+    def remove(self, day: str, name: str, cents: int, currency: str = DEFAULT_CURRENCY) -> None:
+        """
+        Remove an expense from the totals
+        :param day: string date, YYYY-MM-DD
+        :param name: string category of the expense
+        :param cents: int amount in cents
+        :param currency: string currency code
+        :return: None
+        """
+        self.add(day, name, -cents, -1, currency)
+
+    def groups(self, by: str, rates: Rates) -> dict:
+        """
+        Totals per year, month or day in the base currency
+        :param by: string 'year', 'month' or 'day'
+        :param rates: Rates to the base currency
+        :return: dict of group to [cents, count]
+        """
+        totals = {'year': self.years, 'month': self.months, 'day': self.days}[by]
+        return {key: rates.combine(currencies) for key, currencies in totals.items()}
+
+    def total(self, rates: Rates) -> int:
+        """
+        Total of all expenses in the base currency
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        return sum(cents for cents, _ in self.groups('year', rates).values())
+
+    def month_total(self, month: int, rates: Rates) -> int:
+        """
+        Total of the expenses of a month in any year in the base currency
+        :param month: int month, 1 to 12
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        suffix = f'-{month:02}'
+        return sum(cents for key, (cents, _) in self.groups('month', rates).items() if key.endswith(suffix))
+
+    def spent(self, month: str, name: Optional[str], rates: Rates) -> int:
+        """
+        Running total of a month in the base currency, of all expenses or of one category
+        :param month: string 'YYYY-MM'
+        :param name: string category, None for all expenses
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        totals = self.months if name is None else self.categories.get(month, dict())
+        return rates.combine(totals.get(month if name is None else name, dict()))[0]
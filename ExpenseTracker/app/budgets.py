@@ -0,0 +1,79 @@
+"""Monthly budgets
+
+A budget limits what is spent in a month, on all expenses or on the expenses of one
+category, the first word of their description. Budgets are in the base currency and
+kept in a local csv file of category,amount lines, the budget of all expenses having
+an empty category:
+    ,1500.00
+    groceries,400.00
+Adding an expense compares the running totals of its month, kept by the totals
+sidecar or the database, with the budgets, so a check costs the same however long
+the history of expenses is.
+"""
+import csv
+
+from functools import cached_property
+from typing import Optional
+
+try:
+    from app.money import format_cents, parse_amount
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from money import format_cents, parse_amount
+
+THRESHOLDS = (80, 100)
+
+
+def crossed(before: int, after: int, limit: int) -> Optional[int]:
+    """
+    Highest threshold a running total crossed
+    :param before: int cents spent before the expense
+    :param after: int cents spent with the expense
+    :param limit: int cents of the budget
+    :return: int percent of THRESHOLDS or None if no threshold was crossed
+    """
+    passed = [threshold for threshold in THRESHOLDS if before * 100 < threshold * limit <= after * 100]
+    return passed[-1] if passed else None
+
+
+class Budgets:
+    """
+    Monthly budgets, read from a local file on first use
+    Attributes:
+        file: csv file of category,amount lines
+    """
+    def __init__(self, file: str):
+        self.file = file
+
+    @cached_property
+    def limits(self) -> dict:
+        """
+        Budgets in cents, a missing file has no budgets
+        :return: dict of category, empty for all expenses, to int cents
+        """
+        limits = dict()
+        try:
+            with open(self.file, 'r', newline='') as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2:
+                        try:
+                            limits[row[0].strip().casefold()] = parse_amount(row[1])
+                        except ValueError:
+                            continue
+        except FileNotFoundError:
+            pass
+        return limits
+
+    def set(self, name: str, cents: int) -> None:
+        """
+        Set the budget of a category and write the file, a budget of 0 is removed
+        :param name: string category, empty for all expenses
+        :param cents: int budget in cents
+        :return: None
+        """
+        if cents:
+            self.limits[name] = cents
+        else:
+            self.limits.pop(name, None)
+        with open(self.file, 'w', newline='') as f:
+            csv.writer(f).writerows((name, format_cents(cents)) for name, cents in sorted(self.limits.items()))
@@ -0,0 +1,417 @@
+"""SQLite storage of expenses
+
+An optional backend for large ledgers, made from the csv file by --migrate. Expenses
+are rows of one table indexed on date and normalised description, for duplicate
+checks, and on normalised description covering currency and amount, for reports.
+Like the totals sidecar of the csv file, a table of totals per day and currency is
+kept up to date by triggers, so totals of any date range are a SUM over at most one
+row per day and currency instead of over every expense, and so is a table of totals
+per month, category and currency for budgets. Dates are YYYY-MM-DD text, which sorts
+like dates, and amounts integer cents.
+Database takes the place of the Ledger, DatabaseTotals and DatabaseDuplicates the
+place of the sidecars, which the indexes of the database make unnecessary.
+"""
+import datetime
+import os
+import sqlite3
+
+from typing import Iterable, Iterator, Optional
+
+try:
+    from app.duplicates import normalise
+    from app.money import DEFAULT_CURRENCY, Rates, format_cents
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from duplicates import normalise
+    from money import DEFAULT_CURRENCY, Rates, format_cents
+
+TABLE = '''
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    description TEXT NOT NULL,
+    normalised TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    currency TEXT NOT NULL
+);
+'''
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date, normalised);
+CREATE INDEX IF NOT EXISTS expenses_description ON expenses (normalised, currency, amount);
+'''
+DAYS = '''
+CREATE TABLE IF NOT EXISTS days (
+    date TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (date, currency)
+) WITHOUT ROWID;
+'''
+CATEGORIES = '''
+CREATE TABLE IF NOT EXISTS categories (
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (month, category, currency)
+) WITHOUT ROWID;
+'''
+# the first word of the normalised description, like aggregates.category
+CATEGORY = "substr({0}.normalised, 1, instr({0}.normalised || ' ', ' ') - 1)"
+FILL_DAYS = '''
+INSERT INTO days SELECT date, currency, sum(amount), count(*) FROM expenses GROUP BY date, currency;
+'''
+FILL_CATEGORIES = f'''
+INSERT INTO categories SELECT substr(date, 1, 7), {CATEGORY.format('expenses')}, currency, sum(amount), count(*)
+    FROM expenses GROUP BY 1, 2, 3;
+'''
+TRIGGERS = f'''
+CREATE TRIGGER IF NOT EXISTS expenses_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO days VALUES (new.date, new.currency, new.amount, 1)
+        ON CONFLICT (date, currency) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_delete AFTER DELETE ON expenses BEGIN
+    UPDATE days SET amount = amount - old.amount, count = count - 1
+        WHERE date = old.date AND currency = old.currency;
+    DELETE FROM days WHERE date = old.date AND currency = old.currency AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_update AFTER UPDATE OF date, amount, currency ON expenses BEGIN
+    UPDATE days SET amount = amount - old.amount, count = count - 1
+        WHERE date = old.date AND currency = old.currency;
+    DELETE FROM days WHERE date = old.date AND currency = old.currency AND count = 0;
+    INSERT INTO days VALUES (new.date, new.currency, new.amount, 1)
+        ON CONFLICT (date, currency) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS categories_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO categories VALUES (substr(new.date, 1, 7), {CATEGORY.format('new')}, new.currency, new.amount, 1)
+        ON CONFLICT (month, category, currency) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS categories_delete AFTER DELETE ON expenses BEGIN
+    UPDATE categories SET amount = amount - old.amount, count = count - 1
+        WHERE month = substr(old.date, 1, 7) AND category = {CATEGORY.format('old')} AND currency = old.currency;
+    DELETE FROM categories WHERE count = 0
+        AND month = substr(old.date, 1, 7) AND category = {CATEGORY.format('old')} AND currency = old.currency;
+END;
+CREATE TRIGGER IF NOT EXISTS categories_update AFTER UPDATE OF date, normalised, amount, currency ON expenses BEGIN
+    UPDATE categories SET amount = amount - old.amount, count = count - 1
+        WHERE month = substr(old.date, 1, 7) AND category = {CATEGORY.format('old')} AND currency = old.currency;
+    DELETE FROM categories WHERE count = 0
+        AND month = substr(old.date, 1, 7) AND category = {CATEGORY.format('old')} AND currency = old.currency;
+    INSERT INTO categories VALUES (substr(new.date, 1, 7), {CATEGORY.format('new')}, new.currency, new.amount, 1)
+        ON CONFLICT (month, category, currency) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+'''
+GROUP_LENGTHS = {'year': 4, 'month': 7, 'day': 10}
+
+
+def by_currency(rows: Iterable[tuple], totals: Optional[dict] = None) -> dict:
+    """
+    Collect rows of currency, cents and count
+    :param rows: iterable of currency, cents and count
+    :param totals: dict to add the rows to
+    :return: dict of currency to [cents, count]
+    """
+    totals = dict() if totals is None else totals
+    for currency, cents, count in rows:
+        entry = totals.setdefault(currency, [0, 0])
+        entry[0] += cents
+        entry[1] += count
+    return totals
+
+
+class Database:
+    """
+    Expenses kept in an SQLite database, changes are committed when the tracker saves
+    Attributes:
+        file: database file
+        connection: sqlite3 connection
+        next_id: int, id of the next expense, read from the database on first use
+    """
+    def __init__(self, file: str):
+        self.file = file
+        self.connection = sqlite3.connect(file)
+        # databases made before budgets have no totals per category, they are computed once
+        fill = not self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'categories'").fetchone()
+        self.connection.executescript(TABLE + INDEXES + DAYS + CATEGORIES + TRIGGERS)
+        if fill:
+            self.connection.executescript(FILL_CATEGORIES)
+        self.next_id = None
+
+    @classmethod
+    def create(cls, file: str, expenses: Iterable[tuple], next_id: int = 1) -> int:
+        """
+        Create a database from expenses, the indexes, the totals per day and the triggers keeping
+        them are made once all rows are inserted, and the file only appears once it is complete
+        :param file: database file
+        :param expenses: iterable of id, date, time, description, cents and currency, like ledger.stream
+        :param next_id: int, id of the next expense, ids of deleted expenses are not given out again
+        :raises ValueError: if an expense is invalid, like a repeated id
+        :return: int number of expenses
+        """
+        temp = f'{file}.tmp'
+        if os.path.exists(temp):
+            os.remove(temp)
+        connection = sqlite3.connect(temp)
+        try:
+            # the temporary file is thrown away on failure, so it needs no journal
+            connection.executescript('PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;' + TABLE)
+            count = connection.executemany(
+                'INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((expense_id, date, time, description, normalise(description), cents, currency)
+                 for expense_id, date, time, description, cents, currency in expenses),
+            ).rowcount
+            connection.execute("DELETE FROM sqlite_sequence WHERE name = 'expenses'")
+            connection.execute("INSERT INTO sqlite_sequence "
+                               "VALUES ('expenses', max(?, coalesce((SELECT max(id) FROM expenses), 0)))",
+                               (next_id - 1,))
+            connection.commit()
+            connection.executescript(INDEXES + DAYS + CATEGORIES + FILL_DAYS + FILL_CATEGORIES + TRIGGERS + 'ANALYZE;')
+        except (sqlite3.Error, ValueError) as error:
+            connection.close()
+            os.remove(temp)
+            raise ValueError(f'can not create {file}: {error}') from error
+        connection.close()
+        os.replace(temp, file)
+        return max(count, 0)
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT count(*) FROM expenses').fetchone()[0]
+
+    def commit(self) -> None:
+        """
+        Commit the changes made since the last commit
+        :return: None
+        """
+        self.connection.commit()
+
+    def new_id(self) -> int:
+        """
+        Give out the id of a new expense
+        :return: int expense id
+        """
+        if self.next_id is None:
+            seq = self.connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+            self.next_id = (seq[0] if seq else 0) + 1
+        self.next_id += 1
+        return self.next_id - 1
+
+    def append(self, expense_id: int, date: datetime.date, time: str, description: str, cents: int,
+               currency: str = DEFAULT_CURRENCY) -> None:
+        """
+        Insert an expense
+        :param expense_id: int expense id
+        :param date: date of the expense
+        :param time: string time of the expense
+        :param description: string expense description
+        :param cents: int amount in cents
+        :param currency: string currency code
+        :return: None
+        """
+        self.connection.execute('INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (expense_id, date.isoformat(), time, description, normalise(description),
+                                 cents, currency))
+
+    def find(self, expense_id: str) -> Optional[int]:
+        """
+        Find an expense
+        :param expense_id: string expense id
+        :return: int expense id or None if there is no such expense
+        """
+        try:
+            row = self.connection.execute('SELECT id FROM expenses WHERE id = ?', (int(expense_id),)).fetchone()
+        except (ValueError, OverflowError):
+            return None
+        return None if row is None else row[0]
+
+    def entry(self, expense_id: int) -> tuple[str, str, int, str]:
+        """
+        Return what the indexes of an expense are keyed by
+        :param expense_id: int expense id
+        :return: date, YYYY-MM-DD, description, cents and currency
+        """
+        return self.connection.execute('SELECT date, description, amount, currency FROM expenses WHERE id = ?',
+                                       (expense_id,)).fetchone()
+
+    def remove(self, expense_id: int) -> None:
+        """
+        Delete an expense
+        :param expense_id: int expense id
+        :return: None
+        """
+        self.connection.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+
+    def set_description(self, expense_id: int, description: str) -> None:
+        """
+        Change the description of an expense
+        :param expense_id: int expense id
+        :param description: string expense description
+        :return: None
+        """
+        self.connection.execute('UPDATE expenses SET description = ?, normalised = ? WHERE id = ?',
+                                (description, normalise(description), expense_id))
+
+    def set_amount(self, expense_id: int, cents: int, currency: str) -> None:
+        """
+        Change the amount of an expense
+        :param expense_id: int expense id
+        :param cents: int amount in cents
+        :param currency: string currency code
+        :return: None
+        """
+        self.connection.execute('UPDATE expenses SET amount = ?, currency = ? WHERE id = ?',
+                                (cents, currency, expense_id))
+
+    def stream(self) -> Iterator[tuple[int, str, str, str, int, str]]:
+        """
+        Read the expenses one at a time in the order of their ids
+        :return: iterator of id, date, time, description, cents and currency
+        """
+        return self.connection.execute('SELECT id, date, time, description, amount, currency FROM expenses '
+                                       'ORDER BY id')
+
+    def rows(self) -> Iterator[dict]:
+        """
+        Iterate over the expenses as they are written to the csv file
+        :return: iterator of dict
+        """
+        for expense_id, date, time, description, cents, currency in self.stream():
+            yield {
+                'ID': str(expense_id),
+                'Date': date,
+                'Time': time,
+                'Description': description,
+                'Amount': format_cents(cents),
+                'Currency': currency,
+            }
+
+
+class DatabaseTotals:
+    """
+    Totals of the expenses of a database, in place of the Aggregates sidecar
+    Attributes:
+        database: Database
+        loaded: bool, always True, the totals are kept by the database
+    """
+    loaded = True
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    def new_id(self) -> int:
+        return self.database.new_id()
+
+    def add(self, day: str, name: str, cents: int, count: int = 1, currency: str = DEFAULT_CURRENCY) -> None:
+        # the triggers of the database keep the totals per day and per category
+        pass
+
+    def remove(self, day: str, name: str, cents: int, currency: str = DEFAULT_CURRENCY) -> None:
+        pass
+
+    def between(self, start: str, end: str) -> dict:
+        """
+        Totals of the expenses of a date range
+        :param start: string first date, YYYY-MM-DD
+        :param end: string date after the range, YYYY-MM-DD
+        :return: dict of currency to [cents, count]
+        """
+        return by_currency(self.database.connection.execute(
+            'SELECT currency, sum(amount), sum(count) FROM days WHERE date >= ? AND date < ? GROUP BY currency',
+            (start, end)))
+
+    def groups(self, by: str, rates: Rates) -> dict:
+        """
+        Totals per year, month or day in the base currency
+        :param by: string 'year', 'month' or 'day'
+        :param rates: Rates to the base currency
+        :return: dict of group to [cents, count]
+        """
+        groups = dict()
+        for key, currency, cents, count in self.database.connection.execute(
+                'SELECT substr(date, 1, ?) AS day, currency, sum(amount), sum(count) FROM days '
+                'GROUP BY day, currency', (GROUP_LENGTHS[by],)):
+            groups.setdefault(key, dict())[currency] = [cents, count]
+        return {key: rates.combine(currencies) for key, currencies in groups.items()}
+
+    def total(self, rates: Rates) -> int:
+        """
+        Total of all expenses in the base currency
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        return rates.combine(by_currency(self.database.connection.execute(
+            'SELECT currency, sum(amount), sum(count) FROM days GROUP BY currency')))[0]
+
+    def month_total(self, month: int, rates: Rates) -> int:
+        """
+        Total of the expenses of a month in any year in the base currency
+        :param month: int month, 1 to 12
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        return rates.combine(by_currency(self.database.connection.execute(
+            'SELECT currency, sum(amount), sum(count) FROM days WHERE substr(date, 6, 2) = ? GROUP BY currency',
+            (f'{month:02}',))))[0]
+
+    def spent(self, month: str, name: Optional[str], rates: Rates) -> int:
+        """
+        Running total of a month in the base currency, of all expenses or of one category
+        :param month: string 'YYYY-MM'
+        :param name: string category, None for all expenses
+        :param rates: Rates to the base currency
+        :return: int cents
+        """
+        if name is None:
+            # days of the month sort after 'YYYY-MM' and before 'YYYY-MM-99'
+            return rates.combine(self.between(month, f'{month}-99'))[0]
+        return rates.combine(by_currency(self.database.connection.execute(
+            'SELECT currency, amount, count FROM categories WHERE month = ? AND category = ?', (month, name))))[0]
+
+    def descriptions(self) -> Iterator[tuple[str, str, int, int]]:
+        """
+        Totals per normalised description, read from the description index
+        :return: iterator of description, currency, cents and count
+        """
+        return self.database.connection.execute(
+            'SELECT normalised, currency, sum(amount), count(*) FROM expenses GROUP BY normalised, currency')
+
+
+class DatabaseDuplicates:
+    """
+    Duplicate checks against the expenses of a database, in place of the DuplicateIndex sidecar
+    Attributes:
+        database: Database
+        loaded: bool, always True, the database keeps its indexes up to date
+    """
+    loaded = True
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    def add(self, day: str, description: str, cents: int) -> None:
+        # the database indexes its rows
+        pass
+
+    def remove(self, day: str, description: str, cents: int) -> None:
+        pass
+
+    def matches(self, day: str, description: str, cents: Optional[int] = None,
+                fuzzy: bool = False, tolerance: int = 0) -> int:
+        """
+        Count the expenses a new expense would duplicate
+        :param day: string date, YYYY-MM-DD
+        :param description: string expense description
+        :param cents: int amount in cents, None to match any amount
+        :param fuzzy: bool, compare descriptions ignoring case and whitespace and amounts within tolerance
+        :param tolerance: int cents amounts may differ by in fuzzy mode
+        :return: int number of matching expenses
+        """
+        group = self.database.connection.execute(
+            'SELECT description, amount FROM expenses WHERE date = ? AND normalised = ?',
+            (day, normalise(description))).fetchall()
+        if not fuzzy:
+            tolerance = 0
+            group = [entry for entry in group if entry[0] == description]
+        return sum(1 for _, amount in group if cents is None or abs(amount - cents) <= tolerance)
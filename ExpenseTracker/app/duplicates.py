@@ -0,0 +1,166 @@
+"""Persisted index of expenses by day and description
+
+Adding and importing expenses look up duplicates in this index instead of scanning
+the ledger. Expenses are grouped by day and normalised description, so both the
+exact check and the fuzzy one, which ignores case and whitespace and accepts
+amounts within a tolerance, only look at the few expenses of one group.
+The index is kept in a directory with one json file per month and a manifest
+holding the key of the csv file, so adding an expense reads and writes only the
+file of its month.
+"""
+import datetime
+import json
+import os
+
+from itertools import compress
+from typing import Optional
+
+try:
+    from app.aggregates import Sidecar
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from aggregates import Sidecar
+
+
+def normalise(description: str) -> str:
+    """
+    Normalise a description for fuzzy comparison
+    :param description: string expense description
+    :return: string, case folded with whitespace collapsed
+    """
+    return ' '.join(description.split()).casefold()
+
+
+class DuplicateIndex(Sidecar):
+    """
+    Expenses grouped by day and normalised description
+    Attributes:
+        directory: directory of the manifest and the month files
+        months: set of 'YYYY-MM' that have a month file
+        shards: dict of 'YYYY-MM' to the groups of the month loaded in this session,
+            dict of 'YYYY-MM-DD' to dict of normalised description to list of [description, cents]
+        changed: set of months changed since they were loaded
+        rebuilt: bool, whether month files of months without expenses may be left over
+    """
+    def __init__(self, directory: str):
+        super().__init__(os.path.join(directory, 'index.json'))
+        self.directory = directory
+        self.months = set()
+        self.shards = dict()
+        self.changed = set()
+        self.rebuilt = False
+
+    def restore(self, stored: dict) -> None:
+        self.months = set(stored['months'])
+
+    def state(self) -> dict:
+        return {'months': sorted(self.months)}
+
+    def month_file(self, month: str) -> str:
+        """
+        File of the groups of a month
+        :param month: string 'YYYY-MM'
+        :return: string path
+        """
+        return os.path.join(self.directory, f'{month}.json')
+
+    def shard(self, month: str) -> dict:
+        """
+        Groups of a month, the month file is read on first use
+        :param month: string 'YYYY-MM'
+        :return: dict of 'YYYY-MM-DD' to dict of normalised description to list of [description, cents]
+        """
+        if month not in self.shards:
+            self.shards[month] = dict()
+            if month in self.months:
+                try:
+                    with open(self.month_file(month), 'r') as f:
+                        self.shards[month] = json.load(f)
+                except (OSError, ValueError):
+                    # only duplicate detection of the month is lost, --rebuild-index restores it
+                    pass
+        return self.shards[month]
+
+    def save(self, key: Optional[list]) -> None:
+        """
+        Write the changed month files, then the manifest with key
+        :param key: key of the csv file
+        :return: None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for month in self.changed:
+            if self.shards[month]:
+                with open(self.month_file(month), 'w') as f:
+                    json.dump(self.shards[month], f)
+                self.months.add(month)
+            elif month in self.months:
+                os.remove(self.month_file(month))
+                self.months.discard(month)
+        if self.rebuilt:
+            for name in os.listdir(self.directory):
+                if name != 'index.json' and name[:-len('.json')] not in self.months:
+                    os.remove(os.path.join(self.directory, name))
+        self.changed, self.rebuilt = set(), False
+        super().save(key)
+
+    def rebuild(self, ledger) -> None:
+        # no month file is read, all months are written again on save and left over files removed
+        self.shards, self.months = dict(), set()
+        days = dict()
+        for date, description, cents in compress(zip(ledger.dates, ledger.descriptions, ledger.amounts), ledger.ids):
+            if date not in days:
+                days[date] = datetime.date.fromordinal(date).isoformat()
+            self.add(days[date], description, cents)
+        self.rebuilt = True
+
+    def add(self, day: str, description: str, cents: int) -> None:
+        """
+        Add an expense
+        :param day: string date, YYYY-MM-DD
+        :param description: string expense description
+        :param cents: int amount in cents
+        :return: None
+        """
+        groups = self.shard(day[:7]).setdefault(day, dict())
+        groups.setdefault(normalise(description), list()).append([description, cents])
+        self.changed.add(day[:7])
+        self.dirty = True
+
+    def remove(self, day: str, description: str, cents: int) -> None:
+        """
+        Remove an expense
+        :param day: string date, YYYY-MM-DD
+        :param description: string expense description
+        :param cents: int amount in cents
+        :return: None
+        """
+        shard = self.shard(day[:7])
+        groups = shard.get(day, dict())
+        group = groups.get(normalise(description), [])
+        # the expense is missing when its month file was lost, only its duplicate detection is
+        if [description, cents] not in group:
+            return
+        group.remove([description, cents])
+        if not group:
+            del groups[normalise(description)]
+            if not groups:
+                del shard[day]
+        self.changed.add(day[:7])
+        self.dirty = True
+
+    def matches(self, day: str, description: str, cents: Optional[int] = None,
+                fuzzy: bool = False, tolerance: int = 0) -> int:
+        """
+        Count the expenses a new expense would duplicate
+        :param day: string date, YYYY-MM-DD
+        :param description: string expense description
+        :param cents: int amount in cents, None to match any amount
+        :param fuzzy: bool, compare descriptions ignoring case and whitespace and amounts within tolerance
+        :param tolerance: int cents amounts may differ by in fuzzy mode
+        :return: int number of matching expenses
+        """
+        group = self.shard(day[:7]).get(day, dict()).get(normalise(description), ())
+        if not fuzzy:
+            tolerance = 0
+            group = [entry for entry in group if entry[0] == description]
+        return sum(1 for _, amount in group if cents is None or abs(amount - cents) <= tolerance)
@@ -0,0 +1,157 @@
+"""Export of expenses to a columnar file
+
+The layout follows Parquet and Arrow without needing either library: rows are
+written in row groups, each column of a row group is one little-endian buffer,
+and a json footer at the end lists the columns, the offset and length of every
+buffer and the dictionaries of descriptions and currencies. The file ends with the
+length of the footer and the magic bytes.
+    MAGIC | row group buffers ... | footer json | footer length (uint64) | MAGIC
+Columns:
+    id: int64
+    date: int32, days since 1970-01-01
+    time: int64, microseconds since midnight, -1 when the time is unknown
+    description: int32, index into the dictionary of the footer
+    amount: int64, cents
+    currency: int32, index into the dictionary of the footer
+Only one row group and the dictionaries are held in memory while exporting.
+"""
+import datetime
+import json
+import os
+import struct
+import sys
+
+from array import array
+from functools import lru_cache
+from itertools import batched
+from typing import Iterable
+
+MAGIC = b'EXPCOLS1'
+ROW_GROUP = 65536
+COLUMNS = [('id', 'q'), ('date', 'i'), ('time', 'q'), ('description', 'i'), ('amount', 'q'), ('currency', 'i')]
+DICTIONARY_COLUMNS = ('description', 'currency')
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+TRAILER = struct.Struct('<Q')
+
+
+@lru_cache(maxsize=4096)
+def epoch_day(date: str) -> int:
+    """
+    Days of a date since 1970-01-01
+    :param date: string date, YYYY-MM-DD
+    :return: int days
+    """
+    return datetime.date.fromisoformat(date).toordinal() - EPOCH
+
+
+def micros(time: str) -> int:
+    """
+    Microseconds of a time since midnight
+    :param time: string time, HH:MM:SS.ffffff
+    :return: int microseconds, -1 if time is empty or invalid
+    """
+    try:
+        parsed = datetime.time.fromisoformat(time)
+    except ValueError:
+        return -1
+    return ((parsed.hour * 60 + parsed.minute) * 60 + parsed.second) * 1_000_000 + parsed.microsecond
+
+
+def little_endian(column: array) -> bytes:
+    """
+    Bytes of an array in little-endian order
+    :param column: array
+    :return: bytes
+    """
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def encoder(dictionary: dict):
+    """
+    Function giving the index of a value in a dictionary column, new values are added
+    :param dictionary: dict of value to index
+    :return: function of value to int index
+    """
+    def encode(value: str) -> int:
+        index = dictionary.get(value)
+        if index is None:
+            index = dictionary[value] = len(dictionary)
+        return index
+    return encode
+
+
+def export(expenses: Iterable[tuple], file: str, row_group: int = ROW_GROUP) -> int:
+    """
+    Export expenses to a columnar file, the file is replaced once it is complete
+    and the temporary file is removed if the expenses can not be read
+    :param expenses: iterable of id, date, time, description, cents and currency, like ledger.stream
+    :param file: path of the columnar file
+    :param row_group: int number of rows per row group
+    :return: int number of exported expenses
+    """
+    dictionaries = {name: dict() for name in DICTIONARY_COLUMNS}
+    row_groups = list()
+    temp = f'{file}.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            f.write(MAGIC)
+            for rows in batched(expenses, row_group):
+                ids, dates, times, descriptions, amounts, currencies = zip(*rows)
+                columns = [
+                    array('q', ids),
+                    array('i', map(epoch_day, dates)),
+                    array('q', map(micros, times)),
+                    array('i', map(encoder(dictionaries['description']), descriptions)),
+                    array('q', amounts),
+                    array('i', map(encoder(dictionaries['currency']), currencies)),
+                ]
+                buffers = list()
+                for column in columns:
+                    data = little_endian(column)
+                    buffers.append([f.tell(), len(data)])
+                    f.write(data)
+                row_groups.append({'rows': len(rows), 'buffers': buffers})
+            footer = json.dumps({
+                'columns': [{'name': name, 'type': code} for name, code in COLUMNS],
+                'row_groups': row_groups,
+                'dictionaries': {name: list(values) for name, values in dictionaries.items()},
+            }).encode()
+            f.write(footer)
+            f.write(TRAILER.pack(len(footer)))
+            f.write(MAGIC)
+    except Exception:
+        # a failed stream, like a missing csv file, leaves no partial file behind
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp, file)
+    return sum(group['rows'] for group in row_groups)
+
+
+def read_export(file: str) -> dict:
+    """
+    Read a columnar file back
+    :param file: path of the columnar file
+    :raises ValueError: if file is not a columnar export
+    :return: dict of column name to array, and 'dictionaries' to dict of column name to list of values
+    """
+    with open(file, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{file} is not a columnar export')
+        f.seek(-(TRAILER.size + len(MAGIC)), os.SEEK_END)
+        (length,) = TRAILER.unpack(f.read(TRAILER.size))
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{file} is not a complete columnar export')
+        f.seek(-(length + TRAILER.size + len(MAGIC)), os.SEEK_END)
+        footer = json.loads(f.read(length))
+        columns = {column['name']: array(column['type']) for column in footer['columns']}
+        for group in footer['row_groups']:
+            for (name, column), (offset, size) in zip(columns.items(), group['buffers']):
+                f.seek(offset)
+                part = array(column.typecode, f.read(size))
+                if sys.byteorder != 'little':
+                    part.byteswap()
+                column.extend(part)
+    return {**columns, 'dictionaries': footer['dictionaries']}
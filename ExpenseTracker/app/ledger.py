@@ -0,0 +1,292 @@
+"""Typed columnar ledger of expenses
+
+Rows of the csv file are kept as one typed column per field instead of a dict of
+strings per row: ids, date ordinals and amounts in cents live in arrays,
+descriptions and currencies are interned, so nothing is parsed again once the file
+is read. Amounts are written as fixed-point decimals
+with their currency, files with the older '12$' amounts and no currency column are
+read as amounts in the default currency and written again in the current format.
+Rows are found by id through a dict of id to row. A removed row is blanked in place,
+its id, date and amount become 0, so the rows after it keep their positions; removed
+rows are left out when the ledger is written.
+Rows added since the csv file was read or written are appended to it, the file is only
+written whole after a row was changed or removed.
+"""
+import csv
+import datetime
+import os
+import sys
+
+from array import array
+from functools import cache, lru_cache
+from itertools import compress
+from typing import Iterator, Optional
+
+try:
+    from app.money import DEFAULT_CURRENCY, format_cents, parse_amount
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from money import DEFAULT_CURRENCY, format_cents, parse_amount
+
+FIELDNAMES = ['ID', 'Date', 'Time', 'Description', 'Amount', 'Currency']
+
+
+def stream(file: str) -> Iterator[tuple[int, str, str, str, int, str]]:
+    """
+    Read the expenses of a csv file one at a time, without building a ledger
+    :param file: csv file
+    :raises FileNotFoundError: if file does not exist
+    :return: iterator of id, date, time, description, cents and currency
+    """
+    amount = lru_cache(maxsize=4096)(parse_amount)
+    with open(file, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        ids, dates, times, descriptions, amounts = (header.index(name) for name in FIELDNAMES[:5])
+        currencies = header.index('Currency') if 'Currency' in header else None
+        for row in reader:
+            if row:
+                currency = DEFAULT_CURRENCY if currencies is None else row[currencies]
+                yield int(row[ids]), row[dates], row[times], row[descriptions], amount(row[amounts]), currency
+
+
+def last_byte(file: str) -> bytes:
+    """
+    Return the last byte of a file
+    :param file: path of the file
+    :return: bytes, empty if the file is empty
+    """
+    with open(file, 'rb') as f:
+        if not f.seek(0, os.SEEK_END):
+            return b''
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+
+class Ledger:
+    """
+    Columns of the expenses
+    Attributes:
+        ids: array of int expense ids
+        dates: array of int date ordinals
+        times: list of string times
+        descriptions: list of interned string descriptions
+        amounts: array of int amounts in cents
+        currencies: list of interned string currency codes
+        positions: dict of int expense id to row
+        removed: int, number of removed rows
+        stored: int, number of rows already in the csv file, None if the file has to be written whole
+    """
+    def __init__(self):
+        self.ids = array('q')
+        self.dates = array('l')
+        self.times = list()
+        self.descriptions = list()
+        self.amounts = array('q')
+        self.currencies = list()
+        self.positions = dict()
+        self.removed = 0
+        self.stored = None
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.removed
+
+    @classmethod
+    def read(cls, file: str) -> 'Ledger':
+        """
+        Read a ledger from a csv file
+        :param file: csv file
+        :raises FileNotFoundError: if file does not exist
+        :raises ValueError: if a row has fewer fields than the header
+        :return: Ledger
+        """
+        ledger = cls()
+        with open(file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            names = header or FIELDNAMES
+            rows = list()
+            # blank lines are skipped like stream does, a short row would cut every column down to its length
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < len(names):
+                    raise ValueError(f'line {reader.line_num} of {file} has {len(row)} of {len(names)} fields')
+                rows.append(row)
+            columns = dict(zip(names, zip(*rows))) or dict.fromkeys(names, ())
+        # dates and amounts repeat a lot, each distinct value is parsed once
+        ordinal = cache(lambda date: datetime.date.fromisoformat(date).toordinal())
+        ledger.ids = array('q', map(int, columns['ID']))
+        ledger.dates = array('l', map(ordinal, columns['Date']))
+        ledger.times = list(columns['Time'])
+        ledger.descriptions = list(map(sys.intern, columns['Description']))
+        ledger.amounts = array('q', map(cache(parse_amount), columns['Amount']))
+        if 'Currency' in columns:
+            ledger.currencies = list(map(sys.intern, columns['Currency']))
+        else:
+            ledger.currencies = [DEFAULT_CURRENCY] * len(ledger.ids)
+        ledger.positions = dict(zip(ledger.ids, range(len(ledger.ids))))
+        # rows are appended in the order of FIELDNAMES
+        ledger.stored = len(ledger.ids) if header == FIELDNAMES else None
+        return ledger
+
+    @classmethod
+    def for_append(cls, file: str) -> Optional['Ledger']:
+        """
+        Start an empty ledger whose rows are appended to the rows already in a csv file,
+        only the header of the file is read
+        :param file: csv file
+        :return: Ledger or None if the file is missing or its header is not FIELDNAMES
+        """
+        try:
+            with open(file, 'r', newline='') as f:
+                header = next(csv.reader(f), None)
+        except FileNotFoundError:
+            return None
+        if header != FIELDNAMES:
+            return None
+        ledger = cls()
+        ledger.stored = 0
+        return ledger
+
+    def extend(self, other: 'Ledger') -> None:
+        """
+        Append the rows of a ledger without removed rows
+        :param other: Ledger
+        :return: None
+        """
+        offset = len(self.ids)
+        self.positions.update(zip(other.ids, range(offset, offset + len(other.ids))))
+        self.ids.extend(other.ids)
+        self.dates.extend(other.dates)
+        self.times.extend(other.times)
+        self.descriptions.extend(other.descriptions)
+        self.amounts.extend(other.amounts)
+        self.currencies.extend(other.currencies)
+
+    def write(self, file: str) -> None:
+        """
+        Write the ledger to a csv file, only rows added since it was read or written are
+        appended unless a row was changed or removed
+        :param file: csv file
+        :return: None
+        """
+        if self.stored is None or not os.path.exists(file):
+            with open(file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(FIELDNAMES)
+                writer.writerows(row.values() for row in self.rows())
+        else:
+            # a file edited by hand may lack the line break of its last row
+            missing_newline = last_byte(file) != b'\n'
+            with open(file, 'a', newline='') as f:
+                if missing_newline:
+                    f.write('\r\n')
+                csv.writer(f).writerows(row.values() for row in self.rows(self.stored))
+        self.stored = len(self.ids)
+
+    def append(self, expense_id: int, date: datetime.date, time: str, description: str, cents: int,
+               currency: str = DEFAULT_CURRENCY) -> None:
+        """
+        Append an expense
+        :param expense_id: int expense id
+        :param date: date of the expense
+        :param time: string time of the expense
+        :param description: string expense description
+        :param cents: int amount in cents
+        :param currency: string currency code
+        :return: None
+        """
+        self.positions[expense_id] = len(self.ids)
+        self.ids.append(expense_id)
+        self.dates.append(date.toordinal())
+        self.times.append(time)
+        self.descriptions.append(sys.intern(description))
+        self.amounts.append(cents)
+        self.currencies.append(sys.intern(currency))
+
+    def remove(self, index: int) -> None:
+        """
+        Remove the expense in row index, the row is blanked so other rows keep their positions
+        :param index: int row
+        :return: None
+        """
+        del self.positions[self.ids[index]]
+        for column in (self.ids, self.dates, self.amounts):
+            column[index] = 0
+        self.removed += 1
+        self.stored = None
+
+    def set_description(self, index: int, description: str) -> None:
+        """
+        Change the description of the expense in row index
+        :param index: int row
+        :param description: string expense description
+        :return: None
+        """
+        self.descriptions[index] = sys.intern(description)
+        self.stored = None
+
+    def set_amount(self, index: int, cents: int, currency: str) -> None:
+        """
+        Change the amount of the expense in row index
+        :param index: int row
+        :param cents: int amount in cents
+        :param currency: string currency code
+        :return: None
+        """
+        self.amounts[index] = cents
+        self.currencies[index] = sys.intern(currency)
+        self.stored = None
+
+    def find(self, expense_id: str) -> Optional[int]:
+        """
+        Find the row of an expense
+        :param expense_id: string expense id
+        :return: int row or None if there is no such expense
+        """
+        try:
+            return self.positions.get(int(expense_id))
+        except ValueError:
+            return None
+
+    def day(self, index: int) -> str:
+        """
+        Return the date of the expense in row index
+        :param index: int row
+        :return: string date, YYYY-MM-DD
+        """
+        return datetime.date.fromordinal(self.dates[index]).isoformat()
+
+    def entry(self, index: int) -> tuple[str, str, int, str]:
+        """
+        Return what the indexes of an expense are keyed by
+        :param index: int row
+        :return: date, YYYY-MM-DD, description, cents and currency
+        """
+        return self.day(index), self.descriptions[index], self.amounts[index], self.currencies[index]
+
+    def row(self, index: int) -> dict:
+        """
+        Return the expense in row index as it is written to the csv file
+        :param index: int row
+        :return: dict of string fields
+        """
+        return {
+            'ID': str(self.ids[index]),
+            'Date': self.day(index),
+            'Time': self.times[index],
+            'Description': self.descriptions[index],
+            'Amount': format_cents(self.amounts[index]),
+            'Currency': self.currencies[index],
+        }
+
+    def rows(self, start: int = 0) -> Iterator[dict]:
+        """
+        Iterate over the expenses as they are written to the csv file, removed rows are skipped
+        :param start: int first row
+        :return: iterator of dict
+        """
+        return map(self.row, compress(range(start, len(self.ids)), self.ids[start:]))
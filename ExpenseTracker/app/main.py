@@ -1,7 +1,32 @@
 import argparse
 import calendar
-import csv
 import datetime
+import os
+
+from collections import Counter
+from typing import Optional
+
+try:
+    from app.aggregates import Aggregates, Sidecar, category, file_key
+    from app.budgets import Budgets, crossed
+    from app.database import Database, DatabaseDuplicates, DatabaseTotals
+    from app.duplicates import DuplicateIndex, normalise
+    from app.export import export
+    from app.ledger import Ledger, stream
+    from app.money import DEFAULT_CURRENCY, Rates, format_amount, parse_amount
+    from app.report import description_totals, format_report, prefix_totals
+    from app.statements import read_statement, statement_expense
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from aggregates import Aggregates, Sidecar, category, file_key
+    from budgets import Budgets, crossed
+    from database import Database, DatabaseDuplicates, DatabaseTotals
+    from duplicates import DuplicateIndex, normalise
+    from export import export
+    from ledger import Ledger, stream
+    from money import DEFAULT_CURRENCY, Rates, format_amount, parse_amount
+    from report import description_totals, format_report, prefix_totals
+    from statements import read_statement, statement_expense
 
 
 class ExpenseTracker:
@@ -10,79 +35,238 @@ class ExpenseTracker:
     Attributes:
         parser: argparse parser
         file: csv file
-        expense: list[dict()]
+        expense: Ledger, columns of the expenses
+        loaded: bool, whether file was read in this session
+        dirty: bool, whether expense has changes that are not saved to file
+        aggregates: Aggregates, totals per year, month and day kept in a sidecar of file
+        duplicates: DuplicateIndex, expenses by day and description kept in a sidecar of file
+        sidecars: tuple of the sidecars, updated on every change to expense
+        rates: Rates, exchange rates totals of other currencies are converted with
+        database: SQLite file --migrate copies file to
+        budgets: Budgets, monthly budgets checked when an expense is added
     """
     def __init__(self):
         self.parser = argparse.ArgumentParser(prog='Expense Tracker')
         self.file = 'expense.csv'
-        self.expense = list()
+        self.expense = Ledger()
+        self.loaded = False
+        self.dirty = False
+        self.aggregates = Aggregates(f'{os.path.splitext(self.file)[0]}.index.json',
+                                     f'{os.path.splitext(self.file)[0]}.ids.json')
+        self.duplicates = DuplicateIndex(f'{os.path.splitext(self.file)[0]}.duplicates')
+        self.sidecars = (self.aggregates, self.duplicates)
+        self.rates = Rates('rates.csv')
+        self.database = f'{os.path.splitext(self.file)[0]}.db'
+        self.budgets = Budgets('budgets.csv')
         self.add_arguments()
 
     def add_arguments(self):
         self.parser.add_argument('-a', '--add', action='store_true', help='Add an expense')
         self.parser.add_argument('-d', '--description', help='Add a description')
-        self.parser.add_argument('-am', '--amount', type=int, help='Add an amount')
+        self.parser.add_argument('-am', '--amount', type=parse_amount, help='Add an amount')
+        self.parser.add_argument('-c', '--currency', type=str.upper,
+                                 help=f'Currency of the amount, {DEFAULT_CURRENCY} when adding and unchanged '
+                                      f'when updating by default')
         self.parser.add_argument('-u', '--update', help='Update an expense')
         self.parser.add_argument('-de', '--delete', help='Delete an expense')
         self.parser.add_argument('-l', '--list', action='store_true', help='List all expenses')
         self.parser.add_argument('-s', '--summary', action='store_true', help='view a specific months expense summery')
         self.parser.add_argument('-m', '--month', type=int, help='view a specific month expense summery')
+        self.parser.add_argument('-i', '--import', dest='statement', help='Import expenses from a csv or OFX statement')
+        self.parser.add_argument('--dry-run', action='store_true', help='Report what an import would add')
+        self.parser.add_argument('--fuzzy', action='store_true',
+                                 help='Find duplicates ignoring case and whitespace of descriptions')
+        self.parser.add_argument('--tolerance', type=parse_amount,
+                                 help='With --fuzzy, amounts differing by at most this much are duplicates')
+        self.parser.add_argument('-r', '--report', choices=['year', 'month', 'day', 'description'],
+                                 help='Report totals grouped by year, month, day or description')
+        self.parser.add_argument('--top', type=int, help='Only report the groups with the largest totals')
+        self.parser.add_argument('--words', type=int, default=1,
+                                 help='Words of the description that group expenses in a description report')
+        self.parser.add_argument('-e', '--export', help='Export expenses to a columnar file')
+        self.parser.add_argument('--rebuild-index', action='store_true', help='Compute the expense indexes again')
+        self.parser.add_argument('-b', '--budget', type=parse_amount,
+                                 help='Set the monthly budget of all expenses or of --category, 0 removes it')
+        self.parser.add_argument('--category', default='', type=str.casefold,
+                                 help='Category of the budget, the first word of the descriptions it covers')
+        self.parser.add_argument('--migrate', action='store_true',
+                                 help='Copy the expenses to an SQLite database that is used from then on')
 
-    def load(self) -> list[dict]:
+    def load(self) -> Ledger:
         """
-        Load csv file
-        :raises FileNotFoundError: if file does not exist
-        :return: list of expense
+        Load csv file, it is read once per session and later calls return the loaded expenses.
+        Expenses added before the file was read are kept, the sidecars are loaded along,
+        so every change to the expenses is applied to them
+        :return: Ledger of expenses
         """
+        if self.loaded:
+            return self.expense
+        pending = self.expense
         try:
-            with open(self.file, 'r', newline='') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.expense.append(row)
+            self.expense = Ledger.read(self.file)
         except FileNotFoundError:
+            self.expense = Ledger()
             print('File not found')
+        except ValueError as error:
+            # going on with an empty ledger would reuse ids and overwrite the file
+            self.parser.exit(1, f'Can not read {self.file}: {error}\n')
+        self.expense.extend(pending)
+        self.loaded = True
+        for sidecar in self.sidecars:
+            self.load_sidecar(sidecar)
+        return self.expense
+
+    def load_for_append(self) -> Ledger:
+        """
+        Load what adding expenses needs, the csv file is only read when a sidecar is out of date
+        or the file can not be appended to, otherwise new expenses go to an empty ledger
+        that is appended to the file
+        :return: Ledger to add expenses to
+        """
+        for sidecar in self.sidecars:
+            self.load_sidecar(sidecar)
+        if not self.loaded and self.expense.stored is None:
+            ledger = Ledger.for_append(self.file)
+            if ledger is None:
+                return self.load()
+            self.expense = ledger
         return self.expense
 
+    def load_sidecar(self, sidecar: Sidecar) -> Sidecar:
+        """
+        Load a sidecar once per session, it is rebuilt from the csv file
+        when it is missing or was computed from another version of the file
+        :param sidecar: one of sidecars
+        :return: the loaded sidecar
+        """
+        if not sidecar.loaded:
+            sidecar.loaded = True
+            if not sidecar.load(file_key(self.file)):
+                sidecar.rebuild(self.load())
+        return sidecar
+
     def save(self) -> None:
         """
-        Save csv file
+        Save csv file if expenses changed since it was loaded or last saved,
+        and the sidecars with the key of the saved file
         :return: None
         """
-        for index, expense in enumerate(self.expense):
-            expense['ID'] = index + 1
-        with open(self.file, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=['ID', 'Date', 'Time', 'Description', 'Amount'])
-            writer.writeheader()
-            writer.writerows(self.expense)
+        if self.dirty:
+            self.expense.write(self.file)
+            self.dirty = False
+            for sidecar in self.sidecars:
+                sidecar.dirty = sidecar.dirty or sidecar.loaded
+        for sidecar in self.sidecars:
+            if sidecar.dirty:
+                sidecar.save(file_key(self.file))
 
-    def add_expense(self, description: str, amount: int) -> None:
+    def add_expense(self, description: str, cents: int, fuzzy: bool = False, tolerance: Optional[int] = None,
+                    currency: Optional[str] = None) -> None:
         """
-        Add an expense, checks if there is an expense with same description in expenses
+        Add an expense, checks if there is an expense with same description today in expenses
         :param description: string expense description
-        :param amount: int expense amount
+        :param cents: int expense amount in cents
+        :param fuzzy: bool, compare descriptions ignoring case and whitespace
+        :param tolerance: int cents, in fuzzy mode only expenses whose amount is within it are duplicates
+        :param currency: string currency of the amount, None for the default currency
         :return: None
         """
-        self.expense = self.load()
-        filtered = list(filter(
-                lambda entry:
-                entry['Description'] == description and entry['Date'] == datetime.date.today().strftime('%Y-%m-%d'),
-                self.expense
-            ))
-        if len(filtered) > 0:
+        currency = currency or DEFAULT_CURRENCY
+        ledger = self.load_for_append()
+        today = datetime.date.today()
+        if self.duplicates.matches(today.isoformat(), description, None if tolerance is None else cents,
+                                   fuzzy, tolerance or 0):
             print(f'There is a expense with this description {description}')
             decision = input('If you want to add expense print yes otherwise the expense will be dismissed: ')
             if decision.lower().strip() != 'yes':
                 return
-        expense = {
-            'ID': len(self.expense) + 1,
-            'Date': datetime.date.today().strftime('%Y-%m-%d'),
-            'Time': datetime.datetime.now().time(),
-            'Description': description,
-            'Amount': f'{amount}$',
-        }
-        self.expense.append(expense)
-        self.save()
-        print(f'Expense added successfully (ID: {expense["ID"]})')
+        expense_id = self.aggregates.new_id()
+        ledger.append(expense_id, today, datetime.datetime.now().time().isoformat(), description, cents, currency)
+        self.aggregates.add(today.isoformat(), category(description), cents, currency=currency)
+        self.duplicates.add(today.isoformat(), description, cents)
+        self.dirty = True
+        print(f'Expense added successfully (ID: {expense_id})')
+        self.check_budgets(today.isoformat()[:7], description, cents, currency)
+
+    def check_budgets(self, month: str, description: str, cents: int, currency: str) -> None:
+        """
+        Warn when an expense that was just added crossed a threshold of the budget of its month
+        or of its category, the running totals of the month are looked up, not summed again
+        :param month: string 'YYYY-MM' of the expense
+        :param description: string expense description
+        :param cents: int expense amount in cents
+        :param currency: string currency of the amount
+        :return: None
+        """
+        converted = self.rates.convert(cents, currency)
+        if converted is None or not self.budgets.limits:
+            return
+        # a blank description has no category, its expense only counts against the monthly budget
+        for name in dict.fromkeys(('', category(description))):
+            limit = self.budgets.limits.get(name)
+            if limit is None:
+                continue
+            spent = self.aggregates.spent(month, name or None, self.rates)
+            threshold = crossed(spent - converted, spent, limit)
+            if threshold is not None:
+                print(f'Warning: {format_amount(spent)} spent in {month}, {threshold}% of the '
+                      f'{name or "monthly"} budget of {format_amount(limit)}')
+
+    def set_budget(self, name: str, cents: int) -> None:
+        """
+        Set a monthly budget
+        :param name: string category, empty for all expenses
+        :param cents: int budget in cents, 0 removes the budget
+        :return: None
+        """
+        self.budgets.set(name, cents)
+        label = f'Budget for {name}' if name else 'Monthly budget'
+        print(f'{label} set to {format_amount(cents)}' if cents else f'{label} removed')
+
+    def import_statement(self, file: str, dry_run: bool = False, fuzzy: bool = False, tolerance: int = 0) -> None:
+        """
+        Import the expenses of a bank statement in one pass, an expense with the same date,
+        description and amount as an expense already in expenses is a duplicate and skipped.
+        Nothing is imported when the statement can not be read
+        :param file: csv or OFX statement
+        :param dry_run: bool, only report what would be imported
+        :param fuzzy: bool, compare descriptions ignoring case and whitespace and amounts within tolerance
+        :param tolerance: int cents amounts of duplicates may differ by in fuzzy mode
+        :return: None
+        """
+        ledger = self.load_for_append()
+        # a statement with the same expense twice skips only as many as expenses already has
+        used = Counter()
+        expenses, duplicates, without_amount, invalid = list(), 0, 0, 0
+        try:
+            for line, transaction in read_statement(file):
+                try:
+                    expense = statement_expense(transaction)
+                except ValueError as error:
+                    print(f'Line {line}: {error}')
+                    invalid += 1
+                    continue
+                if expense is None:
+                    without_amount += 1
+                    continue
+                date, _, description, cents, _ = expense
+                key = (date, normalise(description)) if fuzzy else (date, description, cents)
+                if self.duplicates.matches(date.isoformat(), description, cents, fuzzy, tolerance) > used[key]:
+                    used[key] += 1
+                    duplicates += 1
+                    continue
+                expenses.append(expense)
+        except (OSError, ValueError) as error:
+            print(f'Import failed: {error}')
+            return
+        if not dry_run:
+            for date, time, description, cents, currency in expenses:
+                ledger.append(self.aggregates.new_id(), date, time, description, cents, currency)
+                self.aggregates.add(date.isoformat(), category(description), cents, currency=currency)
+                self.duplicates.add(date.isoformat(), description, cents)
+            self.dirty = self.dirty or bool(expenses)
+        print(f'{"Would import" if dry_run else "Imported"} {len(expenses)} expenses, '
+              f'skipped {duplicates} duplicates, {without_amount} without amount and {invalid} invalid lines')
 
     def update_description(self, task_id: str, description: str) -> None:
         """
@@ -91,30 +275,40 @@ class ExpenseTracker:
         :param description: string expense description
         :return: None
         """
-        self.expense = self.load()
-        for expense in self.expense:
-            if expense['ID'] == task_id:
-                expense['Description'] = description
-                print(f'Description for ID: {task_id} have changed to {description}')
-                self.save()
-                return
-        print(f'Task with ID {task_id} not found')
+        index = self.load().find(task_id)
+        if index is None:
+            print(f'Task with ID {task_id} not found')
+            return
+        day, old, cents, currency = self.expense.entry(index)
+        self.aggregates.remove(day, category(old), cents, currency)
+        self.aggregates.add(day, category(description), cents, currency=currency)
+        self.duplicates.remove(day, old, cents)
+        self.duplicates.add(day, description, cents)
+        self.expense.set_description(index, description)
+        self.dirty = True
+        print(f'Description for ID: {task_id} have changed to {description}')
 
-    def update_amount(self, task_id: str, amount: int) -> None:
+    def update_amount(self, task_id: str, cents: int, currency: Optional[str] = None) -> None:
         """
         Update amount of an expense with the task id
         :param task_id: string of task id
-        :param amount: int expense amount
+        :param cents: int expense amount in cents
+        :param currency: string currency of the amount, None to keep the currency of the expense
         :return: None
         """
-        self.expense = self.load()
-        for expense in self.expense:
-            if expense['ID'] == task_id:
-                expense['Amount'] = f'{amount}$'
-                print(f'Amount for ID: {task_id} have changed to {amount}')
-                self.save()
-                return
-        print(f'Task with ID {task_id} not found')
+        index = self.load().find(task_id)
+        if index is None:
+            print(f'Task with ID {task_id} not found')
+            return
+        day, description, old, old_currency = self.expense.entry(index)
+        currency = currency or old_currency
+        self.aggregates.remove(day, category(description), old, old_currency)
+        self.aggregates.add(day, category(description), cents, currency=currency)
+        self.duplicates.remove(day, description, old)
+        self.duplicates.add(day, description, cents)
+        self.expense.set_amount(index, cents, currency)
+        self.dirty = True
+        print(f'Amount for ID: {task_id} have changed to {format_amount(cents, currency)}')
 
     def delete_expense(self, task_id: str) -> None:
         """
@@ -122,51 +316,196 @@ class ExpenseTracker:
         :param task_id: string expense task id
         :return: None
         """
-        self.expense = self.load()
-        for expense in self.expense:
-            if expense['ID'] == task_id:
-                self.expense.remove(expense)
-                self.save()
-                print(f'Expense with ID:{task_id} deleted')
+        index = self.load().find(task_id)
+        if index is None:
+            print(f'Task with ID {task_id} not found')
+            return
+        day, description, cents, currency = self.expense.entry(index)
+        self.aggregates.remove(day, category(description), cents, currency)
+        self.duplicates.remove(day, description, cents)
+        self.expense.remove(index)
+        self.dirty = True
+        print(f'Expense with ID:{task_id} deleted')
+
+    def read_expenses(self):
+        """
+        Read the saved expenses one at a time
+        :raises FileNotFoundError: if file does not exist
+        :return: iterator of id, date, time, description, cents and currency
+        """
+        return stream(self.file)
+
+    def description_groups(self, words: int) -> dict:
+        """
+        Totals by the first words of the description, streamed from the saved csv file
+        :param words: int number of words of the description that make up its group
+        :raises FileNotFoundError: if file does not exist
+        :return: dict of description prefix to [cents, count]
+        """
+        return description_totals(self.read_expenses(), self.rates, words)
+
+    def report(self, by: str, top: Optional[int] = None, words: int = 1) -> None:
+        """
+        Print totals grouped by year, month or day from the totals sidecar,
+        or grouped by description prefix streamed from the saved csv file
+        :param by: string 'year', 'month', 'day' or 'description'
+        :param top: int, only the groups with the largest totals
+        :param words: int number of words of the description that make up its group
+        :return: None
+        """
+        if by == 'description':
+            try:
+                groups = self.description_groups(words)
+            except FileNotFoundError:
+                print('File not found')
                 return
-        print(f'Task with ID {task_id} not found')
+        else:
+            groups = self.load_sidecar(self.aggregates).groups(by, self.rates)
+        print('\n'.join(format_report(groups, by.capitalize(), top, by_total=by == 'description')))
+        self.warn_missing_rates()
+
+    def warn_missing_rates(self) -> None:
+        """
+        Print the currencies left out of the totals shown so far for lack of an exchange rate
+        :return: None
+        """
+        for currency in sorted(self.rates.missing):
+            print(f'No exchange rate for {currency} in {self.rates.file}, left out of totals')
+        self.rates.missing.clear()
+
+    def export(self, file: str) -> None:
+        """
+        Export the saved expenses to a columnar file, streamed from the csv file
+        :param file: path of the columnar file
+        :return: None
+        """
+        try:
+            count = export(self.read_expenses(), file)
+        except FileNotFoundError:
+            print('File not found')
+            return
+        print(f'Exported {count} expenses to {file}')
+
+    def migrate(self) -> None:
+        """
+        Copy the saved expenses to a new SQLite database, the tracker uses it instead of file from then on
+        :return: None
+        """
+        if os.path.exists(self.database):
+            print(f'{self.database} already exists')
+            return
+        next_id = self.load_sidecar(self.aggregates).next_id
+        try:
+            count = Database.create(self.database, self.read_expenses(), next_id)
+        except FileNotFoundError:
+            print('File not found')
+            return
+        except ValueError as error:
+            print(f'Migration failed: {error}')
+            return
+        print(f'Migrated {count} expenses to {self.database}, it is used instead of {self.file} from now on')
 
     def run(self) -> None:
         """
-        Run expense tracker
+        Run expense tracker, the csv file is loaded at most once and changes are saved once at the end
         :return: None
         """
         args = self.parser.parse_args()
+        if args.migrate:
+            # other flags would change a file that is no longer used
+            if any(value != self.parser.get_default(name) for name, value in vars(args).items() if name != 'migrate'):
+                self.parser.error('--migrate can not be combined with other arguments')
+            self.migrate()
+            return
+        if args.budget is not None:
+            self.set_budget(args.category, args.budget)
+        if args.rebuild_index:
+            for sidecar in self.sidecars:
+                sidecar.rebuild(self.load())
+            print(f'Index rebuilt from {len(self.expense)} expenses')
         if args.add and args.description and args.amount:
-            self.add_expense(args.description, args.amount)
+            self.add_expense(args.description, args.amount, args.fuzzy, args.tolerance, args.currency)
+        if args.statement:
+            self.import_statement(args.statement, args.dry_run, args.fuzzy, args.tolerance or 0)
         if args.update and args.description:
             self.update_description(args.update, args.description)
         if args.update and args.amount:
-            self.update_amount(args.update, args.amount)
+            self.update_amount(args.update, args.amount, args.currency)
         if args.delete:
             self.delete_expense(args.delete)
         if args.list:
             expenses = self.load()
             if expenses:
-                for expense in expenses:
+                for expense in expenses.rows():
                     print(f'ID: {expense["ID"]} '
                           f'Date: {expense["Date"]} '
                           f'Description: {expense["Description"]} '
-                          f'Amount: {expense["Amount"]}'
+                          f'Amount: {format_amount(parse_amount(expense["Amount"]), expense["Currency"])}'
                           )
             else:
                 print('Expenses are empty')
         if args.summary:
-            self.expense = self.load()
-            mapped = list(map(lambda amount: int(amount['Amount'].split('$')[0]), self.expense))
-            print(f'Total expense :{sum(mapped)}$')
+            print(f'Total expense :{format_amount(self.load_sidecar(self.aggregates).total(self.rates))}')
+            self.warn_missing_rates()
         if args.month:
-            self.expense = self.load()
-            filtered = list(filter(lambda entry: datetime.date.fromisoformat(entry['Date']).month == args.month, self.expense))
-            filtered_expenses = sum([int(i['Amount'].split('$')[0]) for i in filtered])
-            print(f'Total expenses for {calendar.month_name[args.month]}: {filtered_expenses}$')
+            total = self.load_sidecar(self.aggregates).month_total(args.month, self.rates)
+            print(f'Total expenses for {calendar.month_name[args.month]}: {format_amount(total)}')
+            self.warn_missing_rates()
+        self.save()
+        # reports and exports stream the csv file, so they run once changes are saved
+        if args.report:
+            self.report(args.report, args.top, args.words)
+        if args.export:
+            self.export(args.export)
+
+
+class SqliteExpenseTracker(ExpenseTracker):
+    """
+    Expense tracker keeping expenses in the SQLite database made by --migrate,
+    the database computes totals and finds duplicates through its indexes, so there are no sidecars
+    Attributes:
+        expense: Database of the expenses
+    """
+    def __init__(self):
+        super().__init__()
+        self.expense = Database(self.database)
+        self.loaded = True
+        self.aggregates = DatabaseTotals(self.expense)
+        self.duplicates = DatabaseDuplicates(self.expense)
+        self.sidecars = ()
+
+    def load(self) -> Database:
+        return self.expense
+
+    def load_for_append(self) -> Database:
+        return self.expense
+
+    def save(self) -> None:
+        """
+        Commit the changes to the database
+        :return: None
+        """
+        if self.dirty:
+            self.expense.commit()
+            self.dirty = False
+
+    def read_expenses(self):
+        return self.expense.stream()
+
+    def description_groups(self, words: int) -> dict:
+        # expenses are grouped by normalised description in the database and only the groups merged by prefix
+        return prefix_totals(self.aggregates.descriptions(), self.rates, words)
+
+
+def tracker() -> ExpenseTracker:
+    """
+    Expense tracker of the SQLite database if the csv file was migrated to one, otherwise of the csv file
+    :return: ExpenseTracker
+    """
+    expense_tracker = ExpenseTracker()
+    return SqliteExpenseTracker() if os.path.exists(expense_tracker.database) else expense_tracker
 
 
 if __name__ == '__main__':
-    exp = ExpenseTracker()
+    exp = tracker()
     exp.run()
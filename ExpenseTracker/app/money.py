@@ -0,0 +1,129 @@
+"""Fixed-point money and exchange rates
+
+Amounts are integer cents and exchange rates integer millionths, both parsed from
+decimal text without going through float. Totals are kept per currency and only
+converted to the base currency once per currency, when they are shown.
+Exchange rates are read from a local csv file of currency,rate lines, a rate being
+the value of one unit of the currency in the base currency:
+    EUR,1.08
+    GBP,1.27
+"""
+import csv
+
+from functools import cached_property
+from typing import Optional
+
+DEFAULT_CURRENCY = 'USD'
+RATE_PLACES = 6
+
+
+def parse_fixed(text: str, places: int) -> int:
+    """
+    Parse a decimal number into an integer of units of 10 ** -places
+    :param text: string number like '-12.5'
+    :param places: int number of decimal places
+    :raises ValueError: if text is not a number with at most places decimals
+    :return: int
+    """
+    units, _, fraction = text.strip().partition('.')
+    digits = units.lstrip('+-')
+    if not (digits or fraction) or len(fraction) > places or not (digits or '0').isdigit() \
+            or not (fraction or '0').isdigit() or len(units) - len(digits) > 1:
+        raise ValueError(f'invalid amount {text!r}')
+    value = int(digits or '0') * 10 ** places + int(fraction.ljust(places, '0'))
+    return -value if units.startswith('-') else value
+
+
+def parse_amount(text: str) -> int:
+    """
+    Parse an amount like '12', '12.50' or the older '12$' into cents
+    :param text: string amount
+    :raises ValueError: if text is not an amount
+    :return: int cents
+    """
+    return parse_fixed(text.strip().rstrip('$'), 2)
+
+
+def format_cents(cents: int) -> str:
+    """
+    Format cents the way amounts are written to the csv file
+    :param cents: int cents
+    :return: string like '12.50'
+    """
+    units, rest = divmod(abs(cents), 100)
+    return f'{"-" if cents < 0 else ""}{units}.{rest:02}'
+
+
+def format_amount(cents: int, currency: str = DEFAULT_CURRENCY) -> str:
+    """
+    Format cents for display
+    :param cents: int cents
+    :param currency: string currency code
+    :return: string like '12$', '12.50$' or '12.50 EUR'
+    """
+    text = format_cents(cents).removesuffix('.00')
+    return f'{text}$' if currency == DEFAULT_CURRENCY else f'{text} {currency}'
+
+
+class Rates:
+    """
+    Exchange rates to the base currency, read from a local file on first use
+    Attributes:
+        file: csv file of currency,rate lines
+        base: string base currency
+        missing: set of currencies that were left out of a total for lack of a rate
+    """
+    def __init__(self, file: str, base: str = DEFAULT_CURRENCY):
+        self.file = file
+        self.base = base
+        self.missing = set()
+
+    @cached_property
+    def table(self) -> dict:
+        """
+        Rates in millionths of the base currency, a missing file only knows the base currency
+        :return: dict of currency to int rate
+        """
+        table = {self.base: 10 ** RATE_PLACES}
+        try:
+            with open(self.file, 'r', newline='') as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2 and not row[0].startswith('#'):
+                        try:
+                            table[row[0].strip().upper()] = parse_fixed(row[1], RATE_PLACES)
+                        except ValueError:
+                            continue
+        except FileNotFoundError:
+            pass
+        return table
+
+    def convert(self, cents: int, currency: str) -> Optional[int]:
+        """
+        Convert cents of a currency to cents of the base currency, rounded half away from zero
+        :param cents: int cents
+        :param currency: string currency code
+        :return: int cents or None if there is no rate for currency
+        """
+        rate = self.table.get(currency)
+        if rate is None:
+            return None
+        value, rest = divmod(abs(cents) * rate, 10 ** RATE_PLACES)
+        value += rest * 2 >= 10 ** RATE_PLACES
+        return -value if cents < 0 else value
+
+    def combine(self, totals: dict) -> list:
+        """
+        Combine totals of several currencies into a total in the base currency,
+        currencies without a rate are left out and added to missing
+        :param totals: dict of currency to [cents, count]
+        :return: list of cents in the base currency and count
+        """
+        combined = [0, 0]
+        for currency, (cents, count) in totals.items():
+            converted = self.convert(cents, currency)
+            if converted is None:
+                self.missing.add(currency)
+                continue
+            combined[0] += converted
+            combined[1] += count
+        return combined
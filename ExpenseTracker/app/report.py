@@ -0,0 +1,71 @@
+"""Grouped reports of expenses
+
+Reports are computed from totals that are already grouped, like the totals sidecar or the database,
+or by streaming the csv file and keeping one running total per group, so memory
+grows with the number of groups and not with the number of expenses.
+"""
+import heapq
+
+from typing import Iterable, Optional
+
+try:
+    from app.duplicates import normalise
+    from app.money import Rates, format_amount
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from duplicates import normalise
+    from money import Rates, format_amount
+
+
+def description_totals(expenses: Iterable[tuple], rates: Rates, words: int = 1) -> dict:
+    """
+    Total expenses by the first words of their normalised description
+    :param expenses: iterable of id, date, time, description, cents and currency, like ledger.stream
+    :param rates: Rates to the base currency
+    :param words: int number of words of the description that make up its group
+    :return: dict of description prefix to [cents, count]
+    """
+    return prefix_totals(((description, currency, cents, 1) for _, _, _, description, cents, currency in expenses),
+                         rates, words)
+
+
+def prefix_totals(totals: Iterable[tuple], rates: Rates, words: int = 1) -> dict:
+    """
+    Total expenses by the first words of their normalised description, totals are kept
+    per currency while streaming and converted to the base currency once per group
+    :param totals: iterable of description, currency, cents and count, of one expense or already grouped
+    :param rates: Rates to the base currency
+    :param words: int number of words of the description that make up its group
+    :return: dict of description prefix to [cents, count]
+    """
+    groups = dict()
+    for description, currency, cents, count in totals:
+        prefix = ' '.join(normalise(description).split(' ', words)[:words])
+        entry = groups.setdefault(prefix, dict()).get(currency)
+        if entry is None:
+            groups[prefix][currency] = [cents, count]
+        else:
+            entry[0] += cents
+            entry[1] += count
+    return {prefix: rates.combine(currencies) for prefix, currencies in groups.items()}
+
+
+def format_report(groups: dict, label: str, top: Optional[int] = None, by_total: bool = False) -> list[str]:
+    """
+    Format grouped totals as table lines
+    :param groups: dict of group to [cents, count]
+    :param label: string heading of the group column
+    :param top: int, only the top groups with the largest totals
+    :param by_total: bool, order groups by total instead of by name
+    :return: list of string lines
+    """
+    if top is not None:
+        rows = heapq.nlargest(top, groups.items(), key=lambda item: item[1][0])
+    elif by_total:
+        rows = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)
+    else:
+        rows = sorted(groups.items())
+    width = max([len(label), *(len(group) for group, _ in rows)])
+    lines = [f'{label:<{width}}  {"Total":>14}  {"Count":>8}']
+    lines.extend(f'{group:<{width}}  {format_amount(cents):>14}  {count:>8}' for group, (cents, count) in rows)
+    return lines
@@ -0,0 +1,163 @@
+"""Streaming readers of bank statements
+
+Statements are read one transaction at a time, so files of any size are imported
+in constant memory. Csv statements need a header with a date, a description and an
+amount or debit column, dates are YYYY-MM-DD, an optional currency column gives the
+currency of each row. In an amount column only negative amounts are expenses, the
+positive ones are credits, a debit column holds expenses of either sign. OFX
+statements, both the SGML and the XML flavour, are read tag by tag; only their debits
+are expenses, in the currency of the statement.
+"""
+import csv
+import datetime
+import re
+
+from functools import cache
+from typing import Iterator, Optional
+
+try:
+    from app.money import DEFAULT_CURRENCY, parse_amount
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from money import DEFAULT_CURRENCY, parse_amount
+
+# header names of statement columns, compared case-insensitively
+DATE_COLUMNS = ('date', 'transaction date', 'posted date', 'posting date')
+DESCRIPTION_COLUMNS = ('description', 'payee', 'name', 'memo', 'details')
+AMOUNT_COLUMNS = ('amount', 'debit')
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+@cache
+def parse_date(text: str) -> datetime.date:
+    """
+    Parse a statement date, YYYY-MM-DD or the YYYYMMDD prefix of an OFX date time
+    :param text: string date
+    :raises ValueError: if text is not a date
+    :return: date
+    """
+    text = text.strip()
+    if len(text) >= 8 and text[:8].isdigit():
+        return datetime.datetime.strptime(text[:8], '%Y%m%d').date()
+    return datetime.date.fromisoformat(text)
+
+
+def statement_amount(text: str) -> int:
+    """
+    Parse a statement amount like '-1,234.50' or '$12' into cents
+    :param text: string amount
+    :raises ValueError: if text is not an amount
+    :return: int cents
+    """
+    return parse_amount(text.replace(',', '').replace('$', '').replace(' ', ''))
+
+
+def read_csv_statement(file: str) -> Iterator[tuple[int, dict]]:
+    """
+    Read the transactions of a csv statement
+    :param file: csv statement
+    :raises ValueError: if the header has no date, description or amount column
+    :return: iterator of line number and dict of date, time, description, amount, currency and signed,
+        whether credits are positive amounts
+    """
+    # statements exported by spreadsheets often start with a byte order mark
+    with open(file, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        columns = dict()
+        for field, names in (('date', DATE_COLUMNS), ('description', DESCRIPTION_COLUMNS), ('amount', AMOUNT_COLUMNS)):
+            found = [header.index(name) for name in names if name in header]
+            if not found:
+                raise ValueError(f'{file} has no {field} column')
+            columns[field] = found[0]
+        time = header.index('time') if 'time' in header else None
+        currency = header.index('currency') if 'currency' in header else None
+        signed = header[columns['amount']] == 'amount'
+        for row in reader:
+            if not row:
+                continue
+            # short rows miss trailing fields
+            row += [''] * (len(header) - len(row))
+            yield reader.line_num, {
+                'date': row[columns['date']],
+                'time': '' if time is None else row[time],
+                'description': row[columns['description']],
+                'amount': row[columns['amount']],
+                'currency': '' if currency is None else row[currency],
+                'signed': signed,
+            }
+
+
+def read_ofx_statement(file: str) -> Iterator[tuple[int, dict]]:
+    """
+    Read the transactions of an OFX statement, credits are skipped
+    :param file: OFX statement
+    :return: iterator of line number and dict of date, time, description, amount and currency
+    """
+    transaction, start, currency = None, 0, ''
+    with open(file, 'r', errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            for closing, tag, value in OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == 'CURDEF':
+                    currency = value.strip()
+                elif tag == 'STMTTRN':
+                    if closing and transaction is not None:
+                        yield from ofx_expense(start, transaction, currency)
+                        transaction = None
+                    elif not closing:
+                        transaction, start = dict(), number
+                elif transaction is not None and not closing:
+                    transaction[tag] = value.strip()
+
+
+def ofx_expense(line: int, transaction: dict, currency: str) -> Iterator[tuple[int, dict]]:
+    """
+    Turn an OFX transaction into an expense if it is a debit
+    :param line: int line number of the transaction
+    :param transaction: dict of OFX tags
+    :param currency: string currency of the statement
+    :return: iterator of at most one line number and dict of date, time, description, amount, currency and signed
+    """
+    amount = transaction.get('TRNAMT', '')
+    if amount.strip().startswith('-'):
+        yield line, {
+            'date': transaction.get('DTPOSTED', ''),
+            'time': '',
+            'description': transaction.get('NAME') or transaction.get('MEMO', ''),
+            'amount': amount.strip()[1:],
+            'currency': currency,
+            'signed': False,
+        }
+
+
+def read_statement(file: str) -> Iterator[tuple[int, dict]]:
+    """
+    Read the transactions of a csv or OFX statement
+    :param file: statement file, .ofx and .qfx files are read as OFX
+    :return: iterator of line number and dict of date, time, description, amount and currency
+    """
+    if file.lower().endswith(('.ofx', '.qfx')):
+        return read_ofx_statement(file)
+    return read_csv_statement(file)
+
+
+def statement_expense(transaction: dict) -> Optional[tuple[datetime.date, str, str, int, str]]:
+    """
+    Parse a transaction read from a statement
+    :param transaction: dict of date, time, description, amount, currency and signed
+    :raises ValueError: if the date or amount is invalid
+    :return: date, time, description, cents and currency, None if there is no amount, like credits in a debit
+        column, or the amount is a credit in a signed amount column
+    """
+    if not transaction['amount'].strip():
+        return None
+    cents = statement_amount(transaction['amount'])
+    if transaction['signed']:
+        cents = -cents if cents < 0 else 0
+    else:
+        cents = abs(cents)
+    if not cents:
+        return None
+    currency = transaction['currency'].strip().upper() or DEFAULT_CURRENCY
+    return parse_date(transaction['date']), transaction['time'], transaction['description'].strip(), cents, currency
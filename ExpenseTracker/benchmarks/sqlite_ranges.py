@@ -0,0 +1,95 @@
+"""Benchmark of date range queries on the SQLite backend
+
+Creates a database of generated expenses, 5 million by default, spread over ten
+years, and times the queries the tracker runs against it: totals of a day, a month
+and a year, the total of a month in every year, a budget check, a duplicate check and
+the grouped reports. Each query runs several times and the best and median times are printed.
+    python benchmarks/sqlite_ranges.py --rows 5000000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Database, DatabaseDuplicates, DatabaseTotals  # noqa: E402
+from app.money import Rates  # noqa: E402
+
+DESCRIPTIONS = ['lunch', 'coffee', 'books', 'groceries', 'rent', 'bus ticket', 'taxi', 'cinema', 'gym', 'pharmacy']
+
+
+def expenses(rows: int, start: datetime.date, days: int):
+    """
+    Generate expenses spread evenly over days
+    :param rows: int number of expenses
+    :param start: date of the first expense
+    :param days: int number of days
+    :return: iterator of id, date, time, description, cents and currency
+    """
+    generator = random.Random(1)
+    dates = [(start + datetime.timedelta(days=day)).isoformat() for day in range(days)]
+    for expense_id in range(1, rows + 1):
+        yield (expense_id, dates[(expense_id - 1) * days // rows], '12:00:00',
+               f'{generator.choice(DESCRIPTIONS)} {generator.randrange(100)}',
+               generator.randrange(100, 50000), 'EUR' if expense_id % 10 == 0 else 'USD')
+
+
+def measure(name: str, query, repeat: int) -> None:
+    """
+    Run a query repeat times and print its best and median time
+    :param name: string name of the query
+    :param query: function without arguments
+    :param repeat: int number of runs
+    :return: None
+    """
+    times = list()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query()
+        times.append(time.perf_counter() - started)
+    print(f'{name:<28} best {min(times) * 1000:9.2f} ms  median {statistics.median(times) * 1000:9.2f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='sqlite_ranges')
+    parser.add_argument('--rows', type=int, default=5_000_000, help='Number of expenses')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each query')
+    parser.add_argument('--file', help='Database to create, a temporary file by default')
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    file = args.file or os.path.join(directory.name, 'expense.db')
+    if os.path.exists(file):
+        os.remove(file)
+    start = datetime.date(2015, 1, 1)
+    started = time.perf_counter()
+    Database.create(file, expenses(args.rows, start, 3650))
+    print(f'created {args.rows} expenses in {time.perf_counter() - started:.1f} s, '
+          f'{os.path.getsize(file) / 2 ** 20:.0f} MiB')
+
+    database = Database(file)
+    totals, duplicates = DatabaseTotals(database), DatabaseDuplicates(database)
+    rates = Rates(os.path.join(directory.name, 'rates.csv'))
+    with open(rates.file, 'w') as f:
+        f.write('EUR,1.08\n')
+    measure('day total', lambda: totals.between('2020-06-15', '2020-06-16'), args.repeat)
+    measure('month total', lambda: totals.between('2020-06-01', '2020-07-01'), args.repeat)
+    measure('year total', lambda: totals.between('2020-01-01', '2021-01-01'), args.repeat)
+    measure('month total of every year', lambda: totals.month_total(6, rates), args.repeat)
+    measure('budget check', lambda: (totals.spent('2020-06', None, rates), totals.spent('2020-06', 'lunch', rates)),
+            args.repeat)
+    measure('duplicate check', lambda: duplicates.matches('2020-06-15', 'Lunch 7', 1000, True, 100), args.repeat)
+    measure('report by month', lambda: totals.groups('month', rates), args.repeat)
+    measure('report by description', lambda: list(totals.descriptions()), args.repeat)
+    measure('total', lambda: totals.total(rates), args.repeat)
+    database.connection.close()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
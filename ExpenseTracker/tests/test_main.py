@@ -1,25 +1,442 @@
+import csv
+import datetime
+import io
+import os
+import shutil
 import unittest
 
+from contextlib import redirect_stderr, redirect_stdout
 from unittest.mock import patch
-from app.main import ExpenseTracker
+from app.export import export, read_export
+from app.ledger import FIELDNAMES, Ledger, stream
+from app.money import Rates, format_amount, parse_amount, parse_fixed
+from app.main import ExpenseTracker, SqliteExpenseTracker, tracker
 
 
 class ExpenseTrackerTest(unittest.TestCase):
     def setUp(self):
         self.expense = ExpenseTracker()
+        self.sample_expenses = [
+            {'ID': '1', 'Date': '2024-11-20', 'Time': '18:57:22.781752', 'Description': 'lunch', 'Amount': '20.00',
+             'Currency': 'USD'},
+            {'ID': '2', 'Date': '2024-12-02', 'Time': '09:12:05.209456', 'Description': 'books', 'Amount': '35.00',
+             'Currency': 'USD'},
+        ]
+        with open(self.expense.file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(self.sample_expenses)
 
-    @patch('sys.argv', ['app.main.ExpenseTracker', '-a', '-d', 'book', '-am', 15])
+    def run_tracker(self, *argv):
+        output = io.StringIO()
+        with patch('sys.argv', ['app.main.ExpenseTracker', *argv]), redirect_stdout(output):
+            self.expense.run()
+        return output.getvalue()
+
+    @patch('sys.argv', ['app.main.ExpenseTracker', '-a', '-d', 'book', '-am', '15'])
     def test_arguments(self):
         args = self.expense.parser.parse_args()
-        self.assertEqual(len(vars(args)), 8)
-        self.assertEqual(args.add, 'books')
+        self.assertEqual(len(vars(args)), 21)
+        self.assertTrue(args.add)
+        self.assertEqual(args.amount, 1500)
+        self.assertIsNone(args.currency)
 
     @patch('sys.argv', ['app.main.ExpenseTracker', '-u', '1', '-d', 'buying coffee'])
     def test_update_description(self):
         args = self.expense.parser.parse_args()
         self.assertEqual(args.description, 'buying coffee')
 
+    def test_load_once(self):
+        with patch.object(Ledger, 'read', wraps=Ledger.read) as reader:
+            self.expense.load()
+            self.expense.load()
+        self.assertEqual(reader.call_count, 1)
+        self.assertEqual(len(self.expense.expense), 2)
+
+    def test_multiple_flags(self):
+        with patch.object(Ledger, 'read', wraps=Ledger.read) as reader, \
+                patch.object(self.expense, 'save', wraps=self.expense.save) as save:
+            output = self.run_tracker('-a', '-d', 'coffee', '-am', '5', '-de', '1', '-s', '-m', '12')
+        self.assertEqual(reader.call_count, 1)
+        self.assertEqual(save.call_count, 1)
+        self.assertIn('Total expense :40$', output)
+        self.assertIn('Total expenses for December: 35$', output)
+
+        expenses = ExpenseTracker().load()
+        self.assertEqual(expenses.descriptions, ['books', 'coffee'])
+
+    def test_amounts(self):
+        self.assertEqual(parse_amount('20$'), 2000)
+        self.assertEqual(parse_amount('-0.5$'), -50)
+        self.assertEqual(format_amount(1205), '12.05$')
+        self.assertEqual(format_amount(-3000), '-30$')
+        self.assertEqual(parse_amount('0.1'), 10)
+        self.assertEqual(parse_fixed('1.085', 6), 1085000)
+        self.assertEqual(format_amount(1250, 'EUR'), '12.50 EUR')
+        for text in ('12.345$', '', '.', '1e3', '--1', '1.2.3'):
+            with self.assertRaises(ValueError):
+                parse_amount(text)
+
+    def test_ledger_columns(self):
+        ledger = self.expense.load()
+        self.assertEqual(list(ledger.amounts), [2000, 3500])
+        self.assertEqual(ledger.currencies, ['USD', 'USD'])
+        self.assertEqual(list(ledger.rows()), self.sample_expenses)
+
+    def test_legacy_csv(self):
+        with open(self.expense.file, 'w', newline='') as f:
+            f.write('ID,Date,Time,Description,Amount\r\n1,2024-11-20,18:57:22.781752,lunch,20$\r\n')
+        self.assertEqual(list(stream(self.expense.file))[0][4:], (2000, 'USD'))
+        self.assertIn('Total expense :25.50$', self.run_tracker('-a', '-d', 'coffee', '-am', '5.5', '-s'))
+        with open(self.expense.file, 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(list(rows[0]), FIELDNAMES)
+        self.assertEqual([(row['Amount'], row['Currency']) for row in rows], [('20.00', 'USD'), ('5.50', 'USD')])
+
+    def test_blank_and_short_rows(self):
+        with open(self.expense.file, 'a', newline='') as f:
+            f.write('\r\n3,2024-12-05,10:00:00,tea\r\n')
+        with self.assertRaises(ValueError):
+            Ledger.read(self.expense.file)
+        with open(self.expense.file, 'w', newline='') as f:
+            f.write(f'{",".join(FIELDNAMES)}\r\n1,2024-11-20,18:57:22.781752,lunch,20.00,USD\r\n\r\n'
+                    '2,2024-12-02,09:12:05.209456,books,35.00,USD\r\n')
+        self.assertEqual(list(self.expense.load().descriptions), ['lunch', 'books'])
+        self.expense = ExpenseTracker()
+        self.assertIn('ID: 3', self.run_tracker('-a', '-d', 'tea', '-am', '1', '-l'))
+        self.expense = ExpenseTracker()
+        self.run_tracker('-u', '2', '-d', 'novels')
+        self.assertEqual([row[3] for row in stream(self.expense.file)], ['lunch', 'novels', 'tea'])
+
+    def test_currencies(self):
+        with open('rates.csv', 'w', newline='') as f:
+            f.write('EUR,1.1\nGBP,1.25\n')
+        self.addCleanup(os.remove, 'rates.csv')
+        rates = Rates('rates.csv')
+        self.assertEqual(rates.convert(1005, 'EUR'), 1106)
+        self.assertEqual(rates.convert(-1005, 'EUR'), -1106)
+        self.assertEqual(rates.combine({'USD': [100, 1], 'GBP': [400, 2], 'JPY': [5, 1]}), [600, 3])
+        self.assertEqual(rates.missing, {'JPY'})
+
+        self.run_tracker('-a', '-d', 'train', '-am', '10', '-c', 'eur')
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('-a', '-d', 'sushi', '-am', '1000', '--currency', 'JPY', '-s', '-l')
+        self.assertIn('Amount: 10 EUR', output)
+        self.assertIn('Total expense :66$', output)
+        self.assertIn('No exchange rate for JPY in rates.csv, left out of totals', output)
+        self.assertEqual(ExpenseTracker().load().currencies, ['USD', 'USD', 'EUR', 'JPY'])
+
+        self.expense = ExpenseTracker()
+        self.assertIn('Amount for ID: 4 have changed to 8$', self.run_tracker('-u', '4', '-am', '8', '-c', 'usd', '-s'))
+        self.assertIn('Total expense :74$', self.run_tracker('-s'))
+
+        self.expense = ExpenseTracker()
+        self.assertIn('Amount for ID: 3 have changed to 5 EUR', self.run_tracker('-u', '3', '-am', '5'))
+        self.assertEqual(ExpenseTracker().load().currencies, ['USD', 'USD', 'EUR', 'USD'])
+        self.assertIn('Total expense :68.50$', self.run_tracker('-s'))
+
+    def test_stable_ids(self):
+        self.run_tracker('-de', '1', '-a', '-d', 'coffee', '-am', '5')
+        self.expense = ExpenseTracker()
+        self.run_tracker('-de', '3', '-a', '-d', 'tea', '-am', '4')
+        ledger = ExpenseTracker().load()
+        self.assertEqual(list(ledger.ids), [2, 4])
+        self.assertEqual(ledger.descriptions, ['books', 'tea'])
+        self.assertEqual(ledger.find('4'), 1)
+        self.assertIsNone(ledger.find('3'))
+        self.assertIsNone(ledger.find('tea'))
+
+        self.expense = ExpenseTracker()
+        self.run_tracker('-de', '4')
+        with open(self.expense.aggregates.file, 'w'):
+            pass
+        self.expense = ExpenseTracker()
+        self.assertIn('(ID: 5)', self.run_tracker('-a', '-d', 'juice', '-am', '3'))
+
+    def test_append_only_add(self):
+        with open(self.expense.file, 'rb') as f:
+            before = f.read().rstrip(b'\r\n')
+        with open(self.expense.file, 'wb') as f:
+            f.write(before)
+        with patch('app.ledger.csv.writer', wraps=csv.writer) as writer:
+            self.run_tracker('-a', '-d', 'coffee', '-am', '5')
+            self.expense = ExpenseTracker()
+            self.run_tracker('-a', '-d', 'tea', '-am', '4')
+        self.assertTrue(all(call.args[0].mode == 'a' for call in writer.call_args_list))
+        with open(self.expense.file, 'rb') as f:
+            self.assertTrue(f.read().startswith(before + b'\r\n3,'))
+        self.assertEqual(ExpenseTracker().load().descriptions, ['lunch', 'books', 'coffee', 'tea'])
+
+        self.expense = ExpenseTracker()
+        with patch('app.ledger.csv.writer', wraps=csv.writer) as writer:
+            self.run_tracker('-u', '3', '-am', '6')
+        self.assertEqual(writer.call_args.args[0].mode, 'w')
+        self.assertEqual(list(ExpenseTracker().load().amounts), [2000, 3500, 600, 400])
+
+    def test_import_statement(self):
+        statement = 'statement.csv'
+        with open(statement, 'w', newline='') as f:
+            f.write('\ufeffPosted Date,Payee,Amount\n'
+                    '2024-11-20,lunch,-20.00\n'
+                    '2024-11-20,lunch,-20.00\n'
+                    '2024-12-03,"rent, december","-1,200.50"\n'
+                    '2024-12-04,refund,0\n'
+                    'yesterday,taxi,-7\n')
+        self.addCleanup(os.remove, statement)
+        output = self.run_tracker('-i', statement, '--dry-run')
+        self.assertIn('Line 6: Invalid isoformat string', output)
+        self.assertIn('Would import 2 expenses, skipped 1 duplicates, 1 without amount and 1 invalid lines', output)
+        self.assertEqual(len(ExpenseTracker().load()), 2)
+
+        self.expense = ExpenseTracker()
+        self.assertIn('Imported 2 expenses', self.run_tracker('--import', statement))
+        ledger = ExpenseTracker().load()
+        self.assertEqual(list(ledger.amounts), [2000, 3500, 2000, 120050])
+        self.assertEqual(ledger.descriptions[3], 'rent, december')
+        self.assertEqual(list(ledger.ids), [1, 2, 3, 4])
+        tracker = ExpenseTracker()
+        self.assertEqual(tracker.load_sidecar(tracker.aggregates).months['2024-12'], {'USD': [123550, 2]})
+
+        self.expense = ExpenseTracker()
+        self.assertIn('Imported 0 expenses, skipped 3 duplicates', self.run_tracker('--import', statement))
+
+    def test_import_credits(self):
+        statement = 'statement.csv'
+        with open(statement, 'w', newline='') as f:
+            f.write('Date,Description,Amount\n2024-01-03,salary,2500.00\n2024-01-04,coffee,-3\n')
+        self.addCleanup(os.remove, statement)
+        self.assertIn('Imported 1 expenses, skipped 0 duplicates, 1 without amount', self.run_tracker('-i', statement))
+        self.assertEqual(ExpenseTracker().load().descriptions[2:], ['coffee'])
+
+        with open(statement, 'w', newline='') as f:
+            f.write('Date,Description,Debit\n2024-01-05,tea,4\n')
+        self.expense = ExpenseTracker()
+        self.assertIn('Imported 1 expenses', self.run_tracker('-i', statement))
+        self.assertEqual(list(ExpenseTracker().load().amounts[2:]), [300, 400])
+
+    def test_import_ofx(self):
+        statement = 'statement.ofx'
+        with open(statement, 'w') as f:
+            f.write('OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+                    '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20241201093000[-5:EST]\n<TRNAMT>-12.5\n<NAME>groceries\n</STMTTRN>\n'
+                    '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20241202<TRNAMT>500.00<NAME>salary</STMTTRN>\n'
+                    '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20241203<TRNAMT>-3<MEMO>bus ticket</STMTTRN>\n'
+                    '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+        self.addCleanup(os.remove, statement)
+        self.assertIn('Imported 2 expenses', self.run_tracker('-i', statement))
+        ledger = ExpenseTracker().load()
+        self.assertEqual(ledger.descriptions[2:], ['groceries', 'bus ticket'])
+        self.assertEqual(list(ledger.amounts[2:]), [1250, 300])
+        self.assertEqual(ledger.day(2), '2024-12-01')
+
+    def test_add_without_reading_csv(self):
+        self.run_tracker('-a', '-d', 'coffee', '-am', '5')
+        self.expense = ExpenseTracker()
+        with patch.object(Ledger, 'read', wraps=Ledger.read) as reader:
+            self.run_tracker('-a', '-d', 'tea', '-am', '4')
+        self.assertEqual(reader.call_count, 0)
+
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('-a', '-d', 'cake', '-am', '6', '-l')
+        listed = [line for line in output.splitlines() if line.startswith('ID: ')]
+        self.assertEqual(len(listed), 5)
+        self.assertTrue(listed[4].startswith('ID: 5 '))
+        self.assertEqual(ExpenseTracker().load().descriptions, ['lunch', 'books', 'coffee', 'tea', 'cake'])
+
+    def test_duplicate_add(self):
+        self.run_tracker('-a', '-d', 'Coffee  beans', '-am', '5')
+        self.expense = ExpenseTracker()
+        with patch('builtins.input', return_value='no') as ask:
+            self.run_tracker('-a', '-d', 'coffee beans', '-am', '5')
+            self.assertEqual(ask.call_count, 0)
+            self.run_tracker('-a', '-d', 'coffee beans', '-am', '7', '--fuzzy', '--tolerance', '1.5')
+            self.assertEqual(ask.call_count, 0)
+            self.run_tracker('-a', '-d', 'coffee beans', '-am', '6', '--fuzzy', '--tolerance', '1.5')
+            self.assertEqual(ask.call_count, 1)
+        self.assertEqual(ExpenseTracker().load().descriptions[2:], ['Coffee  beans', 'coffee beans', 'coffee beans'])
+
+        self.expense = ExpenseTracker()
+        self.run_tracker('-u', '3', '-d', 'beans')
+        tracker = ExpenseTracker()
+        duplicates = tracker.load_sidecar(tracker.duplicates)
+        self.assertEqual(duplicates.matches(datetime.date.today().isoformat(), 'BEANS', fuzzy=True), 1)
+        self.assertEqual(duplicates.matches(datetime.date.today().isoformat(), 'coffee beans', 700), 1)
+
+    def test_lost_duplicates_month(self):
+        self.run_tracker('-s')
+        os.remove(os.path.join(self.expense.duplicates.directory, '2024-11.json'))
+        with open(os.path.join(self.expense.duplicates.directory, '2024-12.json'), 'w') as f:
+            f.write('{not json')
+        self.expense = ExpenseTracker()
+        self.assertIn('Expense with ID:1 deleted', self.run_tracker('-de', '1'))
+        self.expense = ExpenseTracker()
+        self.assertIn('Description for ID: 2 have changed to y', self.run_tracker('-u', '2', '-d', 'y'))
+        self.assertEqual(ExpenseTracker().load().descriptions, ['y'])
+
+    def test_fuzzy_import(self):
+        statement = 'statement.csv'
+        with open(statement, 'w', newline='') as f:
+            f.write('Date,Description,Amount\n2024-11-20,LUNCH ,-20.40\n2024-12-02,books,-36\n')
+        self.addCleanup(os.remove, statement)
+        self.assertIn('Would import 2 expenses', self.run_tracker('-i', statement, '--dry-run'))
+        self.assertIn('Would import 1 expenses', self.run_tracker('-i', statement, '--dry-run', '--fuzzy', '--tolerance', '0.5'))
+
+    def test_report(self):
+        self.run_tracker('-a', '-d', 'Books  second hand', '-am', '15')
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('--report', 'description').splitlines()
+        self.assertEqual(output[0].split(), ['Description', 'Total', 'Count'])
+        self.assertEqual([line.split() for line in output[1:]], [['books', '50$', '2'], ['lunch', '20$', '1']])
+
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('-r', 'description', '--words', '2', '--top', '1').splitlines()
+        self.assertEqual([line.split() for line in output[1:]], [['books', '35$', '1']])
+
+        self.expense = ExpenseTracker()
+        with patch('app.main.stream', side_effect=AssertionError):
+            output = self.run_tracker('-r', 'month').splitlines()
+        self.assertEqual(output[1].split(), ['2024-11', '20$', '1'])
+        self.assertEqual(output[2].split(), ['2024-12', '35$', '1'])
+
+    def test_export(self):
+        self.addCleanup(os.remove, 'expense.columns')
+        self.assertIn('Exported 3 expenses', self.run_tracker('-a', '-d', 'lunch', '-am', '8', '-e', 'expense.columns'))
+        columns = read_export('expense.columns')
+        export(stream(self.expense.file), 'expense.columns', row_group=2)
+        self.assertEqual(read_export('expense.columns'), columns)
+        self.assertEqual(list(columns['id']), [1, 2, 3])
+        self.assertEqual(list(columns['date'][:2]), [20047, 20059])
+        self.assertEqual(columns['time'][0], 68242781752)
+        dictionaries = columns['dictionaries']
+        self.assertEqual([dictionaries['description'][index] for index in columns['description']],
+                         ['lunch', 'books', 'lunch'])
+        self.assertEqual(list(columns['amount']), [2000, 3500, 800])
+        self.assertEqual(dictionaries['currency'], ['USD'])
+
+    def test_export_missing_file(self):
+        os.remove(self.expense.file)
+        self.assertIn('File not found', self.run_tracker('-e', 'expense.columns'))
+        self.assertFalse(os.path.exists('expense.columns'))
+        self.assertFalse(os.path.exists('expense.columns.tmp'))
+
+    def test_summary_from_index(self):
+        self.run_tracker('-s')
+        self.expense = ExpenseTracker()
+        with patch.object(Ledger, 'read', wraps=Ledger.read) as reader:
+            output = self.run_tracker('-s', '-m', '11')
+        self.assertEqual(reader.call_count, 0)
+        self.assertEqual(output, 'Total expense :55$\nTotal expenses for November: 20$\n')
+
+    def test_index_follows_changes(self):
+        self.run_tracker('-a', '-d', 'coffee', '-am', '5')
+        self.expense = ExpenseTracker()
+        self.run_tracker('-u', '1', '-am', '25', '-de', '2')
+        tracker = ExpenseTracker()
+        aggregates = tracker.load_sidecar(tracker.aggregates)
+        self.assertEqual(aggregates.months['2024-11'], {'USD': [2500, 1]})
+        self.assertNotIn('2024-12', aggregates.months)
+        self.assertEqual(aggregates.total(tracker.rates), 3000)
+
+        self.expense = ExpenseTracker()
+        self.assertIn('Index rebuilt from 2 expenses', self.run_tracker('--rebuild-index'))
+        self.assertEqual(self.expense.aggregates.days, aggregates.days)
+        month = datetime.date.today().isoformat()[:7]
+        self.assertEqual(sorted(os.listdir(self.expense.duplicates.directory)), ['2024-11.json', f'{month}.json', 'index.json'])
+
+    def test_stale_index(self):
+        self.run_tracker('-s')
+        with open(self.expense.file, 'a', newline='') as f:
+            f.write('3,2024-11-21,10:00:00,dinner,40.00,USD\r\n')
+        self.expense = ExpenseTracker()
+        self.assertIn('Total expenses for November: 60$', self.run_tracker('-m', '11'))
+
+    def test_read_only_flags_do_not_save(self):
+        modified = os.stat(self.expense.file).st_mtime_ns
+        self.run_tracker('-l', '-s')
+        self.assertEqual(os.stat(self.expense.file).st_mtime_ns, modified)
+
+    def test_sqlite_backend(self):
+        self.run_tracker('-de', '2')
+        self.expense = ExpenseTracker()
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            self.run_tracker('--migrate', '-a', '-d', 'tea', '-am', '1')
+        self.assertFalse(os.path.exists(self.expense.database))
+        self.assertIn('Migrated 1 expenses to expense.db', self.run_tracker('--migrate'))
+        with open(self.expense.file, 'r') as f:
+            saved = f.read()
+        self.expense = tracker()
+        self.assertIsInstance(self.expense, SqliteExpenseTracker)
+        self.assertIn('Expense added successfully (ID: 3)', self.run_tracker('-a', '-d', 'Coffee', '-am', '5.5'))
+        with patch('builtins.input', return_value='no') as ask:
+            self.run_tracker('-a', '-d', ' coffee', '-am', '5', '--fuzzy')
+        self.assertEqual(ask.call_count, 1)
+
+        self.expense = tracker()
+        output = self.run_tracker('-u', '1', '-am', '25', '-u', '1', '-d', 'Lunch out', '-s', '-m', '11', '-l')
+        self.assertIn('Total expense :30.50$', output)
+        self.assertIn('Total expenses for November: 25$', output)
+        self.assertIn('ID: 1 Date: 2024-11-20 Description: Lunch out Amount: 25$', output)
+
+        self.expense = tracker()
+        output = self.run_tracker('-de', '3', '-a', '-d', 'lunch', '-am', '2', '-r', 'description').splitlines()
+        self.assertEqual(output[-1].split(), ['lunch', '27$', '2'])
+        self.assertEqual([expense[0] for expense in self.expense.expense.stream()], [1, 4])
+        self.assertEqual(self.expense.aggregates.groups('month', self.expense.rates)['2024-11'], [2500, 1])
+        self.assertEqual(self.expense.duplicates.matches('2024-11-20', 'LUNCH  OUT', fuzzy=True), 1)
+
+        self.expense = tracker()
+        self.assertIn('expense.db already exists', self.run_tracker('--migrate'))
+        with open(self.expense.file, 'r') as f:
+            self.assertEqual(f.read(), saved)
+
+    def test_budgets(self):
+        self.addCleanup(os.remove, 'budgets.csv')
+        self.assertIn('Monthly budget set to 60$', self.run_tracker('-b', '60'))
+        self.expense = ExpenseTracker()
+        self.assertIn('Budget for coffee set to 10$', self.run_tracker('--budget', '10', '--category', 'Coffee'))
+        month = datetime.date.today().isoformat()[:7]
+        self.run_tracker('-s')
+
+        self.expense = ExpenseTracker()
+        with patch.object(Ledger, 'read', wraps=Ledger.read) as reader:
+            self.assertNotIn('Warning', self.run_tracker('-a', '-d', 'Coffee', '-am', '5'))
+            self.expense = ExpenseTracker()
+            output = self.run_tracker('-a', '-d', 'coffee beans', '-am', '4')
+        self.assertEqual(reader.call_count, 0)
+        self.assertIn(f'Warning: 9$ spent in {month}, 80% of the coffee budget of 10$', output)
+
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('-a', '-d', 'rent', '-am', '45')
+        self.assertIn(f'Warning: 54$ spent in {month}, 80% of the monthly budget of 60$', output)
+        self.assertNotIn('coffee budget', output)
+
+        self.expense = ExpenseTracker()
+        self.run_tracker('-u', '4', '-d', 'tea')
+        self.assertEqual(self.expense.aggregates.spent(month, 'coffee', self.expense.rates), 500)
+
+        self.expense = ExpenseTracker()
+        self.run_tracker('--migrate')
+        self.expense = tracker()
+        self.assertEqual(self.expense.aggregates.spent(month, 'coffee', self.expense.rates), 500)
+        self.assertEqual(self.expense.aggregates.spent(month, None, self.expense.rates), 5400)
+        output = self.run_tracker('-a', '-d', 'COFFEE to go', '-am', '6')
+        self.assertIn(f'Warning: 11$ spent in {month}, 100% of the coffee budget of 10$', output)
+        self.assertIn(f'Warning: 60$ spent in {month}, 100% of the monthly budget of 60$', output)
+
+    def test_budget_blank_description(self):
+        self.addCleanup(os.remove, 'budgets.csv')
+        self.run_tracker('-b', '10')
+        self.expense = ExpenseTracker()
+        output = self.run_tracker('-a', '-d', '  ', '-am', '9')
+        self.assertEqual(output.count('Warning'), 1)
+
     def tearDown(self):
+        self.expense = ExpenseTracker()
+        for path in (self.expense.file, self.expense.aggregates.file, self.expense.aggregates.ids_file,
+                     self.expense.database):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self.expense.duplicates.directory, ignore_errors=True)
         self.expense = None
 
 
@@ -1,11 +1,12 @@
 import argparse
+import http.client
 import json
 
 import urllib.request
 import urllib.error
 
 
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 
 class GithubUserActivity:
@@ -15,106 +16,115 @@ class GithubUserActivity:
             url of GitHub user activity api
         headers : dict
             Dictionary of HTTP Headers to send with the Request.
-        event_types : list(str)
-            List of different Event Types returned by the API.
+        messages : dict
+            Message of each Event Type returned by the API, formatted with the repo and the number of events,
+            events are printed in the order of the Event Types.
+        timeout : float
+            Seconds to wait for a response before a request fails.
         parser : argparse.ArgumentParser
     """
     def __init__(self) -> None:
         self.url = 'https://api.github.com/'
         self.headers = {'Accept': 'application/vnd.github+json'}
-        self.event_types = [
-            'CommitComment', 'Create', 'Delete', 'Fork',
-            'Gollum', 'IssueComment', 'Issue', 'Member',
-            'Public', 'PullRequest', 'PullRequestReview', 'PullRequestReviewComment',
-            'PullRequestReviewThread', 'Push', 'Release', 'Sponsorship', 'Watch'
-        ]
+        self.messages = {
+            'CommitComment': 'Made {count} comments to {repo} ',
+            'Create': 'Created {repo}',
+            'Delete': 'Deleted {count} commits from {repo}',
+            'Fork': 'Forked {repo}',
+            'Gollum': 'Gollum for {repo}',
+            'IssueComment': 'IssueComment for {repo}',
+            'Issue': 'Opened a issue on {repo}',
+            'Member': 'Membered to  {repo}: {count}',
+            'Public': 'Opened a public repo on {repo}',
+            'PullRequest': 'Opened a pull request on {repo}',
+            'PullRequestReview': 'Opened a pull request review on {repo}',
+            'PullRequestReviewComment': 'Opened a pull request review comment on {repo}',
+            'PullRequestReviewThread': 'Opened a pull request review thread on {repo}',
+            'Push': 'Pushed {count} commits to {repo} ',
+            'Release': 'Opened a release on {repo}',
+            'Sponsorship': 'Started sponsoring {repo}',
+            'Watch': 'Started Watching {repo}',
+        }
+        self.timeout = 10
         self.parser = argparse.ArgumentParser(description='Github User Activity CLI')
         self.add_argument()
 
     def add_argument(self) -> None:
         """adds arguments to the parser"""
-        self.parser.add_argument('-u', '--username', help='Github username')
+        self.parser.add_argument('-u', '--username', nargs='+', default=[], help='Github usernames')
+        self.parser.add_argument('--users-file', help='File with one Github username per line')
+        self.parser.add_argument('-w', '--workers', type=int, default=8, help='Number of concurrent requests')
 
-    def count_type_to_repo(self, events: list, type_: str) -> None:
-        """Counts the number of types of each event type and prints it to the console"""
-        repo_event = defaultdict(list)
+    def usernames(self, args: argparse.Namespace) -> list:
+        """Returns the usernames of the arguments and the users file, without repeats
+        :raises OSError
+        """
+        usernames = list(args.username)
+        if args.users_file:
+            with open(args.users_file, 'r') as file:
+                usernames.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+        return list(dict.fromkeys(usernames))
+
+    def fetch_events(self, username: str) -> list:
+        """Fetches the recent events of a user
+        :raises urllib.error.URLError
+        :raises http.client.HTTPException
+        """
+        req = urllib.request.Request(f'{self.url}users/{username}/events', headers=self.headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as request:
+            return json.loads(request.read().decode())
+
+    def fetch_all(self, usernames: list, workers: int):
+        """Fetches the events of users with a bounded pool of threads,
+        yields each username with its events or the error of its request in the order of usernames,
+        a failed request, even a dropped connection or a malformed response, only affects its own user
+        """
+        def fetch(username: str) -> tuple:
+            try:
+                return username, self.fetch_events(username), None
+            except (OSError, http.client.HTTPException, ValueError) as error:
+                return username, None, error
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(usernames)))) as executor:
+            yield from executor.map(fetch, usernames)
+
+    def group_events(self, events: list) -> dict:
+        """Groups events by event type and repo in one pass, events of other types are left out
+        :return: dict of event type to dict of repo name to number of events, in the order of messages
+        """
+        groups = {f'{event_type}Event': dict() for event_type in self.messages}
         for event in events:
-            repo_name = event['repo']['name']
-            repo_event[repo_name].append(event)
+            repos = groups.get(event['type'])
+            if repos is not None:
+                repo_name = event['repo']['name']
+                repos[repo_name] = repos.get(repo_name, 0) + 1
+        return groups
 
-        if type_ == 'Push':
-            for repo_name, event in repo_event.items():
-                print(f'Pushed {len(event)} commits to {repo_name} ')
-        elif type_ == 'CommitComment':
-            for repo_name, event in repo_event.items():
-                print(f'Made {len(event)} comments to {repo_name} ')
-        elif type_ == 'Delete':
-            for repo_name, event in repo_event.items():
-                print(f'Deleted {len(event)} commits from {repo_name}')
-        elif type_ == 'Create':
-            for repo_name, event in repo_event.items():
-                print(f'Created {repo_name}')
-        elif type_ == 'Watch':
-            for repo_name, event in repo_event.items():
-                print(f'Started Watching {repo_name}')
-        elif type_ == 'Member':
-            for repo_name, event in repo_event.items():
-                print(f'Membered to  {repo_name}: {len(event)}')
-        elif type_ == 'Fork':
-            for repo_name, event in repo_event.items():
-                print(f'Forked {repo_name}')
-        elif type_ == 'Gollum':
-            for repo_name, event in repo_event.items():
-                print(f'Gollum for {repo_name}')
-        elif type_ == 'IssueComment':
-            for repo_name, event in repo_event.items():
-                print(f'IssueComment for {repo_name}')
-        elif type_ == 'Issue':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a issue on {repo_name}')
-        elif type_ == 'Public':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a public repo on {repo_name}')
-        elif type_ == 'PullRequest':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a pull request on {repo_name}')
-        elif type_ == 'PullRequestReview':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a pull request review on {repo_name}')
-        elif type_ == 'PullRequestReviewComment':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a pull request review comment on {repo_name}')
-        elif type_ == 'PullRequestReviewThread':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a pull request review thread on {repo_name}')
-        elif type_ == 'Release':
-            for repo_name, event in repo_event.items():
-                print(f'Opened a release on {repo_name}')
-        elif type_ == 'Sponsorship':
-            for repo_name, event in repo_event.items():
-                print(f'Started sponsoring {repo_name}')
-        else:
-            for repo_name, event in repo_event.items():
-                print(f'Unknown type {repo_name}: {len(event)}')
+    def print_events(self, user_events: list) -> None:
+        """Prints the events of a user grouped by event type and repo"""
+        for message, repos in zip(self.messages.values(), self.group_events(user_events).values()):
+            for repo_name, count in repos.items():
+                print(message.format(repo=repo_name, count=count))
 
     def run(self):
-        """"Runs different arguments
-        :raises urllib.error.URLError
+        """"Runs different arguments, the events of several users are fetched concurrently
+        and printed per user
         """
         args = self.parser.parse_args()
-        req = urllib.request.Request(f'{self.url}users/{args.username}/events', headers=self.headers)
-        if args.username:
-            try:
-                with urllib.request.urlopen(req) as request:
-                    user_events = json.loads(request.read().decode())
-            except urllib.error.URLError as error:
+        try:
+            usernames = self.usernames(args)
+        except OSError as error:
+            print(f'Error: {error}')
+            return
+        if not usernames:
+            return
+        for username, user_events, error in self.fetch_all(usernames, args.workers):
+            if len(usernames) > 1:
+                print(f'{username}:')
+            if error is not None:
                 print(f'Error: {error}')
             else:
-                for event_type in self.event_types:
-                    self.count_type_to_repo(
-                        list(filter(lambda event: event['type'] == f'{event_type}Event', user_events)),
-                        event_type
-                    )
+                self.print_events(user_events)
 
 
 if __name__ == '__main__':
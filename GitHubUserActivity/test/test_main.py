@@ -1,17 +1,123 @@
+import io
+import json
+import os
+import threading
+import time
 import unittest
 
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
 from app.main import GithubUserActivity
 
+DELAY = 0.3
+EVENTS = {
+    'alice': [
+        {'type': 'PushEvent', 'repo': {'name': 'alice/notes'}},
+        {'type': 'PushEvent', 'repo': {'name': 'alice/notes'}},
+        {'type': 'WatchEvent', 'repo': {'name': 'bob/tools'}},
+    ],
+    'bob': [{'type': 'ForkEvent', 'repo': {'name': 'alice/notes'}}],
+    'carol': [],
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers /users/<username>/events like the GitHub API, slowly"""
+    def do_GET(self):
+        time.sleep(DELAY)
+        parts = self.path.strip('/').split('/')
+        if parts == ['users', 'broken', 'events']:
+            self.wfile.write(b'garbage\r\n\r\n')
+            self.close_connection = True
+            return
+        if len(parts) != 3 or parts[0] != 'users' or parts[2] != 'events' or parts[1] not in EVENTS:
+            self.send_error(404)
+            return
+        body = json.dumps(EVENTS[parts[1]]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
 
 class GithubUserActivityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
     def setUp(self):
         self.github_user = GithubUserActivity()
+        self.github_user.url = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def run_github(self, *argv):
+        output = io.StringIO()
+        with patch('sys.argv', ['app.main.GithubUserActivity', *argv]), redirect_stdout(output):
+            self.github_user.run()
+        return output.getvalue()
 
     @patch('sys.argv', ['app.main.GithubUserActivity', '-u', 'Somename'])
     def test_argument_length(self):
-        self.github_user.run()
-        self.assertEqual(len(vars(self.github_user.parser.parse_args())), 1)
+        with redirect_stdout(io.StringIO()):
+            self.github_user.run()
+        self.assertEqual(len(vars(self.github_user.parser.parse_args())), 3)
+
+    def test_single_user(self):
+        output = self.run_github('-u', 'alice')
+        self.assertEqual(output, 'Pushed 2 commits to alice/notes \nStarted Watching bob/tools\n')
+
+    def test_group_events(self):
+        events = [
+            {'type': 'WatchEvent', 'repo': {'name': 'a/one'}},
+            {'type': 'PushEvent', 'repo': {'name': 'a/two'}},
+            {'type': 'PushEvent', 'repo': {'name': 'a/one'}},
+            {'type': 'UnknownEvent', 'repo': {'name': 'a/one'}},
+            {'type': 'PushEvent', 'repo': {'name': 'a/two'}},
+        ]
+        groups = self.github_user.group_events(events)
+        self.assertEqual(groups['PushEvent'], {'a/two': 2, 'a/one': 1})
+        self.assertEqual(groups['WatchEvent'], {'a/one': 1})
+        self.assertNotIn('UnknownEvent', groups)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.github_user.print_events(events)
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['Pushed 2 commits to a/two ', 'Pushed 1 commits to a/one ', 'Started Watching a/one'])
+
+    def test_multiple_users(self):
+        started = time.perf_counter()
+        output = self.run_github('-u', 'alice', 'bob', 'carol', 'missing')
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, DELAY * 3)
+        self.assertEqual(output.splitlines(), [
+            'alice:', 'Pushed 2 commits to alice/notes ', 'Started Watching bob/tools',
+            'bob:', 'Forked alice/notes',
+            'carol:',
+            'missing:', 'Error: HTTP Error 404: Not Found',
+        ])
+
+    def test_malformed_response(self):
+        output = self.run_github('-u', 'broken', 'bob')
+        self.assertTrue(output.startswith('broken:\nError: garbage'))
+        self.assertEqual(output.splitlines()[-2:], ['bob:', 'Forked alice/notes'])
+
+    def test_users_file(self):
+        with open('users.txt', 'w') as file:
+            file.write('# monitored accounts\nbob\n\ncarol\nalice\n')
+        self.addCleanup(os.remove, 'users.txt')
+        output = self.run_github('-u', 'alice', '--users-file', 'users.txt', '-w', '1')
+        self.assertEqual([line for line in output.splitlines() if line.endswith(':')], ['alice:', 'bob:', 'carol:'])
+        self.assertIn('Error: ', self.run_github('--users-file', 'missing.txt'))
 
     def tearDown(self):
         GithubUserActivity.github_user = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
@@ -0,0 +1,60 @@
+"""Binary cache of a parsed task store
+
+marshal reads plain dicts, lists and strings several times faster than json,
+so a store that did not change since it was last parsed is loaded from the cache.
+The cache is keyed by inode, modification time and size of the store files, it is
+only a copy: a missing, stale or unreadable cache is ignored and written again.
+The key is stored as its own record ahead of the state, so a stale cache is turned
+down without deserialising the state.
+Modification times are only as fine as the kernel clock tick and inodes are reused,
+so a file rewritten twice within a tick can keep its key. Like git's racy index
+check, files modified less than a second ago are not cached.
+This module is imported by the fast entry point, so it sticks to builtin annotations
+instead of importing typing.
+"""
+import marshal
+import os
+import time
+
+RACY_NS = 1_000_000_000
+
+
+def cache_key(kind: str, paths: list) -> list:
+    """Returns a key that changes whenever one of paths is replaced, appended to or removed"""
+    key = [kind]
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            key.append(None)
+        else:
+            key.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return key
+
+
+def read_cache(path: str, key: list) -> dict | None:
+    """Returns the state stored in the cache at path, None if it is missing or was stored under another key"""
+    try:
+        with open(path, 'rb') as f:
+            if marshal.load(f) != key:
+                return None
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache(path: str, key: list, state: dict) -> None:
+    """Stores state under key, skipped if a file in key was modified too recently
+    or the cache can not be written
+    """
+    now = time.time_ns()
+    if any(stat is not None and now - stat[1] < RACY_NS for stat in key[1:]):
+        return
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            marshal.dump(key, f)
+            marshal.dump(state, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
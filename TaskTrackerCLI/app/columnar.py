@@ -0,0 +1,341 @@
+import json
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b'TTCOLS01'
+# magic, then offset and length of the json header, which is written after the columns
+PRELUDE = struct.Struct('<8sQQ')
+EPOCH = datetime(1970, 1, 1)
+FIELDS = ('id', 'title', 'description', 'status', 'createdAt', 'updatedAt')
+TEXT_FIELDS = ('title', 'description')
+TIME_FIELDS = ('createdAt', 'updatedAt')
+
+
+def _to_micros(text: str) -> Optional[int]:
+    """Returns a naive iso timestamp as microseconds since the epoch,
+    None if the number would not read back as the same text
+    """
+    try:
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None or moment.isoformat() != text:
+        return None
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> str:
+    """Returns the iso timestamp of microseconds since the epoch"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def read_header(path: str) -> Dict:
+    """Reads only the json header of a columnar snapshot
+    :raises ValueError: if path is not a columnar snapshot
+    """
+    with open(path, 'rb') as f:
+        magic, offset, length = PRELUDE.unpack(f.read(PRELUDE.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a columnar task snapshot')
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+
+class ColumnarSnapshot:
+    """Read-only view of a columnar snapshot, the file is memory mapped
+    and a task is only decoded when it is asked for
+    Attributes:
+        header : dict
+            version, next_id, count, status table and column positions
+        columns : dict
+            integer columns and text blobs as memoryviews over the file
+        statuses : list(str)
+            distinct statuses, the status column holds indexes into it
+    """
+    def __init__(self, path: str) -> None:
+        self.header = read_header(path)
+        with open(path, 'rb') as f:
+            if os.name == 'nt':
+                # a mapped file can not be replaced on windows, so it is read instead
+                data = f.read()
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        swap = self.header['byteorder'] != sys.byteorder
+        self.columns = dict()
+        for name, (offset, typecode, length) in self.header['columns'].items():
+            column = view[offset:offset + length * array(typecode).itemsize].cast(typecode)
+            if swap and typecode != 'B':
+                column = array(typecode, column)
+                column.byteswap()
+            self.columns[name] = column
+        self.statuses = self.header['statuses']
+        self._rows = None
+
+    def __len__(self) -> int:
+        return self.header['count']
+
+    def task_id(self, row: int) -> str:
+        """Returns the id of the task in row"""
+        return str(self.columns['id'][row])
+
+    def row_of(self, task_id: str) -> Optional[int]:
+        """Returns the row of a task, None if it is not in the snapshot"""
+        ids = self.columns['id']
+        if self.header['sorted']:
+            row = bisect_left(ids, int(task_id))
+            return row if row < len(ids) and ids[row] == int(task_id) else None
+        if self._rows is None:
+            self._rows = {row_id: row for row, row_id in enumerate(ids)}
+        return self._rows.get(int(task_id))
+
+    def rows(self, status: Optional[str] = None) -> List[int]:
+        """Returns the rows of every task, or of tasks with the given status"""
+        if status is None:
+            return list(range(len(self)))
+        if status not in self.statuses:
+            return list()
+        code = self.statuses.index(status)
+        return [row for row, row_code in enumerate(self.columns['status']) if row_code == code]
+
+    def _text(self, field: str, row: int) -> str:
+        """Decodes the text of field in row from its blob"""
+        offsets = self.columns[f'{field}_offsets']
+        return str(self.columns[field][offsets[row]:offsets[row + 1]], 'utf-8')
+
+    def task(self, row: int) -> Dict:
+        """Decodes the task in row"""
+        task = {
+            'id': self.columns['id'][row],
+            'title': self._text('title', row),
+            'description': self._text('description', row),
+            'status': self.statuses[self.columns['status'][row]],
+            'createdAt': _from_micros(self.columns['createdAt'][row]),
+            'updatedAt': _from_micros(self.columns['updatedAt'][row]),
+        }
+        extra = self.header['overrides'].get(str(row))
+        if extra:
+            task.update(extra)
+        return task
+
+
+class ColumnBuilder:
+    """Collects tasks column by column and writes them as a columnar snapshot
+    ids and timestamps are 64 bit integer columns, statuses are indexes into a table of
+    distinct statuses, titles and descriptions are utf-8 blobs with an offset column.
+    Values the columns can not hold exactly, like a timestamp with a time zone, are kept
+    per row in the json header, so every task reads back as it was written.
+    Attributes:
+        columns : dict
+            integer columns and text blobs collected so far
+        statuses : dict
+            index of every distinct status
+        overrides : dict
+            values the columns could not hold, by row
+    """
+    def __init__(self, statuses: Iterable[str] = ()) -> None:
+        self.columns = {'id': array('q'), 'status': array('H')}
+        for field in TIME_FIELDS:
+            self.columns[field] = array('q')
+        for field in TEXT_FIELDS:
+            self.columns[f'{field}_offsets'] = array('Q', [0])
+            self.columns[field] = array('B')
+        self.statuses = {status: code for code, status in enumerate(statuses)}
+        self.overrides = dict()
+
+    def __len__(self) -> int:
+        return len(self.columns['id'])
+
+    def add(self, task: Dict) -> None:
+        """Appends a task"""
+        extra = {field: value for field, value in task.items() if field not in FIELDS}
+        row = len(self)
+        self.columns['id'].append(task['id'])
+        status = task['status']
+        if not isinstance(status, str):
+            extra['status'], status = status, ''
+        self.columns['status'].append(self.statuses.setdefault(status, len(self.statuses)))
+        for field in TIME_FIELDS:
+            micros = _to_micros(task[field])
+            if micros is None:
+                extra[field], micros = task[field], 0
+            self.columns[field].append(micros)
+        for field in TEXT_FIELDS:
+            text = task[field]
+            if not isinstance(text, str):
+                extra[field], text = text, ''
+            self.columns[field].frombytes(text.encode())
+            self.columns[f'{field}_offsets'].append(len(self.columns[field]))
+        if extra:
+            self.overrides[str(row)] = extra
+
+    def add_rows(self, snapshot: ColumnarSnapshot, start: int, stop: int) -> None:
+        """Appends rows start to stop of a snapshot by copying their columns as they are,
+        the builder has to be created with the status table of the snapshot
+        """
+        first = len(self)
+        for name in ('id', 'status', *TIME_FIELDS):
+            self.columns[name].frombytes(snapshot.columns[name][start:stop].tobytes())
+        for field in TEXT_FIELDS:
+            offsets, blob = snapshot.columns[f'{field}_offsets'], self.columns[field]
+            shift = len(blob) - offsets[start]
+            blob.frombytes(snapshot.columns[field][offsets[start]:offsets[stop]].tobytes())
+            self.columns[f'{field}_offsets'].extend(offset + shift for offset in offsets[start + 1:stop + 1])
+        for row, extra in snapshot.header['overrides'].items():
+            if start <= int(row) < stop:
+                self.overrides[str(first + int(row) - start)] = extra
+
+    def write(self, path: str, version: int, next_id: int) -> None:
+        """Writes the snapshot to a temporary file and renames it over path"""
+        ids = self.columns['id']
+        header = {
+            'version': version,
+            'next_id': next_id,
+            'count': len(ids),
+            'byteorder': sys.byteorder,
+            'sorted': all(ids[row] < ids[row + 1] for row in range(len(ids) - 1)),
+            'statuses': list(self.statuses),
+            'overrides': self.overrides,
+            'columns': dict(),
+        }
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(PRELUDE.pack(MAGIC, 0, 0))
+            for name, column in self.columns.items():
+                # every column starts on an 8 byte boundary
+                f.write(bytes(-f.tell() % 8))
+                header['columns'][name] = [f.tell(), column.typecode, len(column)]
+                column.tofile(f)
+            data = json.dumps(header).encode()
+            offset = f.tell()
+            f.write(data)
+            f.seek(0)
+            f.write(PRELUDE.pack(MAGIC, offset, len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+class ColumnarTasks(MutableMapping):
+    """Tasks of a snapshot with the changes made since, keyed by task id like a dict
+    Tasks of the snapshot are decoded when they are read, changes are kept in memory,
+    iteration follows the order a dict of the same tasks would have.
+    Attributes:
+        snapshot : ColumnarSnapshot
+            snapshot the tasks were loaded from, None for an empty one
+        changes : dict
+            tasks added or replaced since the snapshot, None for deleted snapshot tasks,
+            in the order they were added
+        moved : set(str)
+            snapshot tasks that were deleted and added again, they now come after the snapshot
+    """
+    def __init__(self, snapshot: Optional[ColumnarSnapshot]) -> None:
+        self.snapshot = snapshot
+        self.changes = dict()
+        self.moved = set()
+
+    def _row(self, task_id: str) -> Optional[int]:
+        """Returns the snapshot row of a task id, None if it is not in the snapshot"""
+        return None if self.snapshot is None else self.snapshot.row_of(task_id)
+
+    def __contains__(self, task_id) -> bool:
+        if task_id in self.changes:
+            return self.changes[task_id] is not None
+        return self._row(task_id) is not None
+
+    def __getitem__(self, task_id: str) -> Dict:
+        if task_id in self.changes:
+            task = self.changes[task_id]
+        else:
+            row = self._row(task_id)
+            task = None if row is None else self.snapshot.task(row)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __setitem__(self, task_id: str, task: Dict) -> None:
+        if task_id in self.changes and self.changes[task_id] is None:
+            # added again after a delete, a dict would move it to the end
+            del self.changes[task_id]
+            self.moved.add(task_id)
+        self.changes[task_id] = task
+
+    def __delitem__(self, task_id: str) -> None:
+        if task_id not in self:
+            raise KeyError(task_id)
+        if self._row(task_id) is None:
+            del self.changes[task_id]
+        else:
+            self.changes[task_id] = None
+            self.moved.discard(task_id)
+
+    def __len__(self) -> int:
+        count = 0 if self.snapshot is None else len(self.snapshot)
+        for task_id, task in self.changes.items():
+            in_snapshot = self._row(task_id) is not None
+            if in_snapshot and task is None:
+                count -= 1
+            elif not in_snapshot:
+                count += 1
+        return count
+
+    def _entries(self, status: Optional[str] = None) -> Iterator[Tuple[str, Optional[int], Optional[Dict]]]:
+        """Yields task id, snapshot row and changed task of every task in order, or of tasks with status,
+        the task is None for unchanged snapshot rows, they are decoded only when needed
+        """
+        rows = list()
+        if self.snapshot is not None:
+            rows = self.snapshot.rows(status)
+            if status is not None and self.changes:
+                # a change may have moved a task into the status
+                changed = (self._row(task_id) for task_id in self.changes)
+                rows = sorted({row for row in changed if row is not None}.union(rows))
+        for row in rows:
+            task_id = self.snapshot.task_id(row)
+            if task_id not in self.changes:
+                yield task_id, row, None
+            elif task_id not in self.moved and self.changes[task_id] is not None:
+                if status is None or self.changes[task_id]['status'] == status:
+                    yield task_id, row, self.changes[task_id]
+        for task_id, task in self.changes.items():
+            if task is None or (status is not None and task['status'] != status):
+                continue
+            if task_id in self.moved or self._row(task_id) is None:
+                yield task_id, None, task
+
+    def __iter__(self) -> Iterator[str]:
+        return (task_id for task_id, _, _ in self._entries())
+
+    def select(self, status: Optional[str] = None, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yields tasks in order, or tasks with status, decoding only the ones between offset and limit"""
+        entries = islice(self._entries(status), offset, None if limit is None else offset + limit)
+        for _, row, task in entries:
+            yield self.snapshot.task(row) if task is None else task
+
+    def write(self, path: str, version: int, next_id: int) -> None:
+        """Writes the tasks as a new snapshot, runs of unchanged snapshot rows are copied without decoding"""
+        builder = ColumnBuilder(self.snapshot.statuses if self.snapshot is not None else ())
+        start = stop = None
+        for _, row, task in self._entries():
+            if task is None and row == stop:
+                stop += 1
+                continue
+            if start is not None:
+                builder.add_rows(self.snapshot, start, stop)
+                start = stop = None
+            if task is None:
+                start, stop = row, row + 1
+            else:
+                builder.add(task)
+        if start is not None:
+            builder.add_rows(self.snapshot, start, stop)
+        builder.write(path, version, next_id)
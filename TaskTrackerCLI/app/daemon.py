@@ -0,0 +1,166 @@
+import json
+import os
+import socket
+import sys
+import time
+
+from typing import List, Optional, Tuple
+
+SOCKET_FILE = 'tasks.sock'
+
+
+def _tasktracker():
+    """Imports TaskTracker lazily, so the client only pays for socket and json"""
+    try:
+        from app.main import TaskTracker
+    except ModuleNotFoundError:
+        # running as `python daemon.py` from inside the app directory
+        from main import TaskTracker
+    return TaskTracker
+
+
+def _load_server():
+    """Builds the server classes, only the daemon process needs them"""
+    import io
+    import socketserver
+
+    from contextlib import redirect_stderr, redirect_stdout
+
+    TaskTracker = _tasktracker()
+
+    class TaskRequestHandler(socketserver.StreamRequestHandler):
+        """Reads one json request line and answers with one json response line"""
+        def handle(self) -> None:
+            request = json.loads(self.rfile.readline())
+            output, status = self.server.execute(request['argv'], request.get('stdin'))
+            self.wfile.write(json.dumps({'output': output, 'status': status}).encode() + b'\n')
+
+    class TaskServer(socketserver.UnixStreamServer):
+        """Serves TaskTracker commands over a unix socket, keeping tasks in memory between them
+        Attributes:
+            tasktracker : TaskTracker
+                tracker whose storage stays loaded between requests
+            timeout : float
+                seconds without a request before the server stops
+            idle : bool
+                True once the server timed out waiting for a request
+        """
+        def __init__(self, socket_file: str, idle_timeout: float) -> None:
+            self.tasktracker = TaskTracker()
+            self.timeout = idle_timeout
+            self.idle = False
+            super().__init__(socket_file, TaskRequestHandler)
+
+        def handle_timeout(self) -> None:
+            self.idle = True
+
+        def execute(self, argv: List[str], stdin: Optional[str]) -> Tuple[str, int]:
+            """Runs a command line as TaskTracker would, returns its output and exit status"""
+            self.tasktracker.storage.refresh()
+            output = io.StringIO()
+            saved_stdin, sys.stdin = sys.stdin, io.StringIO(stdin or '')
+            try:
+                with redirect_stdout(output), redirect_stderr(output):
+                    self.tasktracker.run(argv)
+                status = 0
+            except SystemExit as error:
+                status = error.code if isinstance(error.code, int) else int(error.code is not None)
+            except Exception as error:
+                output.write(f'Error: {error}\n')
+                status = 1
+            finally:
+                sys.stdin = saved_stdin
+            return output.getvalue(), status
+
+    return TaskServer
+
+
+def _connect(socket_file: str) -> socket.socket:
+    """Connects to a running daemon
+    :raises OSError: if no daemon listens on socket_file
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_file)
+    except OSError:
+        client.close()
+        raise
+    return client
+
+
+def serve(socket_file: str = SOCKET_FILE, idle_timeout: float = 600) -> None:
+    """Runs the daemon until it has been idle for idle_timeout seconds"""
+    if os.path.exists(socket_file):
+        try:
+            _connect(socket_file).close()
+            return
+        except OSError:
+            # left behind by a daemon that did not shut down cleanly
+            os.remove(socket_file)
+    server = _load_server()(socket_file, idle_timeout)
+    try:
+        while not server.idle:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(socket_file)
+
+
+def start(socket_file: str = SOCKET_FILE, wait: float = 5.0) -> socket.socket:
+    """Starts a daemon in the background and returns a connection to it
+    :raises OSError: if it does not accept connections within wait seconds
+    """
+    import subprocess
+
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve'],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return _connect(socket_file)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def request(argv: List[str], stdin: Optional[str] = None, socket_file: str = SOCKET_FILE) -> Tuple[str, int]:
+    """Sends a command line to the daemon, starting it if needed, returns its output and exit status"""
+    try:
+        client = _connect(socket_file)
+    except OSError:
+        client = start(socket_file)
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps({'argv': argv, 'stdin': stdin}).encode() + b'\n')
+        stream.flush()
+        response = json.loads(stream.readline())
+    return response['output'], response['status']
+
+
+def main(argv: List[str]) -> int:
+    """Thin client, forwards argv to the daemon, or runs the daemon with --serve"""
+    if argv[:1] == ['--serve']:
+        serve()
+        return 0
+    if not hasattr(socket, 'AF_UNIX'):
+        # no unix sockets on this platform, run the command in this process
+        _tasktracker()().run(argv)
+        return 0
+    if 'TASKTRACKER_STORAGE' in os.environ:
+        argv = ['--storage', os.environ['TASKTRACKER_STORAGE'], *argv]
+    stdin = None
+    for flag in ('-b', '--batch'):
+        if flag in argv[:-1] and argv[argv.index(flag) + 1] == '-':
+            stdin = sys.stdin.read()
+    output, status = request(argv, stdin)
+    sys.stdout.write(output)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,122 @@
+"""Fast entry point for listing tasks
+
+Takes the same arguments as main.py. Listings of the json and journal storages are
+printed straight from the binary cache, which only needs os and marshal, so they skip
+importing argparse, json, typing and the storages. Every other command, and listings
+whose cache is stale, go through TaskTracker, which writes the cache again.
+"""
+import os
+import sys
+
+try:
+    from app.cache import cache_key, read_cache
+except ModuleNotFoundError:
+    # running as `python fast.py` from inside the app directory
+    from cache import cache_key, read_cache
+
+TASKS_FILE = 'tasks.json'
+# kept in sync with TaskTracker.field_labels
+FIELD_LABELS = {
+    'id': 'ID',
+    'title': 'Task',
+    'description': 'Description',
+    'status': 'Status',
+    'createdAt': 'Created',
+    'updatedAt': 'Updated',
+}
+# listing flags in the order TaskTracker.run prints them, None lists every task
+LISTINGS = {
+    '-l': ('list', None),
+    '--list': ('list', None),
+    '-l_d': ('list_done', 'done'),
+    '--list_done': ('list_done', 'done'),
+    '-l_p': ('list_progress', 'in progress'),
+    '--list_progress': ('list_progress', 'in progress'),
+    '-l_t': ('list_todo', ''),
+    '--list_todo': ('list_todo', ''),
+}
+OPTIONS = ('--storage', '--offset', '--limit', '--fields')
+
+
+def parse(argv: list) -> dict | None:
+    """Parses a command line made only of listing flags and their options,
+    returns None for anything else so TaskTracker handles it and reports errors
+    """
+    options = {'storage': os.environ.get('TASKTRACKER_STORAGE', 'json'), 'offset': '0', 'limit': None}
+    options['fields'], options['listings'] = ','.join(FIELD_LABELS), dict()
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in LISTINGS:
+            name, status = LISTINGS[argument]
+            options['listings'][name] = status
+            continue
+        option, equals, value = argument.partition('=')
+        if option not in OPTIONS:
+            return None
+        if not equals:
+            value = next(arguments, None)
+            if value is None:
+                return None
+        options[option[2:]] = value
+    try:
+        options['offset'] = int(options['offset'])
+        options['limit'] = None if options['limit'] is None else int(options['limit'])
+    except ValueError:
+        return None
+    options['fields'] = options['fields'].split(',')
+    if (
+        not options['listings']
+        or options['storage'] not in ('json', 'journal')
+        or options['offset'] < 0
+        or (options['limit'] is not None and options['limit'] < 0)
+        or not set(options['fields']) <= set(FIELD_LABELS)
+    ):
+        return None
+    return options
+
+
+def cached_tasks(storage: str) -> dict | None:
+    """Returns the tasks cached by the json or journal storage, None if the cache is stale"""
+    state = read_cache(f'{TASKS_FILE}.cache', cache_key(storage, [TASKS_FILE, f'{TASKS_FILE}l']))
+    return None if state is None else state['tasks']
+
+
+def print_listings(tasks: dict, options: dict) -> None:
+    """Prints the requested listings as TaskTracker.run does"""
+    stop = None if options['limit'] is None else options['offset'] + options['limit']
+    lines = list()
+    for name in ('list', 'list_done', 'list_progress', 'list_todo'):
+        if name not in options['listings']:
+            continue
+        status = options['listings'][name]
+        selected = [task for task in tasks.values() if status is None or task['status'] == status]
+        for task in selected[options['offset']:stop]:
+            lines.extend(f'{FIELD_LABELS[field]}: {task[field]}' for field in options['fields'])
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def main(argv: list) -> int:
+    """Prints listings from the cache, or runs argv through TaskTracker"""
+    options = parse(argv)
+    tasks = None if options is None else cached_tasks(options['storage'])
+    if tasks is not None:
+        print_listings(tasks, options)
+        return 0
+    try:
+        from app.main import TaskTracker
+    except ModuleNotFoundError:
+        # running as `python fast.py` from inside the app directory
+        from main import TaskTracker
+    if options is None:
+        TaskTracker().run(argv)
+    else:
+        tracker = TaskTracker(options['storage'])
+        # loading up front writes the cache for the next listing
+        tracker.storage.load()
+        tracker.run(argv)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,165 +1,334 @@
-import argparse
 import json
 import os
+import sys
 
+from contextlib import nullcontext
 from datetime import datetime
-from pprint import pprint
-from typing import Dict
+from functools import cached_property, wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from app.search import SearchIndex, task_text
+    from app.storage import STORAGES, ConflictError, export, migrate
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from search import SearchIndex, task_text
+    from storage import STORAGES, ConflictError, export, migrate
+
+
+def non_negative(value: str) -> int:
+    """Parses a count of tasks for --offset and --limit
+    :raises ValueError: if value is not an integer of at least 0
+    """
+    number = int(value)
+    if number < 0:
+        raise ValueError(f'{value} is negative')
+    return number
+
+
+def retry_on_conflict(method):
+    """Runs a TaskTracker method in a storage transaction, when another process
+    saved in the meantime the method runs again on freshly loaded tasks.
+    Once the storage committed, the search index records the change.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.storage.in_transaction:
+            return method(self, *args, **kwargs)
+        for attempt in range(self.max_retries):
+            self.storage.committed = None
+            self.search_index.rollback()
+            try:
+                with self.storage.transaction():
+                    result = method(self, *args, **kwargs)
+            except ConflictError:
+                if attempt == self.max_retries - 1:
+                    raise
+            else:
+                if self.storage.committed is not None:
+                    self.search_index.commit(*self.storage.committed)
+                return result
+    return wrapper
 
 
 class TaskTracker:
     """TaskTracker class
     Attributes:
-        tasks : dict
-            Dictionary of tasks, keyed by task id
         tasks_file : json file with tasks
-        parser : argparse parser
+        storage : storage backend that reads and writes tasks_file
+        search_index : inverted index over task titles and descriptions, stored next to tasks_file
+        parser : argparse parser, built on first use
+        statuses : list(str)
+            statuses a task can be moved to
+        field_labels : dict
+            labels of task fields, in the order they are printed
+        max_retries : int
+            attempts at a change before giving up on concurrent writers
     """
-    def __init__(self) -> None:
+    statuses = ['in progress', 'done']
+    field_labels = {
+        'id': 'ID',
+        'title': 'Task',
+        'description': 'Description',
+        'status': 'Status',
+        'createdAt': 'Created',
+        'updatedAt': 'Updated',
+    }
+    max_retries = 20
+
+    def __init__(self, storage: str = 'json') -> None:
         self.tasks_file = 'tasks.json'
-        self.parser = argparse.ArgumentParser(
+        self.storage = STORAGES[storage](self.tasks_file)
+        self.search_index = SearchIndex(f'{os.path.splitext(self.tasks_file)[0]}.index.json')
+
+    @cached_property
+    def parser(self):
+        """Builds the parser, argparse is only imported once a command line is parsed"""
+        import argparse
+
+        parser = argparse.ArgumentParser(
             prog='TaskTracker',
             description='Keep track of your tasks, program saves tasks in a json file',
         )
-        self.tasks = dict()
-        self._add_arguments()
+        self._add_arguments(parser)
+        return parser
 
-    def _add_arguments(self) -> None:
+    def _add_arguments(self, parser) -> None:
         """Adds arguments to the parser"""
-        self.parser.add_argument('-a', '--add', type=str, help='Add a task')
-        self.parser.add_argument('-u', '--update', type=str, help='Update task by it id')
-        self.parser.add_argument(
+        parser.add_argument('-a', '--add', type=str, help='Add a task')
+        parser.add_argument('-u', '--update', type=str, help='Update task by it id')
+        parser.add_argument(
             '-s',
             '--status',
             type=str,
-            choices=['in progress', 'done'],
+            choices=self.statuses,
             help='Set status of a task, use it with --update, choices are "in progress", "done"',
         )
-        self.parser.add_argument(
-            'de',
+        parser.add_argument(
+            '-de',
             '--description',
             type=str,
             help='add description for a task, use it with --update'
         )
-        self.parser.add_argument('-d', '--delete', type=int, help='Delete a task by it Id number')
-        self.parser.add_argument(
+        parser.add_argument('-d', '--delete', type=int, help='Delete a task by it Id number')
+        parser.add_argument(
             '-l',
             '--list',
             action='store_true',
             help='List all tasks from json file'
         )
-        self.parser.add_argument(
+        parser.add_argument(
             '-l_d',
             '--list_done',
             action='store_true',
             help='List tasks with done status'
         )
-        self.parser.add_argument(
+        parser.add_argument(
             '-l_p',
             '--list_progress',
             action='store_true',
             help='List tasks with in progress status'
         )
-        self.parser.add_argument(
+        parser.add_argument(
             '-l_t',
             '--list_todo',
             action='store_true',
             help='List todo tasks'
         )
+        parser.add_argument(
+            '--storage',
+            choices=list(STORAGES),
+            default=os.environ.get('TASKTRACKER_STORAGE', 'json'),
+            help='Storage backend, "journal" appends changes instead of rewriting the json file, '
+                 '"columnar" journals changes on top of a compact binary snapshot, '
+                 '"sqlite" keeps tasks in an indexed database, defaults to $TASKTRACKER_STORAGE or "json"',
+        )
+        parser.add_argument(
+            '--search',
+            type=str,
+            help='List tasks whose title or description contain every word, "word*" matches a prefix',
+        )
+        parser.add_argument('--offset', type=non_negative, default=0, help='Skip this many tasks when listing')
+        parser.add_argument('--limit', type=non_negative, help='List at most this many tasks')
+        parser.add_argument(
+            '--fields',
+            type=str,
+            help=f'Comma separated fields to show when listing, from {",".join(self.field_labels)}',
+        )
+        parser.add_argument(
+            '-b',
+            '--batch',
+            type=str,
+            help='Apply add/update/delete operations from a json-lines file ("-" for stdin) in one write',
+        )
+        parser.add_argument(
+            '--migrate',
+            action='store_true',
+            help='Copy tasks from the json file into the columnar snapshot with --storage columnar, '
+                 'into the sqlite database otherwise',
+        )
+        parser.add_argument(
+            '--export',
+            type=str,
+            help='Write every task of the storage to a json file the json storage can read',
+        )
 
     def save(self) -> None:
         """Saves tasks to json file"""
-        with open(self.tasks_file, 'w') as f:
-            json.dump(self.tasks, f)
+        self.storage.save()
 
     def load(self) -> Dict:
         """Loads tasks from json file"""
-        if os.path.exists(self.tasks_file):
-            with open(self.tasks_file, 'r') as f:
-                return json.load(f)
-        return dict()
-
-    def add_task(self, task) -> None:
-        """Adds a tasks from provided commandline arguments"""
-        self.tasks = self.load()
-        task_id = len(self.tasks) + 1
-        self.tasks[task_id] = {'id': task_id,
-                               'title': task,
-                               'description': '',
-                               'status': '',
-                               'createdAt': datetime.now().isoformat(),
-                               'updatedAt': datetime.now().isoformat(),
-                               }
-        self.save()
-
-    def list_tasks(self) -> None:
-        """reads tasks from json file and prints them on CLI"""
-        self.tasks = self.load()
-        for task in self.tasks:
-            print(
-                f'ID: {self.tasks[task]['id']}\n'
-                f'Task: {self.tasks[task]['title']}\n'
-                f'Description: {self.tasks[task]['description']}\n'
-                f'Status: {self.tasks[task]['status']}\n'
-                f'Created: {self.tasks[task]['createdAt']}\n'
-                f'Updated: {self.tasks[task]['updatedAt']}'
-            )
-
-    def delete_task(self, task_id) -> None:
-        """Deletes a task by its id
-            Raises KeyError if task_id is not found
+        return self.storage.load()
+
+    @retry_on_conflict
+    def add_task(self, task) -> int:
+        """Adds a tasks from provided commandline arguments, returns the new task id"""
+        task_id = self.storage.allocate_id()
+        self.storage.put({'id': task_id,
+                          'title': task,
+                          'description': '',
+                          'status': '',
+                          'createdAt': datetime.now().isoformat(),
+                          'updatedAt': datetime.now().isoformat(),
+                          })
+        self.search_index.stage(str(task_id), '', task)
+        return task_id
+
+    def print_tasks(self, tasks: Iterable[Dict], fields: Optional[List[str]] = None) -> None:
+        """Prints tasks as they are produced, limited to fields if given"""
+        fields = fields or list(self.field_labels)
+        for task in tasks:
+            print('\n'.join(f'{self.field_labels[field]}: {task[field]}' for field in fields))
+
+    def list_tasks(self, offset: int = 0, limit: Optional[int] = None, fields: Optional[List[str]] = None) -> None:
+        """streams tasks from storage and prints them on CLI"""
+        self.print_tasks(self.storage.iter_tasks(offset, limit), fields)
+
+    @retry_on_conflict
+    def delete_task(self, task_id) -> bool:
+        """Deletes a task by its id, returns False if task_id is not found"""
+        task = self.storage.get(task_id)
+        if task is None:
+            return False
+        self.storage.delete(task_id)
+        self.search_index.stage(task_id, task_text(task), '')
+        return True
+
+    @retry_on_conflict
+    def update_status(self, task_id, status) -> bool:
+        """Update a task status by its id, returns False if task_id is not found"""
+        return self.storage.update(task_id, status=status, updatedAt=datetime.now().isoformat()) is not None
+
+    @retry_on_conflict
+    def update_description(self, task_id, description) -> bool:
+        """"Updates a task description by its id, returns False if task_id is not found"""
+        task = self.storage.get(task_id)
+        if task is None:
+            return False
+        updated = self.storage.update(task_id, description=description, updatedAt=datetime.now().isoformat())
+        self.search_index.stage(task_id, task_text(task), task_text(updated))
+        return True
+
+    def search_tasks(self, query: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Returns tasks whose title or description contain every term of query,
+        a term ending with * matches words starting with it
         """
-        self.tasks = self.load()
-        try:
-            del self.tasks[task_id]
-            self.save()
-        except KeyError:
-            print(f'Task with {task_id} not found')
-
-    def update_status(self, task_id, status) -> None:
-        """Update a task status by its id"""
-        self.tasks = self.load()
-        for task in self.tasks:
-            if task == task_id:
-                self.tasks[task]['status'] = status
-                self.tasks[task]['updatedAt'] = datetime.now().isoformat()
-                self.save()
-            else:
-                print(f'Task with {task_id} not found')
-
-    def update_description(self, task_id, description) -> None:
-        """"Updates a task description by its id"""
-        self.tasks = self.load()
-        for task in self.tasks:
-            if task == task_id:
-                self.tasks[task]['description'] = description
-                self.tasks[task]['updatedAt'] = datetime.now().isoformat()
-                self.save()
-            else:
-                print(f'Task with {task_id} not found')
+        self.search_index.load(self.storage.stamp(), self.storage.iter_tasks())
+        task_ids = self.search_index.search(query)[offset:None if limit is None else offset + limit]
+        return [task for task in map(self.storage.get, task_ids) if task is not None]
+
+    def apply_operation(self, operation: Dict) -> str:
+        """Applies a single batch operation and returns its result
+        :raises ValueError: if the operation is malformed
+        """
+        op = operation.get('op')
+        if op == 'add':
+            if not operation.get('title'):
+                raise ValueError('add needs a title')
+            if not isinstance(operation['title'], str):
+                raise ValueError('title must be a string')
+            return f'added task {self.add_task(operation["title"])}'
+        if 'id' not in operation:
+            raise ValueError(f'{op} needs an id')
+        task_id = str(operation['id'])
+        if op == 'delete':
+            return f'deleted task {task_id}' if self.delete_task(task_id) else f'task {task_id} not found'
+        if op == 'update':
+            status, description = operation.get('status'), operation.get('description')
+            if status is None and description is None:
+                raise ValueError('update needs a status or a description')
+            if not all(isinstance(field, str) for field in (status, description) if field is not None):
+                raise ValueError('status and description must be strings')
+            if status is not None and status not in self.statuses:
+                raise ValueError(f'status must be one of {self.statuses}')
+            if status is not None and not self.update_status(task_id, status):
+                return f'task {task_id} not found'
+            if description is not None and not self.update_description(task_id, description):
+                return f'task {task_id} not found'
+            return f'updated task {task_id}'
+        raise ValueError(f'unknown operation {op!r}')
+
+    @retry_on_conflict
+    def apply_batch(self, operations: List[Tuple[int, str]]) -> List[Tuple[int, str, bool]]:
+        """Applies numbered json operations in a single transaction,
+        returns the number, result and success of each one
+        """
+        results = list()
+        for number, line in operations:
+            try:
+                operation = json.loads(line)
+                if not isinstance(operation, dict):
+                    raise ValueError('operation must be a json object')
+                results.append((number, self.apply_operation(operation), True))
+            except ValueError as error:
+                results.append((number, f'error: {error}', False))
+        return results
+
+    def run_batch(self, batch_file: str) -> None:
+        """Applies json-lines operations from batch_file, or stdin for '-',
+        in a single transaction and prints the result of each line
+        """
+        with nullcontext(sys.stdin) if batch_file == '-' else open(batch_file) as lines:
+            operations = [(number, line) for number, line in enumerate(lines, 1) if line.strip()]
+        results = self.apply_batch(operations)
+        for number, result, _ in results:
+            print(f'{number}: {result}')
+        print(f'Applied {sum(applied for _, _, applied in results)} of {len(results)} operations')
 
-    def run(self) -> None:
-        """"Runs the tasks list"""
-        args = self.parser.parse_args()
+    def run(self, argv: Optional[List[str]] = None) -> None:
+        """"Runs the tasks list, argv defaults to the command line arguments"""
+        args = self.parser.parse_args(argv)
+        fields = args.fields.split(',') if args.fields else None
+        if fields and not set(fields) <= set(self.field_labels):
+            self.parser.error(f'--fields must be taken from {",".join(self.field_labels)}')
+        if args.migrate:
+            target = 'columnar' if args.storage == 'columnar' else 'sqlite'
+            print(f'Migrated {migrate(self.tasks_file, target)} tasks')
+        if type(self.storage) is not STORAGES[args.storage]:
+            self.storage = STORAGES[args.storage](self.tasks_file)
         if args.add:
             self.add_task(args.add)
         if args.list:
-            self.list_tasks()
+            self.list_tasks(args.offset, args.limit, fields)
         if args.list_done:
-            saved_tasks = self.load()
-            pprint(list(filter(lambda task: task['status'] == 'done', saved_tasks.values())))
+            self.print_tasks(self.storage.with_status('done', args.offset, args.limit), fields)
         if args.list_progress:
-            saved_tasks = self.load()
-            pprint(list(filter(lambda task: task['status'] == 'in progress', saved_tasks.values())))
+            self.print_tasks(self.storage.with_status('in progress', args.offset, args.limit), fields)
         if args.list_todo:
-            saved_tasks = self.load()
-            pprint(list(filter(lambda task: task['status'] == '', saved_tasks.values())))
-        if args.delete:
-            self.delete_task(str(args.delete))
-        if args.update and args.status:
-            self.update_status(args.update, args.status)
-        if args.update and args.description:
-            self.update_description(args.update, args.description)
+            self.print_tasks(self.storage.with_status('', args.offset, args.limit), fields)
+        if args.search:
+            self.print_tasks(self.search_tasks(args.search, args.offset, args.limit), fields)
+        if args.delete and not self.delete_task(str(args.delete)):
+            print(f'Task with {args.delete} not found')
+        if args.update and args.status and not self.update_status(args.update, args.status):
+            print(f'Task with {args.update} not found')
+        if args.update and args.description and not self.update_description(args.update, args.description):
+            print(f'Task with {args.update} not found')
+        if args.batch:
+            self.run_batch(args.batch)
+        if args.export:
+            print(f'Exported {export(self.storage, args.export)} tasks to {args.export}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,204 @@
+import json
+import os
+import re
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    from app.storage import _locked, _write_json
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from storage import _locked, _write_json
+
+
+def tokenize(text: str) -> Set[str]:
+    """Returns the lower-cased words of text"""
+    return set(re.findall(r'\w+', text.lower()))
+
+
+def task_text(task: Optional[Dict]) -> str:
+    """Returns the searchable text of a task, empty for a missing task"""
+    return f'{task["title"]} {task["description"]}' if task else ''
+
+
+class SearchIndex:
+    """Inverted index from words of task titles and descriptions to task ids
+    It is kept as a json snapshot next to the task store plus a json-lines log,
+    every committed change of the store appends one line to the log, so keeping
+    the index up to date costs O(1) I/O. Each line carries the stamps of the store
+    before and after the change, replay stops where they do not follow on from each
+    other, and if the index does not end at the current stamp of the store it missed
+    a change and is rebuilt from the tasks. Nothing is logged before a first search
+    writes a snapshot, and a log that outgrows its snapshot is compacted even if no
+    search loads it. Snapshots are written and the log emptied under a lock.
+    Attributes:
+        path : str
+            path of the json snapshot
+        log_path : str
+            path of the json-lines log of changes
+        lock_path : str
+            path of the lock file taken while writing
+        compact_every : int
+            number of log lines that triggers writing a new snapshot
+        postings : defaultdict(set)
+            task ids for every word, None until the index is loaded
+        words : list(str)
+            sorted words, used to answer prefix queries
+        stamp : list
+            stamp of the task store the loaded index matches
+        staged : list
+            changes waiting for the store to commit
+        pending : int
+            number of lines in the log
+    """
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        self.path = path
+        self.log_path = f'{path}l'
+        self.lock_path = f'{path}.lock'
+        self.compact_every = compact_every
+        self.postings = None
+        self.words = list()
+        self.stamp = None
+        self.staged = list()
+        self.pending = 0
+
+    def stage(self, task_id: str, old_text: str, new_text: str) -> None:
+        """Remembers that the text of a task changed, it is written by commit()"""
+        old_words, new_words = tokenize(old_text), tokenize(new_text)
+        if old_words != new_words:
+            self.staged.append({
+                'id': task_id,
+                'remove': sorted(old_words - new_words),
+                'add': sorted(new_words - old_words),
+            })
+
+    def rollback(self) -> None:
+        """Forgets staged changes, the store did not commit them"""
+        self.staged = list()
+
+    def commit(self, before: List, after: List) -> None:
+        """Appends staged changes with the stamps of the store before and after them to the log
+        The log is not synced to disk, a lost line only means a rebuild. Without a snapshot
+        no line could ever be replayed, so nothing is logged until a search builds the index
+        """
+        entry = {'changes': self.staged, 'before': before, 'after': after}
+        self.staged = list()
+        if not os.path.exists(self.path):
+            self.postings = None
+            return
+        with _locked(self.lock_path):
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                size = f.tell()
+        self.pending += 1
+        if self.postings is not None and not self._apply(entry):
+            # the loaded index missed a change, the next load reads it again
+            self.postings = None
+        if self.postings is not None and self.pending >= self.compact_every:
+            self.save()
+        elif self.postings is None and size > os.path.getsize(self.path):
+            # pending only counts the lines of this process, once replaying the log
+            # costs more than reading the snapshot it is folded into a new one
+            self._read()
+            self.save()
+
+    def _apply(self, entry: Dict) -> bool:
+        """Applies a log entry to the loaded postings,
+        returns False without applying it if it does not start where the index ends
+        """
+        if entry['before'] != self.stamp:
+            return False
+        for change in entry['changes']:
+            for word in change['remove']:
+                task_ids = self.postings.get(word)
+                if task_ids is not None:
+                    task_ids.discard(change['id'])
+                    if not task_ids:
+                        del self.postings[word]
+                        del self.words[bisect_left(self.words, word)]
+            for word in change['add']:
+                if word not in self.postings:
+                    insort(self.words, word)
+                self.postings[word].add(change['id'])
+        self.stamp = entry['after']
+        return True
+
+    def _read(self) -> None:
+        """Reads the snapshot and replays the log, stopping at an interrupted write or a missed change"""
+        self.postings, self.stamp, self.pending = defaultdict(set), None, 0
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.postings.update((word, set(task_ids)) for word, task_ids in data['postings'].items())
+            self.stamp = data['stamp']
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # a missing or corrupt snapshot matches no store, the index is rebuilt
+            self.postings, self.stamp = defaultdict(set), None
+        self.words = sorted(self.postings)
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not self._apply(entry):
+                    break
+                self.pending += 1
+
+    def load(self, stamp: List, tasks: Iterable[Dict]) -> None:
+        """Makes sure the index matches the store with the given stamp,
+        rebuilding it from tasks if it does not
+        """
+        if self.postings is not None and self.stamp == stamp:
+            return
+        self._read()
+        if self.stamp != stamp:
+            self.rebuild(stamp, tasks)
+        elif self.pending >= self.compact_every:
+            self.save()
+
+    def rebuild(self, stamp: List, tasks: Iterable[Dict]) -> None:
+        """Indexes every task from scratch and saves a new snapshot"""
+        self.postings = defaultdict(set)
+        for task in tasks:
+            for word in tokenize(task_text(task)):
+                self.postings[word].add(str(task['id']))
+        self.words = sorted(self.postings)
+        self.stamp = stamp
+        self.save()
+
+    def save(self) -> None:
+        """Writes a snapshot of the loaded index and empties the log"""
+        postings = {word: sorted(task_ids) for word, task_ids in self.postings.items()}
+        with _locked(self.lock_path):
+            _write_json(self.path, {'stamp': self.stamp, 'postings': postings})
+            with open(self.log_path, 'w'):
+                pass
+        self.pending = 0
+
+    def _matches(self, term: str) -> Set[str]:
+        """Returns ids of tasks containing term, a trailing * matches any word with that prefix"""
+        if not term.endswith('*'):
+            return self.postings.get(term, set())
+        prefix = term[:-1]
+        matches = set()
+        index = bisect_left(self.words, prefix)
+        while index < len(self.words) and self.words[index].startswith(prefix):
+            matches |= self.postings[self.words[index]]
+            index += 1
+        return matches
+
+    def search(self, query: str) -> List[str]:
+        """Returns ids of tasks containing every term of query, in id order"""
+        terms = re.findall(r'\w+\*?', query.lower())
+        if not terms:
+            return list()
+        matches = sorted((self._matches(term) for term in terms), key=len)
+        task_ids = set(matches[0]).intersection(*matches[1:])
+        return sorted(task_ids, key=int)
@@ -0,0 +1,841 @@
+import json
+import os
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, msvcrt offers byte range locks instead
+    fcntl = None
+    import msvcrt
+
+try:
+    from app.cache import cache_key, read_cache, write_cache
+    from app.columnar import ColumnarSnapshot, ColumnarTasks, read_header
+except ModuleNotFoundError:
+    # running as `python main.py` from inside the app directory
+    from cache import cache_key, read_cache, write_cache
+    from columnar import ColumnarSnapshot, ColumnarTasks, read_header
+
+
+class ConflictError(Exception):
+    """Raised when tasks were saved by another process since they were loaded"""
+
+
+@contextmanager
+def _locked(path: str):
+    """Holds an exclusive advisory lock on path for the duration of the block"""
+    with open(path, 'a+') as f:
+        f.seek(0)
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_json(path: str, data: Dict) -> None:
+    """Writes data to a temporary file and renames it over path,
+    so readers never see a half written file, the temporary file is named after the process
+    so concurrent writers do not write to the same one
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class _JsonStream:
+    """Reads a json object from a file one member at a time,
+    so only the current member has to fit in memory
+    Attributes:
+        file : text file to read from
+        buffer : str
+            text read from the file but not consumed yet
+        position : int
+            position of the next character to consume in buffer
+    """
+    decoder = json.JSONDecoder()
+
+    def __init__(self, file, chunk_size: int = 1 << 16) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+
+    def _fill(self) -> bool:
+        """Reads another chunk into the buffer, returns False at the end of the file"""
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> str:
+        """Consumes the next character
+        :raises ValueError: if it is not one of char
+        """
+        found = self.peek()
+        if not found or found not in char:
+            raise ValueError(f'Expected {char!r} at {found!r}')
+        self.position += 1
+        return found
+
+    def value(self):
+        """Decodes the next json value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.position = end
+            return value
+
+    def keys(self) -> Iterator[str]:
+        """Yields the keys of the object at the current position,
+        the caller has to consume each value before asking for the next key
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+class JsonStorage:
+    """Keeps every task in a single json file which is rewritten on each change
+    The file holds a header next to the tasks, {"version": int, "next_id": int, "tasks": {...}},
+    files written before the header existed are a bare dict of tasks and still load.
+    Reads take no lock, writers lock the file, check that version is still the one
+    they loaded and raise ConflictError otherwise, so callers can retry on fresh tasks.
+    Parsed tasks are kept in a binary cache, loading an unchanged file skips json.
+    The journal backend shares the json file, its journal is replayed on load and folded
+    into the file by the next commit, so switching backends never loses a change.
+    Attributes:
+        path : str
+            path of the json file
+        journal_path : str
+            path of the json-lines journal of the journal backend, next to the json file
+        lock_path : str
+            path of the lock file taken while committing
+        cache_path : str
+            path of the binary cache of the loaded tasks
+        tasks : dict
+            Dictionary of tasks, keyed by task id, None until the file is loaded
+        next_id : int
+            high-water mark of task ids, ids are never handed out twice even after deletes
+        version : int
+            number of times the file was saved, as of the last load or save
+        status_index : defaultdict(list)
+            sorted int task ids bucketed by status, kept up to date on every change
+        pending : int
+            number of entries currently in the journal
+        journal_size : int
+            size in bytes of the journal entries that were loaded or written
+        uncommitted : list
+            changes made since the last commit, as journal style entries
+        in_transaction : bool
+            True while changes are collected by transaction()
+        committed : tuple(list, list)
+            stamps of the store before and after the last commit, None until something is committed
+    """
+    name = 'json'
+    cached_attributes = ('tasks', 'next_id', 'version', 'pending', 'journal_size')
+    use_cache = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.journal_path = f'{path}l'
+        self.lock_path = f'{path}.lock'
+        self.cache_path = f'{path}.cache'
+        self.tasks = None
+        self.next_id = 1
+        self.version = 0
+        self.status_index = defaultdict(list)
+        self.pending = 0
+        self.journal_size = 0
+        self.uncommitted = list()
+        self.in_transaction = False
+        self.committed = None
+
+    def load(self) -> Dict:
+        """Loads tasks from the cache or the json file, the file is only read on the first call"""
+        if self.tasks is None and not self._read_cache():
+            key = self._cache_key()
+            self._read_files()
+            if self.use_cache:
+                write_cache(self.cache_path, key, {name: getattr(self, name) for name in self.cached_attributes})
+            self._build_index()
+        return self.tasks
+
+    def _cache_key(self) -> List:
+        """Returns the key of the cache, it covers both the json file and the journal and is taken
+        before the files are read, so a change made while reading makes the cache stale instead of wrong
+        """
+        return cache_key(self.name, [self.path, self.journal_path])
+
+    def _read_cache(self) -> bool:
+        """Loads tasks from the cache, returns False if it is missing or stale"""
+        if not self.use_cache:
+            return False
+        state = read_cache(self.cache_path, self._cache_key())
+        if state is None:
+            return False
+        for name in self.cached_attributes:
+            setattr(self, name, state[name])
+        self._build_index()
+        return True
+
+    def _read_files(self) -> None:
+        """Loads the snapshot and replays the journal on top of it,
+        starts over if a compaction replaced the snapshot in between
+        """
+        while True:
+            self.tasks = self._read_snapshot()
+            self._replay()
+            if self._disk_version() == self.version:
+                break
+
+    def _read_journal(self) -> Tuple[List[Dict], int]:
+        """Returns the complete journal entries and the number of bytes they take
+        A line without a trailing newline or with invalid json is the remains of
+        an interrupted write, it and anything after it is ignored
+        """
+        entries, valid = list(), 0
+        if not os.path.exists(self.journal_path):
+            return entries, valid
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                valid += len(line)
+        return entries, valid
+
+    def _replay(self) -> None:
+        """Applies journal entries in order"""
+        entries, self.journal_size = self._read_journal()
+        for entry in entries:
+            self._apply(entry)
+        self.pending = len(entries)
+
+    def _read_snapshot(self) -> Dict:
+        """Reads the json file and its header, returns an empty dict if it does not exist"""
+        self.next_id, self.version = 1, 0
+        if not os.path.exists(self.path):
+            return dict()
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data.get('tasks'), dict):
+            self.next_id = data['next_id']
+            self.version = data.get('version', 0)
+            return data['tasks']
+        self.next_id = max(map(int, data), default=0) + 1
+        return data
+
+    def _disk_version(self) -> int:
+        """Reads the version from the header of the json file, it is the first member"""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r') as f:
+            stream = _JsonStream(f, chunk_size=256)
+            for key in stream.keys():
+                return stream.value() if key == 'version' else 0
+        return 0
+
+    def stamp(self) -> List:
+        """Returns a value that changes whenever the stored tasks change"""
+        size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        return [self.name, self._disk_version(), size]
+
+    def _loaded_stamp(self) -> List:
+        """Returns the stamp of the tasks as they were loaded or last written"""
+        return [self.name, self.version, self.journal_size]
+
+    def refresh(self) -> None:
+        """Drops the loaded tasks if another process saved or appended since they were loaded"""
+        if self.tasks is None:
+            return
+        size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if size != self.journal_size or self._disk_version() != self.version:
+            self.rollback()
+
+    def _check_version(self) -> None:
+        """Makes sure nobody saved since the tasks were loaded, call it while holding the lock
+        :raises ConflictError: if the file has a different version
+        """
+        if self._disk_version() != self.version:
+            raise ConflictError(f'{self.path} was changed by another process')
+
+    def _check_journal(self) -> None:
+        """Makes sure the journal still ends where it did when it was read, call it while holding the lock
+        A tail without a newline is the remains of an interrupted write, it is cut off
+        so the next entry starts on a clean line
+        :raises ConflictError: if another process appended to or compacted the journal
+        """
+        size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if size == self.journal_size:
+            return
+        if size > self.journal_size:
+            with open(self.journal_path, 'rb+') as f:
+                f.seek(self.journal_size)
+                if b'\n' not in f.read():
+                    f.truncate(self.journal_size)
+                    return
+        raise ConflictError(f'{self.journal_path} was changed by another process')
+
+    def _stream_snapshot(self) -> Iterator[Tuple[str, Dict]]:
+        """Yields task id and task pairs from the json file without loading all of it"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            stream = _JsonStream(f)
+            for key in stream.keys():
+                if key == 'tasks':
+                    for task_id in stream.keys():
+                        yield task_id, stream.value()
+                elif key.isdigit():
+                    yield key, stream.value()
+                else:
+                    stream.value()
+
+    def _snapshot(self) -> Dict:
+        """Returns the content of the json file"""
+        return {'version': self.version, 'next_id': self.next_id, 'tasks': self.load()}
+
+    def _build_index(self) -> None:
+        """Buckets every loaded task by its status"""
+        self.status_index.clear()
+        for task_id, task in self.tasks.items():
+            self.status_index[task['status']].append(int(task_id))
+        for bucket in self.status_index.values():
+            bucket.sort()
+
+    def _unindex(self, task: Dict) -> None:
+        """Takes a task out of its status bucket"""
+        bucket = self.status_index[task['status']]
+        del bucket[bisect_left(bucket, int(task['id']))]
+
+    def _set(self, task: Dict) -> None:
+        """Adds or replaces a task in memory, moving it to its new status bucket
+        buckets are kept sorted by id, so a listing reads the same whatever changed before it
+        """
+        tasks = self.load()
+        task_id = str(task['id'])
+        old = tasks.get(task_id)
+        tasks[task_id] = task
+        self.next_id = max(self.next_id, int(task['id']) + 1)
+        if old is not None and old['status'] == task['status']:
+            return
+        if old is not None:
+            self._unindex(old)
+        insort(self.status_index[task['status']], int(task_id))
+
+    def _remove(self, task_id: str) -> bool:
+        """Removes a task from memory, returns False if it does not exist"""
+        task = self.load().pop(task_id, None)
+        if task is None:
+            return False
+        self._unindex(task)
+        return True
+
+    def _record(self, entry: Dict) -> None:
+        """Remembers a change, commits it right away unless a transaction is open"""
+        self.uncommitted.append(entry)
+        if not self.in_transaction:
+            try:
+                self.commit()
+            except ConflictError:
+                self.rollback()
+                raise
+
+    def commit(self) -> None:
+        """Persists uncommitted changes, folding the journal of the journal backend into the file
+        :raises ConflictError: if another process saved or journaled since the tasks were loaded
+        """
+        if not self.uncommitted:
+            return
+        with _locked(self.lock_path):
+            self._check_version()
+            self._check_journal()
+            before = self._loaded_stamp()
+            self.save()
+        self.committed = (before, self._loaded_stamp())
+
+    def rollback(self) -> None:
+        """Drops loaded tasks and uncommitted changes, the next access reloads the file"""
+        self.tasks = None
+        self.uncommitted = list()
+
+    @contextmanager
+    def transaction(self):
+        """Collects every change made inside the block and persists them with a single write
+        If the block or the commit raises, nothing is written and the loaded tasks are dropped,
+        a transaction opened inside another one joins it
+        """
+        if self.in_transaction:
+            yield self
+            return
+        self.load()
+        self.in_transaction = True
+        try:
+            yield self
+            self.in_transaction = False
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self.in_transaction = False
+
+    def save(self) -> None:
+        """Writes every task back to the json file as a new version and empties the journal
+        The file is replaced before the journal is emptied, replaying
+        a journal twice gives the same tasks, so a crash in between is harmless
+        """
+        self.version += 1
+        self._write_snapshot()
+        self.uncommitted = list()
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'w'):
+                pass
+        self.pending = 0
+        self.journal_size = 0
+
+    def _write_snapshot(self) -> None:
+        """Replaces the file with the loaded tasks"""
+        _write_json(self.path, self._snapshot())
+
+    def allocate_id(self) -> int:
+        """Returns a new task id, the high-water mark is saved with the task that uses it"""
+        self.load()
+        task_id = self.next_id
+        self.next_id += 1
+        return task_id
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """Returns a task by its id or None if it does not exist"""
+        return self.load().get(task_id)
+
+    def put(self, task: Dict) -> None:
+        """Adds or replaces a task"""
+        self._set(task)
+        self._record({'op': 'put', 'task': task})
+
+    def update(self, task_id: str, **fields) -> Optional[Dict]:
+        """Changes fields of a task, returns the updated task or None if it does not exist"""
+        task = self.get(task_id)
+        if task is None:
+            return None
+        task = {**task, **fields}
+        self.put(task)
+        return task
+
+    def delete(self, task_id: str) -> bool:
+        """Deletes a task by its id, returns False if it does not exist"""
+        if not self._remove(task_id):
+            return False
+        self._record({'op': 'delete', 'id': task_id})
+        return True
+
+    def iter_tasks(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yields tasks one at a time, streamed from the file unless they are loaded,
+        the cache holds every task so it is not read for a listing that may stop early.
+        The journal is short enough to read up front and patches the streamed tasks
+        """
+        if self.tasks is not None:
+            return islice(iter(self.tasks.values()), offset, None if limit is None else offset + limit)
+        changes = dict()
+        entries, _ = self._read_journal()
+        for entry in entries:
+            for change in entry['entries'] if entry['op'] == 'batch' else [entry]:
+                if change['op'] == 'put':
+                    changes[str(change['task']['id'])] = change['task']
+                else:
+                    changes[change['id']] = None
+
+        def merged():
+            for task_id, task in self._stream_snapshot():
+                if task_id in changes:
+                    task = changes.pop(task_id)
+                if task is not None:
+                    yield task
+            yield from (task for task in changes.values() if task is not None)
+
+        return islice(merged(), offset, None if limit is None else offset + limit)
+
+    def _apply(self, entry: Dict) -> None:
+        """Applies a single journal entry to the loaded tasks"""
+        if entry['op'] == 'put':
+            self.tasks[str(entry['task']['id'])] = entry['task']
+            self.next_id = max(self.next_id, int(entry['task']['id']) + 1)
+        elif entry['op'] == 'delete':
+            self.tasks.pop(entry['id'], None)
+        elif entry['op'] == 'batch':
+            for batched in entry['entries']:
+                self._apply(batched)
+
+    def with_status(self, status: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Returns tasks with the given status from the status index, in id order"""
+        tasks = self.load()
+        task_ids = self.status_index.get(status, [])[offset:None if limit is None else offset + limit]
+        return [tasks[str(task_id)] for task_id in task_ids]
+
+
+class JournalStorage(JsonStorage):
+    """Keeps a json snapshot plus an append-only journal of operations
+    Every commit appends one line to the journal, so a mutation costs O(1) I/O,
+    a transaction is written as a single batch line so it is replayed whole or not at all.
+    Loading replays the journal on top of the snapshot, once the journal holds
+    compact_every operations it is folded into a new snapshot. Besides the snapshot
+    version, writers check that the journal did not grow since they read it.
+    Reading and folding the journal is shared with JsonStorage, which folds it on its next commit.
+    Attributes:
+        compact_every : int
+            number of journal entries that triggers a compaction
+    """
+    name = 'journal'
+
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        super().__init__(path)
+        self.compact_every = compact_every
+
+    def commit(self) -> None:
+        """Appends uncommitted changes to the journal and compacts it when it gets too long
+        :raises ConflictError: if another process saved since the tasks were loaded
+        """
+        if not self.uncommitted:
+            return
+        if len(self.uncommitted) == 1:
+            entry = self.uncommitted[0]
+        else:
+            entry = {'op': 'batch', 'entries': self.uncommitted}
+        line = (json.dumps(entry) + '\n').encode()
+        with _locked(self.lock_path):
+            self._check_version()
+            self._check_journal()
+            before = self._loaded_stamp()
+            with open(self.journal_path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_size += len(line)
+            self.pending += 1
+            self.uncommitted = list()
+            if self.pending >= self.compact_every:
+                self.save()
+        self.committed = (before, self._loaded_stamp())
+
+
+class ColumnarStorage(JournalStorage):
+    """Keeps a columnar binary snapshot next to the json file plus an append-only journal
+    Changes are journaled exactly as JournalStorage does, compactions write the snapshot
+    with interned statuses, integer timestamps and utf-8 string blobs instead of json.
+    The snapshot is memory mapped and loaded tasks are a ColumnarTasks view over it,
+    so loading costs a journal replay and only the tasks that are used get decoded.
+    It is already binary, so the cache of parsed tasks is not used.
+    """
+    name = 'columnar'
+    use_cache = False
+
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        super().__init__(f'{os.path.splitext(path)[0]}.columns', compact_every)
+        self.journal_path = f'{self.path}.jsonl'
+
+    def _read_snapshot(self) -> ColumnarTasks:
+        """Maps the snapshot and its header, an empty snapshot if it does not exist"""
+        self.next_id, self.version = 1, 0
+        if not os.path.exists(self.path):
+            return ColumnarTasks(None)
+        snapshot = ColumnarSnapshot(self.path)
+        self.next_id, self.version = snapshot.header['next_id'], snapshot.header['version']
+        return ColumnarTasks(snapshot)
+
+    def _disk_version(self) -> int:
+        """Reads the version from the header of the snapshot"""
+        return read_header(self.path)['version'] if os.path.exists(self.path) else 0
+
+    def _write_snapshot(self) -> None:
+        """Replaces the snapshot with the loaded tasks"""
+        self.load().write(self.path, self.version, self.next_id)
+
+    def _build_index(self) -> None:
+        """The status column takes the place of the status index"""
+
+    def _set(self, task: Dict) -> None:
+        """Adds or replaces a task in memory"""
+        self.load()[str(task['id'])] = task
+        self.next_id = max(self.next_id, int(task['id']) + 1)
+
+    def _remove(self, task_id: str) -> bool:
+        """Removes a task from memory, returns False if it does not exist"""
+        return self.load().pop(task_id, None) is not None
+
+    def iter_tasks(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yields tasks one at a time, decoded from the mapped snapshot as they are reached"""
+        return self.load().select(None, offset, limit)
+
+    def with_status(self, status: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Returns tasks with the given status, found through the status column"""
+        return list(self.load().select(status, offset, limit))
+
+    def put_many(self, tasks: Iterable[Dict], next_id: int = 1) -> None:
+        """Adds or replaces several tasks, writing them straight into a new snapshot,
+        ids are handed out from next_id on if it is above the current high-water mark
+        """
+        with _locked(self.lock_path):
+            self.rollback()
+            for task in tasks:
+                self._set(task)
+            self.next_id = max(self.next_id, next_id)
+            self.save()
+
+
+class SqliteStorage:
+    """Keeps tasks in a sqlite database next to the json file
+    status, createdAt and updatedAt are indexed, so filtered listings
+    are index lookups instead of a scan over every task. sqlite locks the
+    database itself, so this storage never raises ConflictError.
+    Attributes:
+        path : str
+            path of the sqlite database
+        connection : sqlite3.Connection
+        in_transaction : bool
+            True while changes are collected by transaction()
+        committed : tuple(list, list)
+            stamps of the store before and after the last commit, None until something is committed
+    """
+    columns = ('id', 'title', 'description', 'status', 'createdAt', 'updatedAt')
+
+    def __init__(self, path: str) -> None:
+        self.path = f'{os.path.splitext(path)[0]}.db'
+        # imported here, the json storages start faster without it
+        import sqlite3
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.in_transaction = False
+        self.committed = None
+        with self.connection:
+            self.connection.executescript(
+                '''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL DEFAULT '',
+                    createdAt TEXT NOT NULL,
+                    updatedAt TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+                CREATE INDEX IF NOT EXISTS tasks_created_at ON tasks (createdAt);
+                CREATE INDEX IF NOT EXISTS tasks_updated_at ON tasks (updatedAt);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                '''
+            )
+
+    def load(self) -> Dict:
+        """Loads every task from the database"""
+        rows = self.connection.execute('SELECT * FROM tasks ORDER BY id')
+        return {str(row['id']): dict(row) for row in rows}
+
+    def stamp(self) -> List:
+        """Returns a value that changes whenever the stored tasks change,
+        pages are updated in place so the revision counter is used instead of the file
+        """
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return ['sqlite', row[0] if row else 0]
+
+    def refresh(self) -> None:
+        """Nothing is cached in memory, kept for interface compatibility"""
+
+    def commit(self) -> None:
+        """Commits pending changes unless a transaction is open, bumping the revision counter"""
+        if not self.in_transaction:
+            self._commit()
+
+    def _commit(self) -> None:
+        """Bumps the revision counter if anything changed and commits,
+        the write lock is already held so no other connection can commit in between
+        """
+        if not self.connection.in_transaction:
+            return
+        before = self.stamp()
+        self.connection.execute(
+            "INSERT INTO meta VALUES ('revision', 1) ON CONFLICT (key) DO UPDATE SET value = value + 1"
+        )
+        self.connection.commit()
+        self.committed = (before, self.stamp())
+
+    def save(self) -> None:
+        """Every change is committed as it happens, kept for interface compatibility"""
+        self.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Commits every change made inside the block at once, rolls back if it raises,
+        a transaction opened inside another one joins it
+        """
+        if self.in_transaction:
+            yield self
+            return
+        self.in_transaction = True
+        try:
+            yield self
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self.in_transaction = False
+        self._commit()
+
+    def allocate_id(self) -> int:
+        """Returns a new task id from the next_id row of the meta table,
+        databases created before the row existed start after the largest id
+        """
+        # writing first takes the database write lock, so concurrent processes never share an id
+        cursor = self.connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'next_id'")
+        if cursor.rowcount == 0:
+            self.connection.execute("INSERT INTO meta SELECT 'next_id', COALESCE(MAX(id), 0) + 2 FROM tasks")
+        task_id = self.connection.execute("SELECT value - 1 FROM meta WHERE key = 'next_id'").fetchone()[0]
+        self.commit()
+        return task_id
+
+    @property
+    def next_id(self) -> int:
+        """Returns the id the next allocate_id() hands out, without taking it"""
+        row = self.connection.execute(
+            "SELECT COALESCE((SELECT value FROM meta WHERE key = 'next_id'), (SELECT MAX(id) + 1 FROM tasks), 1)"
+        ).fetchone()
+        return row[0]
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """Returns a task by its id or None if it does not exist"""
+        row = self.connection.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def put(self, task: Dict) -> None:
+        """Adds or replaces a task"""
+        self.put_many([task])
+
+    def put_many(self, tasks, next_id: int = 1) -> None:
+        """Adds or replaces several tasks in one transaction,
+        ids are handed out from next_id on if it is above the current high-water mark
+        """
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)',
+            ([task[column] for column in self.columns] for task in tasks),
+        )
+        self.connection.execute(
+            "UPDATE meta SET value = MAX(value, COALESCE((SELECT MAX(id) + 1 FROM tasks), value)) WHERE key = 'next_id'"
+        )
+        if next_id > 1:
+            self.connection.execute(
+                "INSERT INTO meta SELECT 'next_id', MAX(?, COALESCE(MAX(id), 0) + 1) FROM tasks WHERE true "
+                "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+                (next_id,),
+            )
+        self.commit()
+
+    def update(self, task_id: str, **fields) -> Optional[Dict]:
+        """Changes fields of a task, returns the updated task or None if it does not exist"""
+        if not set(fields) <= set(self.columns):
+            raise ValueError(f'Unknown task fields: {set(fields) - set(self.columns)}')
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        cursor = self.connection.execute(
+            f'UPDATE tasks SET {assignments} WHERE id = ?', (*fields.values(), task_id)
+        )
+        self.commit()
+        return self.get(task_id) if cursor.rowcount else None
+
+    def delete(self, task_id: str) -> bool:
+        """Deletes a task by its id, returns False if it does not exist"""
+        cursor = self.connection.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        self.commit()
+        return cursor.rowcount > 0
+
+    def iter_tasks(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yields tasks one row at a time"""
+        rows = self.connection.execute(
+            'SELECT * FROM tasks ORDER BY id LIMIT ? OFFSET ?', (-1 if limit is None else limit, offset)
+        )
+        return (dict(row) for row in rows)
+
+    def with_status(self, status: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Returns tasks with the given status using the status index"""
+        rows = self.connection.execute(
+            'SELECT * FROM tasks WHERE status = ? ORDER BY id LIMIT ? OFFSET ?',
+            (status, -1 if limit is None else limit, offset),
+        )
+        return [dict(row) for row in rows]
+
+
+def migrate(json_path: str, storage: str = 'sqlite') -> int:
+    """Copies tasks from the json file, including an unfolded journal,
+    into the sqlite database or the columnar snapshot, returns the number of migrated tasks
+    """
+    source = JournalStorage(json_path)
+    tasks = source.load()
+    STORAGES[storage](json_path).put_many(tasks.values(), source.next_id)
+    return len(tasks)
+
+
+def export(storage, json_path: str) -> int:
+    """Writes every task of storage to json_path in the format of the json storage,
+    as a new version of the file if it exists, returns the number of exported tasks
+    """
+    tasks = storage.load()
+    target = JsonStorage(json_path)
+    with _locked(target.lock_path):
+        target.tasks, target.next_id = dict(tasks), storage.next_id
+        target.version = target._disk_version()
+        target.save()
+    return len(tasks)
+
+
+STORAGES = {
+    'json': JsonStorage,
+    'journal': JournalStorage,
+    'columnar': ColumnarStorage,
+    'sqlite': SqliteStorage,
+}
@@ -0,0 +1,139 @@
+"""Benchmark of TaskTracker operations on large task stores
+
+For every store size and storage backend a fresh process generates a synthetic
+store, then times each operation on a new TaskTracker, as one command line run
+would, leaving out interpreter startup. Throughput, p50/p99 latency and the
+peak resident memory of the process are reported.
+    python benchmarks/operations.py --sizes 1000 100000 --storages json sqlite --repeat 10
+    python benchmarks/operations.py --output results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+from synthetic import synthetic_tasks, write_tasks
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.columnar import ColumnBuilder
+from app.main import TaskTracker
+from app.storage import STORAGES, ColumnarStorage, SqliteStorage
+
+OPERATIONS = ['add_task', 'update_status', 'delete_task', 'list_tasks', 'list_done', 'list_progress', 'list_todo']
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of timings"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss() -> Optional[int]:
+    """Returns the peak resident memory of this process in bytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def generate(storage: str, count: int) -> None:
+    """Creates a store of count tasks for storage in the current directory"""
+    if storage == 'sqlite':
+        SqliteStorage('tasks.json').put_many(synthetic_tasks(count))
+    elif storage == 'columnar':
+        builder = ColumnBuilder()
+        for task in synthetic_tasks(count):
+            builder.add(task)
+        builder.write(ColumnarStorage('tasks.json').path, 1, count + 1)
+    else:
+        write_tasks('tasks.json', count)
+
+
+def operation(name: str, storage: str, count: int, repetition: int) -> Callable[[], None]:
+    """Returns a call running one repetition of an operation on a new TaskTracker,
+    updates and deletes go to different tasks on every repetition
+    """
+    tracker = TaskTracker(storage)
+    task_id = str(count - repetition)
+    if name == 'add_task':
+        return lambda: tracker.add_task('benchmark task')
+    if name == 'update_status':
+        return lambda: tracker.update_status(task_id, 'done')
+    if name == 'delete_task':
+        return lambda: tracker.delete_task(task_id)
+    if name == 'list_tasks':
+        return tracker.list_tasks
+    status = {'list_done': 'done', 'list_progress': 'in progress', 'list_todo': ''}[name]
+    return lambda: tracker.print_tasks(tracker.storage.with_status(status))
+
+
+def run_case(storage: str, count: int, repeat: int) -> Dict:
+    """Generates a store and times every operation on it, meant to run in its own process"""
+    results = {'storage': storage, 'tasks': count, 'operations': dict()}
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        os.chdir(directory)
+        generate(storage, count)
+        with redirect_stdout(devnull):
+            for name in OPERATIONS:
+                timings = list()
+                for repetition in range(repeat):
+                    call = operation(name, storage, count, repetition)
+                    start = time.perf_counter()
+                    call()
+                    timings.append(time.perf_counter() - start)
+                results['operations'][name] = {
+                    'throughput': len(timings) / sum(timings),
+                    'p50_ms': percentile(timings, 0.5) * 1000,
+                    'p99_ms': percentile(timings, 0.99) * 1000,
+                }
+        results['peak_rss'] = peak_rss()
+    return results
+
+
+def print_results(results: Dict) -> None:
+    """Prints one table per store size and backend"""
+    peak = '-' if results['peak_rss'] is None else f'{results["peak_rss"] / 2 ** 20:.0f} MiB'
+    print(f'\n{results["storage"]}, {results["tasks"]} tasks, peak RSS {peak}')
+    print(f'{"operation":<16}{"ops/s":>12}{"p50 ms":>12}{"p99 ms":>12}')
+    for name, timing in results['operations'].items():
+        print(f'{name:<16}{timing["throughput"]:>12.1f}{timing["p50_ms"]:>12.2f}{timing["p99_ms"]:>12.2f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time TaskTracker operations on synthetic task stores')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000], help='Store sizes')
+    parser.add_argument('--storages', nargs='+', choices=list(STORAGES), default=list(STORAGES), help='Backends')
+    parser.add_argument('--repeat', type=int, default=10, help='Repetitions of every operation')
+    parser.add_argument('--output', type=str, help='Also write the results to this json file')
+    args = parser.parse_args()
+
+    all_results = list()
+    for count in args.sizes:
+        for storage in args.storages:
+            # a new process per case, so the peak memory of one case does not hide the next
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+                results = pool.submit(run_case, storage, count, args.repeat).result()
+            print_results(results)
+            all_results.append(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
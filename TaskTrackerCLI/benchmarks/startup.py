@@ -0,0 +1,65 @@
+"""Startup benchmark for the command line entry points
+
+Times whole processes listing todo tasks from a generated tasks.json,
+so interpreter startup, imports, parsing and printing are all counted.
+    python benchmarks/startup.py --tasks 10000 --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import List
+
+from synthetic import write_tasks
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+
+def write_aged_tasks(path: str, count: int) -> None:
+    """Writes count tasks to path, backdated so the cache may be written"""
+    write_tasks(path, count)
+    # files modified within the last second are not cached
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 2_000_000_000))
+
+
+def time_runs(argv: List[str], directory: str, runs: int, clear_cache: bool = False) -> List[float]:
+    """Runs argv runs times in directory, returns the wall time of each run in milliseconds"""
+    timings = list()
+    for _ in range(runs):
+        if clear_cache and os.path.exists(os.path.join(directory, 'tasks.json.cache')):
+            os.remove(os.path.join(directory, 'tasks.json.cache'))
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=directory, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time TaskTracker startup for a listing')
+    parser.add_argument('--tasks', type=int, default=10000, help='Number of generated tasks')
+    parser.add_argument('--runs', type=int, default=20, help='Runs of every command')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_aged_tasks(os.path.join(directory, 'tasks.json'), args.tasks)
+        python = [sys.executable]
+        cases = [
+            ('interpreter only', python + ['-c', 'pass'], False),
+            ('main.py -l_t', python + [os.path.join(APP, 'main.py'), '-l_t'], True),
+            ('fast.py -l_t, no cache', python + [os.path.join(APP, 'fast.py'), '-l_t'], True),
+            ('fast.py -l_t, cached', python + [os.path.join(APP, 'fast.py'), '-l_t'], False),
+        ]
+        print(f'{args.tasks} tasks, {args.runs} runs, milliseconds')
+        print(f'{"command":<28}{"median":>10}{"min":>10}')
+        for name, argv, clear_cache in cases:
+            timings = time_runs(argv, directory, args.runs, clear_cache)
+            print(f'{name:<28}{statistics.median(timings):>10.1f}{min(timings):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
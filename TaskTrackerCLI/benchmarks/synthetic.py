@@ -0,0 +1,30 @@
+"""Synthetic task stores for the benchmarks"""
+import json
+
+from typing import Dict, Iterator
+
+STATUSES = ['', 'in progress', 'done']
+
+
+def synthetic_tasks(count: int) -> Iterator[Dict]:
+    """Yields count tasks with ids from 1, statuses are spread evenly"""
+    for task_id in range(1, count + 1):
+        yield {
+            'id': task_id,
+            'title': f'task number {task_id}',
+            'description': f'description of task {task_id}',
+            'status': STATUSES[task_id % len(STATUSES)],
+            'createdAt': '2024-11-20T18:57:22.781752',
+            'updatedAt': '2024-11-20T18:57:22.781752',
+        }
+
+
+def write_tasks(path: str, count: int) -> None:
+    """Writes a json snapshot of count tasks to path one task at a time,
+    so generating a million tasks does not hold them all in memory
+    """
+    with open(path, 'w') as f:
+        f.write(f'{{"version": 1, "next_id": {count + 1}, "tasks": {{')
+        for task in synthetic_tasks(count):
+            f.write(f'{", " if task["id"] > 1 else ""}"{task["id"]}": {json.dumps(task)}')
+        f.write('}}')
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+
+from app import daemon
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file = 'tasks.json'
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_file = os.path.join(self.directory.name, 'tasks.sock')
+        self.server = threading.Thread(target=daemon.serve, args=(self.socket_file, 0.5))
+        self.server.start()
+        while not os.path.exists(self.socket_file):
+            pass
+
+    def test_add_and_list(self):
+        output, status = daemon.request(['--add', 'calling mom'], socket_file=self.socket_file)
+        self.assertEqual((output, status), ('', 0))
+        output, status = daemon.request(['--list', '--fields', 'title'], socket_file=self.socket_file)
+        self.assertEqual(output, 'Task: calling mom\n')
+
+    def test_sees_changes_from_other_processes(self):
+        daemon.request(['--add', 'calling mom'], socket_file=self.socket_file)
+        with open(self.test_file, 'w') as f:
+            json.dump({'version': 9, 'next_id': 8, 'tasks': {}}, f)
+        output, _ = daemon.request(['--list'], socket_file=self.socket_file)
+        self.assertEqual(output, '')
+
+    def test_batch_from_stdin(self):
+        output, _ = daemon.request(['--batch', '-'], '{"op": "add", "title": "a"}\n', socket_file=self.socket_file)
+        self.assertIn('1: added task 1', output)
+
+    def test_invalid_arguments(self):
+        output, status = daemon.request(['--status', 'later'], socket_file=self.socket_file)
+        self.assertEqual(status, 2)
+        self.assertIn('invalid choice', output)
+
+    def tearDown(self):
+        self.server.join()
+        self.directory.cleanup()
+        paths = (f'{self.test_file}.lock', f'{self.test_file}.cache', 'tasks.index.json', 'tasks.index.jsonl')
+        for path in (self.test_file, *paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
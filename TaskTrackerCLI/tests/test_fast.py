@@ -0,0 +1,63 @@
+import io
+import json
+import os
+import unittest
+
+from contextlib import redirect_stdout
+
+from app import fast
+from app.main import TaskTracker
+
+
+class FastTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file = 'tasks.json'
+        self.tasktracker = TaskTracker()
+        for title in ('doing homeworks', 'vising parents', 'reading books'):
+            self.tasktracker.add_task(title)
+        self.tasktracker.update_status('2', 'done')
+        # files modified within the last second are not cached
+        os.utime(self.test_file, ns=(0, os.stat(self.test_file).st_mtime_ns - 2_000_000_000))
+
+    def output(self, run, argv):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run(argv)
+        return output.getvalue()
+
+    def test_field_labels_match(self):
+        self.assertEqual(fast.FIELD_LABELS, TaskTracker.field_labels)
+
+    def test_parse(self):
+        options = fast.parse(['-l_d', '--limit=2', '--fields', 'id,title'])
+        self.assertEqual(options['listings'], {'list_done': 'done'})
+        self.assertEqual((options['offset'], options['limit'], options['fields']), (0, 2, ['id', 'title']))
+        self.assertIsNone(fast.parse(['-a', 'calling mom']))
+        self.assertIsNone(fast.parse(['-l', '--limit']))
+        self.assertIsNone(fast.parse(['-l', '--fields', 'owner']))
+        self.assertIsNone(fast.parse(['-l', '--storage', 'sqlite']))
+
+    def test_listings_match_tasktracker(self):
+        self.assertIsNone(fast.cached_tasks('json'))
+        for argv in (['-l'], ['-l_t', '-l_d', '--fields', 'id,status'], ['--list', '--offset', '1', '--limit', '1']):
+            expected = self.output(TaskTracker().run, argv)
+            self.assertEqual(self.output(fast.main, argv), expected)
+            self.assertIsNotNone(fast.cached_tasks('json'))
+            self.assertEqual(self.output(fast.main, argv), expected)
+
+    def test_stale_cache_is_not_used(self):
+        self.output(fast.main, ['-l'])
+        with open(self.test_file, 'w') as f:
+            json.dump({'version': 9, 'next_id': 8, 'tasks': {}}, f)
+        self.assertIsNone(fast.cached_tasks('json'))
+        self.assertEqual(self.output(fast.main, ['-l']), '')
+
+    def tearDown(self):
+        paths = (f'{self.test_file}.lock', f'{self.test_file}.cache', 'tasks.index.json', 'tasks.index.jsonl')
+        for path in (self.test_file, *paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
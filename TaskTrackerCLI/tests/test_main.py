@@ -4,10 +4,17 @@ import os
 import io
 import unittest
 
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr
 
 from app.main import TaskTracker
 
 
+def add_tasks(storage, count):
+    tasktracker = TaskTracker(storage)
+    return [tasktracker.add_task(f'task {number}') for number in range(count)]
+
+
 class TaskTrackerTest(unittest.TestCase):
     def setUp(self):
         self.test_file = 'tasks.json'
@@ -49,6 +56,15 @@ class TaskTrackerTest(unittest.TestCase):
         self.assertEqual(len(tasks), 4)
         self.assertTrue(any(task['title'] == 'calling mom' for task in tasks.values()))
 
+    def test_add_task_after_delete(self):
+        self.tasktracker.delete_task('2')
+        self.assertEqual(self.tasktracker.add_task('calling mom'), 4)
+        self.assertEqual(self.tasktracker.load()['3']['title'], 'reading books')
+
+        tasktracker = TaskTracker()
+        tasktracker.delete_task('4')
+        self.assertEqual(tasktracker.add_task('calling dad'), 5)
+
     def test_list(self):
         captured_output = io.StringIO()
         sys.stdout = captured_output
@@ -59,6 +75,18 @@ class TaskTrackerTest(unittest.TestCase):
         self.assertIn('doing homeworks', output)
         self.assertIn('vising parents', output)
 
+    def test_list_fields_and_limit(self):
+        captured_output = io.StringIO()
+        sys.stdout = captured_output
+        self.tasktracker.list_tasks(offset=1, limit=1, fields=['id', 'status'])
+        sys.stdout = sys.__stdout__
+
+        self.assertEqual(captured_output.getvalue(), 'ID: 2\nStatus: done\n')
+
+        for option in ('--offset', '--limit'):
+            with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+                self.tasktracker.run(['-l', option, '-2'])
+
     def test_delete_task(self):
         self.tasktracker.delete_task('calling mom')
         tasks = self.tasktracker.load()
@@ -69,14 +97,85 @@ class TaskTrackerTest(unittest.TestCase):
         tasks = self.tasktracker.load()
         self.assertTrue(tasks['1']['status'] == 'done')
 
+    def test_update_missing_task(self):
+        self.assertFalse(self.tasktracker.update_status('7', 'done'))
+
+    def test_list_done(self):
+        self.tasktracker.update_status('3', 'done')
+        done = self.tasktracker.storage.with_status('done')
+        self.assertEqual([task['id'] for task in done], [2, 3])
+
     def test_update_description(self):
         self.tasktracker.update_description('3', 'read math books')
         tasks = self.tasktracker.load()
         self.assertTrue(tasks['3']['description'] == 'read math books')
 
+    def test_search(self):
+        self.assertEqual([task['id'] for task in self.tasktracker.search_tasks('homework*')], [1])
+        self.tasktracker.add_task('math exam')
+        self.tasktracker.update_description('3', 'math books')
+        self.tasktracker.delete_task('1')
+        self.assertEqual([task['id'] for task in self.tasktracker.search_tasks('MATH')], [3, 4])
+        self.assertEqual([task['id'] for task in self.tasktracker.search_tasks('math read*')], [3])
+        self.assertEqual(TaskTracker().search_tasks('homework*'), [])
+
+    def test_batch(self):
+        batch_file = 'batch.jsonl'
+        with open(batch_file, 'w') as f:
+            f.write('{"op": "add", "title": "calling mom"}\n'
+                    '{"op": "update", "id": 1, "status": "done", "description": "only math"}\n'
+                    '{"op": "update", "id": 9, "status": "done"}\n'
+                    '{"op": "delete", "id": 2}\n'
+                    '{"op": "rename", "id": 3}\n'
+                    '{"op": "update", "id": 3, "description": 5}\n'
+                    '{"op": "add", "title": ["calling dad"]}\n')
+        captured_output = io.StringIO()
+        sys.stdout = captured_output
+        self.tasktracker.run_batch(batch_file)
+        sys.stdout = sys.__stdout__
+        os.remove(batch_file)
+
+        output = captured_output.getvalue().splitlines()
+        self.assertEqual(output[0], '1: added task 4')
+        self.assertEqual(output[2], '3: task 9 not found')
+        self.assertTrue(output[4].startswith('5: error'))
+        self.assertEqual(output[5], '6: error: status and description must be strings')
+        self.assertEqual(output[6], '7: error: title must be a string')
+        self.assertEqual(output[7], 'Applied 4 of 7 operations')
+        with open(self.test_file) as f:
+            tasks = json.load(f)['tasks']
+        self.assertEqual(sorted(tasks), ['1', '3', '4'])
+        self.assertEqual(tasks['1']['description'], 'only math')
+
+    def test_concurrent_writers(self):
+        for storage in ('json', 'journal'):
+            with self.subTest(storage=storage):
+                with open(self.test_file, 'w') as f:
+                    json.dump(self.sample_tasks, f)
+                with ProcessPoolExecutor(4) as executor:
+                    ids = sum(executor.map(add_tasks, [storage] * 4, [10] * 4), [])
+                self.assertEqual(sorted(ids), list(range(4, 44)))
+                self.assertEqual(len(TaskTracker(storage).load()), 43)
+                if os.path.exists(f'{self.test_file}l'):
+                    os.remove(f'{self.test_file}l')
+
+    def test_columnar_storage(self):
+        self.tasktracker.run(['--storage', 'columnar', '--migrate'])
+        with ProcessPoolExecutor(4) as executor:
+            ids = sum(executor.map(add_tasks, ['columnar'] * 4, [10] * 4), [])
+        self.assertEqual(sorted(ids), list(range(4, 44)))
+        self.assertEqual(len(TaskTracker('columnar').load()), 43)
+
+        self.tasktracker.run(['--storage', 'columnar', '--export', self.test_file])
+        self.assertEqual(len(TaskTracker().load()), 43)
+        for path in ('tasks.columns', 'tasks.columns.jsonl', 'tasks.columns.lock'):
+            os.remove(path)
+
     def tearDown(self):
-        if os.path.exists(self.test_file):
-            os.remove(self.test_file)
+        paths = (f'{self.test_file}.lock', f'{self.test_file}.cache', 'tasks.index.json', 'tasks.index.jsonl')
+        for path in (self.test_file, *paths):
+            if os.path.exists(path):
+                os.remove(path)
         self.taskTracker = None
 
 
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+
+from app.search import SearchIndex
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tasks.index.json')
+        self.tasks = [
+            {'id': 1, 'title': 'doing homeworks', 'description': 'math and physics homework'},
+            {'id': 2, 'title': 'vising parents', 'description': ''},
+        ]
+        self.index = SearchIndex(self.path)
+        self.index.load(['store 1'], self.tasks)
+
+    def test_and_and_prefix(self):
+        self.assertEqual(self.index.search('homework'), ['1'])
+        self.assertEqual(self.index.search('home*'), ['1'])
+        self.assertEqual(self.index.search('home* parents'), [])
+        self.assertEqual(self.index.search('p*'), ['1', '2'])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_changes_are_logged(self):
+        self.index.stage('2', 'vising parents', 'visiting parents')
+        self.index.commit(['store 1'], ['store 2'])
+        self.assertEqual(self.index.search('vis*'), ['2'])
+        self.assertEqual(self.index.search('vising'), [])
+
+        index = SearchIndex(self.path)
+        index.load(['store 2'], [])
+        self.assertEqual(index.search('visiting'), ['2'])
+
+    def test_rebuild_when_store_changed_behind_its_back(self):
+        self.index.stage('2', 'vising parents', 'visiting parents')
+        self.index.commit(['store 1'], ['store 2'])
+
+        index = SearchIndex(self.path)
+        index.load(['store 3'], self.tasks[:1])
+        self.assertEqual(index.search('p*'), ['1'])
+        self.assertEqual(os.path.getsize(index.log_path), 0)
+
+    def test_rebuild_when_a_change_was_missed(self):
+        self.index.stage('2', 'vising parents', 'visiting parents')
+        self.index.commit(['store 2'], ['store 3'])
+        self.assertIsNone(self.index.postings)
+
+        index = SearchIndex(self.path)
+        index.load(['store 3'], self.tasks[:1])
+        self.assertEqual(index.search('p*'), ['1'])
+
+    def test_no_log_without_snapshot(self):
+        os.remove(self.path)
+        index = SearchIndex(self.path)
+        index.stage('3', '', 'calling mom')
+        index.commit(['store 1'], ['store 2'])
+        self.assertFalse(os.path.exists(index.log_path) and os.path.getsize(index.log_path))
+
+    def test_long_log_is_compacted_without_search(self):
+        for number in range(1, 200):
+            index = SearchIndex(self.path)
+            index.stage(str(number + 2), '', f'task {number}')
+            index.commit([f'store {number}'], [f'store {number + 1}'])
+        self.assertLess(os.path.getsize(index.log_path), os.path.getsize(self.path))
+        index = SearchIndex(self.path)
+        index.load(['store 200'], [])
+        self.assertEqual(len(index.search('task')), 199)
+
+    def test_corrupt_snapshot_is_rebuilt(self):
+        with open(self.path, 'w') as f:
+            f.write('{"stamp": ')
+        index = SearchIndex(self.path)
+        index.load(['store 1'], self.tasks)
+        self.assertEqual(index.search('parents'), ['2'])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
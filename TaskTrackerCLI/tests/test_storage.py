@@ -0,0 +1,367 @@
+import json
+import marshal
+import os
+import tempfile
+import unittest
+
+from unittest.mock import patch
+from app.cache import read_cache
+from app.storage import (
+    ColumnarStorage, ConflictError, JsonStorage, JournalStorage, SqliteStorage, _JsonStream, export, migrate,
+)
+
+
+class JsonStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tasks.json')
+        self.storage = JsonStorage(self.path)
+        self.task = {
+            'id': 1,
+            'title': 'doing homeworks',
+            'description': '',
+            'status': '',
+            'createdAt': '2024-11-20T18:57:22.781752',
+            'updatedAt': '2024-11-20T18:57:22.781752',
+        }
+
+    def test_status_index_follows_updates(self):
+        self.storage.put(self.task)
+        self.storage.put({**self.task, 'id': 2})
+        self.storage.update('1', status='in progress')
+        self.assertEqual([task['id'] for task in self.storage.with_status('')], [2])
+        self.assertEqual([task['id'] for task in self.storage.with_status('in progress')], [1])
+
+        self.storage.delete('1')
+        self.assertEqual(self.storage.with_status('in progress'), [])
+
+    def test_status_index_keeps_task_order(self):
+        for task_id in range(1, 4):
+            self.storage.put({**self.task, 'id': task_id})
+        self.storage.update('1', title='reading')
+        self.assertEqual([task['id'] for task in self.storage.with_status('')], [1, 2, 3])
+        self.storage.update('2', status='done')
+        self.storage.update('2', status='')
+        self.assertEqual([task['id'] for task in self.storage.with_status('', offset=1)], [2, 3])
+
+    def test_stream(self):
+        with open(self.path, 'w') as f:
+            f.write('{"next_id": 123, "tasks": {"1": {"title": "a \\"}\\" b"}, "2": [1, 2.5]}, "x": {}}')
+        with open(self.path) as f:
+            stream = _JsonStream(f, chunk_size=3)
+            members = list()
+            for key in stream.keys():
+                if key == 'tasks':
+                    members.extend((task_id, stream.value()) for task_id in stream.keys())
+                else:
+                    members.append((key, stream.value()))
+        self.assertEqual(members, [('next_id', 123), ('1', {'title': 'a "}" b'}), ('2', [1, 2.5]), ('x', {})])
+
+    def test_iter_tasks_streams_file(self):
+        for task_id in range(1, 6):
+            self.storage.put({**self.task, 'id': task_id})
+        storage = JsonStorage(self.path)
+        self.assertEqual([task['id'] for task in storage.iter_tasks(offset=1, limit=2)], [2, 3])
+        self.assertIsNone(storage.tasks)
+
+        # files modified within the last second are not cached
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns - 2_000_000_000))
+        JsonStorage(self.path).load()
+        self.assertTrue(os.path.exists(storage.cache_path))
+        with patch('app.cache.marshal.load', wraps=marshal.load) as load:
+            self.assertEqual([task['id'] for task in storage.iter_tasks(limit=1)], [1])
+            self.assertEqual(load.call_count, 0)
+            self.assertIsNone(read_cache(storage.cache_path, ['json', None]))
+            self.assertEqual(load.call_count, 1)
+
+    def test_update_missing_task(self):
+        self.assertIsNone(self.storage.update('1', status='done'))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_conflicting_writer(self):
+        self.storage.put(self.task)
+        other = JsonStorage(self.path)
+        other.put({**other.get('1'), 'status': 'done'})
+        with self.assertRaises(ConflictError):
+            self.storage.put({**self.task, 'id': 2})
+        with self.storage.transaction():
+            self.storage.put({**self.task, 'id': 2})
+        self.assertEqual(JsonStorage(self.path).get('1')['status'], 'done')
+
+    def test_transaction_rolls_back(self):
+        self.storage.put(self.task)
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                self.storage.delete('1')
+                raise RuntimeError
+        self.assertEqual(list(self.storage.load()), ['1'])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class JournalStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tasks.json')
+        self.task = {
+            'id': 1,
+            'title': 'doing homeworks',
+            'description': '',
+            'status': '',
+            'createdAt': '2024-11-20T18:57:22.781752',
+            'updatedAt': '2024-11-20T18:57:22.781752',
+        }
+
+    def test_put_appends_to_journal(self):
+        storage = JournalStorage(self.path)
+        storage.put(self.task)
+        self.assertFalse(os.path.exists(self.path))
+        with open(storage.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_replay(self):
+        storage = JournalStorage(self.path)
+        storage.put(self.task)
+        storage.put({**self.task, 'id': 2, 'title': 'vising parents'})
+        storage.delete('1')
+
+        tasks = JournalStorage(self.path).load()
+        self.assertEqual(list(tasks), ['2'])
+        self.assertEqual(tasks['2']['title'], 'vising parents')
+
+    def test_iter_tasks_applies_journal(self):
+        storage = JournalStorage(self.path, compact_every=3)
+        for task_id in range(1, 4):
+            storage.put({**self.task, 'id': task_id})
+        storage.update('1', title='calling mom')
+        storage.delete('2')
+        storage.put({**self.task, 'id': 4})
+
+        tasks = list(JournalStorage(self.path).iter_tasks())
+        self.assertEqual([task['id'] for task in tasks], [1, 3, 4])
+        self.assertEqual(tasks[0]['title'], 'calling mom')
+
+    def test_conflicting_append(self):
+        storage = JournalStorage(self.path)
+        storage.load()
+        JournalStorage(self.path).put(self.task)
+        with self.assertRaises(ConflictError):
+            storage.put({**self.task, 'id': 2})
+
+    def test_transaction_is_one_line(self):
+        storage = JournalStorage(self.path)
+        with storage.transaction():
+            storage.put(self.task)
+            storage.put({**self.task, 'id': 2})
+        with open(storage.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(JournalStorage(self.path).load().keys(), {'1', '2'})
+
+    def test_next_id_survives_replay(self):
+        storage = JournalStorage(self.path)
+        storage.put({**self.task, 'id': storage.allocate_id()})
+        storage.delete('1')
+        self.assertEqual(JournalStorage(self.path).allocate_id(), 2)
+
+    def test_committed_stamps_follow_on(self):
+        storage = JournalStorage(self.path, compact_every=2)
+        storage.put(self.task)
+        first = storage.committed
+        storage.put({**self.task, 'id': 2})
+        self.assertEqual(storage.committed[0], first[1])
+        self.assertEqual(storage.committed[1], JournalStorage(self.path).stamp())
+
+    def test_cache_follows_journal(self):
+        JournalStorage(self.path).put(self.task)
+        # files modified within the last second are not cached
+        os.utime(f'{self.path}l', ns=(0, os.stat(f'{self.path}l').st_mtime_ns - 2_000_000_000))
+        storage = JournalStorage(self.path)
+        storage.load()
+        self.assertTrue(JournalStorage(self.path)._read_cache())
+
+        storage.put({**self.task, 'id': 2})
+        self.assertFalse(JournalStorage(self.path)._read_cache())
+        self.assertEqual(JournalStorage(self.path).load().keys(), {'1', '2'})
+
+    def test_json_storage_folds_journal(self):
+        JournalStorage(self.path).put(self.task)
+        storage = JsonStorage(self.path)
+        task_id = storage.allocate_id()
+        self.assertEqual(task_id, 2)
+        storage.put({**self.task, 'id': task_id})
+        self.assertEqual(os.path.getsize(f'{self.path}l'), 0)
+        self.assertEqual(JournalStorage(self.path).load().keys(), {'1', '2'})
+
+        storage = JsonStorage(self.path)
+        storage.load()
+        JournalStorage(self.path).delete('1')
+        with self.assertRaises(ConflictError):
+            storage.put({**self.task, 'id': 3})
+        self.assertEqual(JsonStorage(self.path).load().keys(), {'2'})
+
+    def test_compaction(self):
+        storage = JournalStorage(self.path, compact_every=2)
+        storage.put(self.task)
+        storage.put({**self.task, 'id': 2})
+        self.assertEqual(os.path.getsize(storage.journal_path), 0)
+        self.assertEqual(JsonStorage(self.path).load().keys(), {'1', '2'})
+
+    def test_torn_write_is_dropped(self):
+        storage = JournalStorage(self.path)
+        storage.put(self.task)
+        with open(storage.journal_path, 'a') as f:
+            f.write('{"op": "put", "task": {"id"')
+
+        storage = JournalStorage(self.path)
+        self.assertEqual(list(storage.load()), ['1'])
+        storage.put({**self.task, 'id': 2})
+        with open(storage.journal_path) as f:
+            self.assertEqual([json.loads(line)['task']['id'] for line in f], [1, 2])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class ColumnarStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tasks.json')
+        self.tasks = {
+            str(task_id): {
+                'id': task_id,
+                'title': f'tâche {task_id}',
+                'description': '',
+                'status': ['', 'in progress', 'done'][task_id % 3],
+                'createdAt': '2024-11-20T18:57:22.781752',
+                'updatedAt': '2024-11-20T18:57:22',
+            }
+            for task_id in range(1, 7)
+        }
+
+    def test_snapshot_round_trip(self):
+        self.tasks['2'].update(createdAt='2024-11-20T18:57:22+01:00', description=7, owner='me')
+        ColumnarStorage(self.path).put_many(self.tasks.values())
+        storage = ColumnarStorage(self.path)
+        self.assertEqual(storage.load(), self.tasks)
+        self.assertEqual(storage.allocate_id(), 7)
+
+        # a compaction copies the unchanged rows of the old snapshot
+        storage.delete('4')
+        storage.save()
+        del self.tasks['4']
+        self.assertEqual(ColumnarStorage(self.path).load(), self.tasks)
+
+    def test_listings_decode_lazily(self):
+        ColumnarStorage(self.path).put_many(self.tasks.values())
+        ColumnarStorage(self.path).update('3', status='in progress')
+        ColumnarStorage(self.path).delete('4')
+        ColumnarStorage(self.path).delete('1')
+        ColumnarStorage(self.path).put({**self.tasks['1'], 'title': 'again'})
+        ColumnarStorage(self.path).put({**self.tasks['1'], 'id': 7})
+
+        expected = dict(self.tasks)
+        expected['3'] = {**expected['3'], 'status': 'in progress'}
+        del expected['4'], expected['1']
+        expected['1'] = {**self.tasks['1'], 'title': 'again'}
+        expected['7'] = {**self.tasks['1'], 'id': 7}
+
+        storage = ColumnarStorage(self.path)
+        self.assertEqual(list(storage.iter_tasks()), list(expected.values()))
+        self.assertEqual(list(storage.iter_tasks(offset=2, limit=2)), list(expected.values())[2:4])
+        self.assertEqual(
+            [task['id'] for task in storage.with_status('in progress')],
+            [task['id'] for task in expected.values() if task['status'] == 'in progress'],
+        )
+        self.assertEqual(len(storage.load()), len(expected))
+        self.assertEqual(set(storage.tasks.changes), {'1', '3', '4', '7'})
+
+    def test_compaction_writes_snapshot(self):
+        storage = ColumnarStorage(self.path, compact_every=2)
+        storage.put(self.tasks['1'])
+        storage.put(self.tasks['2'])
+        self.assertEqual(os.path.getsize(storage.journal_path), 0)
+        self.assertEqual(ColumnarStorage(self.path).load(), {'1': self.tasks['1'], '2': self.tasks['2']})
+
+    def test_migrate_and_export(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 3, 'next_id': 10, 'tasks': self.tasks}, f)
+        self.assertEqual(migrate(self.path, 'columnar'), 6)
+        storage = ColumnarStorage(self.path)
+        storage.delete('6')
+
+        exported = os.path.join(self.directory.name, 'exported.json')
+        self.assertEqual(export(storage, exported), 5)
+        json_storage = JsonStorage(exported)
+        self.assertEqual(json_storage.load(), {task_id: self.tasks[task_id] for task_id in '12345'})
+        self.assertEqual(json_storage.allocate_id(), 10)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class SqliteStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tasks.json')
+        self.storage = SqliteStorage(self.path)
+        self.task = {
+            'id': 1,
+            'title': 'doing homeworks',
+            'description': '',
+            'status': 'done',
+            'createdAt': '2024-11-20T18:57:22.781752',
+            'updatedAt': '2024-11-20T18:57:22.781752',
+        }
+
+    def test_put_and_get(self):
+        self.storage.put(self.task)
+        self.assertEqual(self.storage.get('1'), self.task)
+        self.assertIsNone(self.storage.get('2'))
+
+    def test_put_many_into_empty_table(self):
+        self.storage.put({**self.task, 'id': self.storage.allocate_id()})
+        self.storage.delete('1')
+        self.storage.put_many([])
+        self.assertEqual(self.storage.allocate_id(), 2)
+
+    def test_with_status_uses_index(self):
+        self.storage.put(self.task)
+        self.storage.put({**self.task, 'id': 2, 'status': ''})
+        self.assertEqual([task['id'] for task in self.storage.with_status('done')], [1])
+        plan = self.storage.connection.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE status = ? ORDER BY id', ('done',)
+        ).fetchall()
+        self.assertIn('tasks_status', str([tuple(row) for row in plan]))
+
+    def test_update(self):
+        self.storage.put(self.task)
+        self.assertEqual(self.storage.update('1', status='')['status'], '')
+        self.assertIsNone(self.storage.update('2', status=''))
+
+    def test_allocate_id(self):
+        self.storage.put({**self.task, 'id': 5})
+        self.assertEqual(self.storage.next_id, 6)
+        self.assertEqual(self.storage.allocate_id(), 6)
+        self.storage.delete('5')
+        self.assertEqual(self.storage.allocate_id(), 7)
+
+    def test_delete(self):
+        self.storage.put(self.task)
+        self.assertTrue(self.storage.delete('1'))
+        self.assertFalse(self.storage.delete('1'))
+
+    def test_migrate(self):
+        with open(self.path, 'w') as f:
+            json.dump({'1': self.task, '2': {**self.task, 'id': 2}}, f)
+        self.assertEqual(migrate(self.path), 2)
+        self.assertEqual(self.storage.load().keys(), {'1', '2'})
+        self.assertEqual(self.storage.allocate_id(), 3)
+
+    def tearDown(self):
+        self.storage.connection.close()
+        self.directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()